@@ -0,0 +1,137 @@
+import argparse
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import cashrec
+from src.events import EventStream
+from src.stages import StageLog, peak_rss_mb
+from src.synthetic import write_dataset, parse_mix, DEFAULT_MIX
+
+# Default terminal output formatting
+pd.set_option('display.max_columns', None)
+pd.set_option('display.expand_frame_repr', False)
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+stages_filename = "benchmark_stages.csv"
+scaling_filename = "benchmark_scaling.csv"
+
+
+def run_size(rows, seed, backend, mix):
+    """cash_rec on one freshly generated account of `rows` transactions -> (stage records, total seconds, peak RSS MB)."""
+    with tempfile.TemporaryDirectory(prefix="cashrec_bench_") as work_dir:
+        work_dir = Path(work_dir)
+        info = write_dataset(work_dir, rows, seed=seed, mix=mix)
+        account = info["accounts"][0]
+        # cash_rec reads the bank statements from input_path and filters on fund_short_name
+        cashrec.input_path = work_dir
+        cashrec.fund_short_name = account["FundShortName"]
+        log = StageLog()
+        start = time.perf_counter()
+        cashrec.cash_rec(work_dir, info["cash_filename"], f"bankstmt_flows_{account['Account']}.csv",
+                         events=EventStream(), hooks=[log], matcher=cashrec.make_matcher(backend))
+        total_s = time.perf_counter() - start
+    return log.records, total_s, peak_rss_mb()
+
+
+def _worker(conn, rows, seed, backend, mix):
+    try:
+        conn.send(("ok", run_size(rows, seed, backend, mix)))
+    except BaseException as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def run_isolated(ctx, rows, seed, backend, mix, max_seconds):
+    """
+    run_size in its own process, so the peak RSS belongs to this size only and an
+    out-of-memory kill ends just this size -> (status, (records, total_s, peak_mb) or None).
+    """
+    recv_end, send_end = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_worker, args=(send_end, rows, seed, backend, mix))
+    proc.start()
+    send_end.close()
+    try:
+        if not recv_end.poll(max_seconds):
+            proc.terminate()
+            return "timeout", None
+        status, payload = recv_end.recv()
+    except EOFError:
+        proc.join()
+        return f"killed (exit code {proc.exitcode})", None
+    finally:
+        proc.join(timeout=5)
+        recv_end.close()
+    if status != "ok":
+        return payload, None
+    return "ok", payload
+
+
+def scaling_table(df_stages):
+    """Wall time per stage (rows) and size (columns) plus the fitted exponent of t ~ rows^k."""
+    table = df_stages.pivot_table(index='stage', columns='rows', values='wall_s', aggfunc='first', sort=False)
+    exponents = {}
+    for stage, times in table.iterrows():
+        times = times.dropna()
+        times = times[times > 1e-4]
+        if len(times) >= 2:
+            slope, _ = np.polyfit(np.log(times.index.to_numpy(float)), np.log(times.to_numpy(float)), 1)
+            exponents[stage] = round(float(slope), 2)
+    table = table.round(4)
+    table['exponent'] = pd.Series(exponents)
+    return table.reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline cash_rec scaling benchmark on synthetic accounts")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma-separated transaction counts per account")
+    parser.add_argument("--backend", choices=cashrec.BACKENDS, default="pandas")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mix", action="append", metavar="KIND=SHARE",
+                        help=f"Override a transaction kind's share (kinds: {', '.join(DEFAULT_MIX)})")
+    parser.add_argument("--max-seconds", type=float, default=1800,
+                        help="Give up on a size (and skip the larger ones) after this many seconds")
+    parser.add_argument("--out", type=Path, default=cashrec.data_dir / "benchmark", help="Directory for the CSVs")
+    args = parser.parse_args()
+
+    sizes = sorted(int(s) for s in args.sizes.split(","))
+    mix = parse_mix(args.mix)
+    ctx = multiprocessing.get_context("spawn")
+    rows_out = []
+    for rows in sizes:
+        print(f"[INFO] {args.backend}: {rows:,} transactions ...", flush=True)
+        status, result = run_isolated(ctx, rows, args.seed, args.backend, mix, args.max_seconds)
+        if result is None:
+            print(f"[WARN] {rows:,} transactions: {status}; skipping larger sizes")
+            rows_out.append({'backend': args.backend, 'rows': rows, 'stage': 'total', 'status': status})
+            break
+        records, total_s, peak_mb = result
+        for r in records:
+            rows_out.append({'backend': args.backend, 'rows': rows, 'stage': r['stage'], 'wall_s': r['wall_s'],
+                             'rows_in': r.get('rows_in'), 'matched_bank': r.get('matched_bank'),
+                             'matched_cash': r.get('matched_cash'), 'peak_growth_mb': r.get('peak_growth_mb')})
+        rows_out.append({'backend': args.backend, 'rows': rows, 'stage': 'total', 'wall_s': total_s,
+                         'peak_mem_mb': peak_mb,
+                         'status': status})
+        print(f"[OK] {rows:,} transactions in {total_s:,.2f}s", flush=True)
+
+    if not rows_out:
+        return
+    args.out.mkdir(parents=True, exist_ok=True)
+    df_stages = pd.DataFrame(rows_out)
+    df_scaling = scaling_table(df_stages)
+    df_stages.to_csv(args.out / stages_filename, index=False)
+    df_scaling.to_csv(args.out / scaling_filename, index=False)
+    print(df_scaling.to_string(index=False))
+    print(df_stages[df_stages['stage'] == 'total'][['rows', 'wall_s', 'peak_mem_mb', 'status']].to_string(index=False))
+    print(f"[OK] Wrote {stages_filename} and {scaling_filename} to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import cashrec
+from src.reconcile import reconcile_account, TAG_MODES
+from src.rules_csv import load_rules_from_csv
+from src.stages import StageLog, StageRecorder
+from src.synthetic import generate_rules, generate_tagging_report
+
+# Default terminal output formatting
+pd.set_option('display.max_columns', None)
+pd.set_option('display.expand_frame_repr', False)
+
+DEFAULT_RULE_SIZES = [10, 100, 1_000, 5_000]
+DEFAULT_ROW_SIZES = [1_000, 10_000, 50_000]
+results_filename = "benchmark_tagging.csv"
+scaling_filename = "benchmark_tagging_scaling.csv"
+
+
+def run_case(rules, rows, seed, synonyms, hit_rate, tag_mode="row"):
+    """reconcile_account on one generated report -> (stage records, total seconds, tagged share)."""
+    df = generate_tagging_report(rows, synonyms, seed=seed, hit_rate=hit_rate)
+    log = StageLog()
+    start = time.perf_counter()
+    detailed_df, *_ = reconcile_account(df, "400310000001", rules, recorder=StageRecorder(hooks=[log]),
+                                         tag_mode=tag_mode)
+    total_s = time.perf_counter() - start
+    return log.records, total_s, float(detailed_df["Tag"].notna().mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tagging throughput of reconcile_account as rule sets and accounts grow")
+    parser.add_argument("--spvs", default=",".join(str(s) for s in DEFAULT_RULE_SIZES),
+                        help="Comma-separated SPV counts; originator / investor / expense rule counts scale with them")
+    parser.add_argument("--rows", default=",".join(str(s) for s in DEFAULT_ROW_SIZES),
+                        help="Comma-separated report line counts")
+    parser.add_argument("--hit-rate", type=float, default=0.8, help="Share of lines mentioning a rule synonym")
+    parser.add_argument("--tag-mode", choices=TAG_MODES, default="row")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-seconds", type=float, default=300,
+                        help="After a case takes longer than this, skip the larger row counts for that rule set")
+    parser.add_argument("--rules-out", type=Path, help="Keep the generated rules directories here")
+    parser.add_argument("--out", type=Path, default=cashrec.data_dir / "benchmark", help="Directory for the CSVs")
+    args = parser.parse_args()
+
+    rule_sizes = sorted(int(s) for s in args.spvs.split(","))
+    row_sizes = sorted(int(s) for s in args.rows.split(","))
+    rows_out = []
+    with tempfile.TemporaryDirectory(prefix="tagging_bench_") as tmp:
+        for spvs in rule_sizes:
+            rules_dir = (args.rules_out or Path(tmp)) / f"rules_{spvs}"
+            synonyms = generate_rules(rules_dir, spvs, seed=args.seed)
+            rules = load_rules_from_csv(rules_dir)
+            counts = synonyms["counts"]
+            for rows in row_sizes:
+                print(f"[INFO] {spvs:,} SPVs, {rows:,} lines ...", flush=True)
+                records, total_s, tagged = run_case(rules, rows, args.seed, synonyms, args.hit_rate, args.tag_mode)
+                for r in records + [{"stage": "total", "wall_s": total_s}]:
+                    rows_out.append({**counts, "rows": rows, "stage": r["stage"], "wall_s": r["wall_s"],
+                                     "rows_per_s": rows / r["wall_s"] if r["wall_s"] else None,
+                                     "tagged_share": round(tagged, 3), "tag_mode": args.tag_mode,
+                                     "tag_calls_saved": r.get("tag_calls_saved")})
+                tagging_s = next(r["wall_s"] for r in records if r["stage"] == "tagging")
+                print(f"[OK] tagging {rows / tagging_s:,.0f} rows/s, total {total_s:,.2f}s", flush=True)
+                if total_s > args.max_seconds:
+                    print(f"[WARN] Over {args.max_seconds:g}s; skipping larger row counts for {spvs:,} SPVs")
+                    break
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    df_results = pd.DataFrame(rows_out)
+    df_results.to_csv(args.out / results_filename, index=False)
+
+    # Tagging rows/s per rule set (rows) and line count (columns), plus how it falls with rule count:
+    # the exponent k of rows/s ~ spvs^k at the largest line count every rule set reached
+    tagging = df_results[df_results["stage"] == "tagging"]
+    table = tagging.pivot_table(index="spvs", columns="rows", values="rows_per_s", aggfunc="first").round(0)
+    common = table.dropna(axis=1)
+    if len(common.columns) and len(common) >= 2:
+        col = common.columns[-1]
+        slope, _ = np.polyfit(np.log(common.index.to_numpy(float)), np.log(common[col].to_numpy(float)), 1)
+        print(f"[INFO] Tagging rows/s ~ spvs^{slope:.2f} at {col:,} lines")
+    table.reset_index().to_csv(args.out / scaling_filename, index=False)
+    print(table.to_string())
+    print(f"[OK] Wrote {results_filename} and {scaling_filename} to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
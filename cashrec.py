@@ -1,8 +1,22 @@
 import pandas as pd
 import numpy as np
 from pathlib import Path
-import csv
-import os
+import time
+import argparse
+import traceback
+import hashlib
+
+from src.events import EventStream, match_label_counts
+from src.stages import StageRecorder, StageLog, peak_rss_mb
+from src.run_ledger import RunLedger
+from src.config import LEDGER_PATH
+from src.profiling import StageProfiler
+from src.memory import MemoryBudget, MemoryTracker, estimate_frame_bytes, read_csv_filtered, parse_size
+from src.schemas import load_frame, read_kwargs, apply_schema, frame_memory_mb
+from src.sql_backend import SqlMatcher
+from src.polars_backend import PolarsMatcher
+from src.report import ReportPlan, write_frame, FORMATS as REPORT_FORMATS
+from src.preview import PREVIEW_STAGES, DEFAULT_MONTHS_PER_YEAR as DEFAULT_PREVIEW_MONTHS, sample_months, estimate_side
 
 # Define your paths
 # 1. Get the path of the current script (src/<filename>.py)
@@ -12,6 +26,8 @@ project_root = src_directory.parent
 data_dir = project_root / "data"
 input_folder = ("C:/Users/z.veitch/OneDrive - wafracapital.com/ICP-UK - Documents/Track Record/Python Output/BankStmtCSV")
 input_path = Path(input_folder)
+USDFundList_filename = "USDFund_Accountlist.csv"
+full_cashflows_filename = "FullCashFlows_20260126v2.csv"
 
 # Default terminal output formatting
 pd.set_option('display.max_columns', None)
@@ -71,83 +87,7 @@ def force_dates_dayfirst(df, column_name):
     # Drop rows where the date is completely missing/unparseable
     return df
 
-def cash_rec(data_dir, cash_rec_filename, bankstmt_filename):
-    # List of keywords to exclude
-    exclude_keywords = [
-        "OPENING BALANCE",
-        "CLOSING BALANCE",
-        "BALANCE CARRIED FORWARD",
-        "BALANCE BROUGHT FORWARD"
-    ]
-
-    # Create a combined regex pattern (e.g., "OPENING BALANCE|CLOSING BALANCE|...")
-    pattern = '|'.join(exclude_keywords)
-
-    # --- 0. Load Data ---
-    # Assuming CSV files for this example. Replace with your file paths.
-    # Ensure your date columns are in datetime format.
-    df_cash = pd.read_csv(data_dir / cash_rec_filename)
-    df_bank = pd.read_csv(input_path / bankstmt_filename)
-
-    # Filter cash flows for the right fund
-    target_funds =  [fund_short_name]
-    df_cash = df_cash[df_cash['FundShortName'].isin(target_funds)].copy()
-    df_cash = df_cash.reset_index(drop=True)
-    print(f"Filtered Cash Rec to {len(df_cash)} relevant rows.")
-
-    # Filter the bank statement
-    # ~ is the 'NOT' operator, so we keep rows that DO NOT contain the pattern
-    df_bank = df_bank[~df_bank['Description1A'].astype(str).str.contains(pattern, case=False, na=False)].copy()
-
-    # Reset the index to keep things clean for the matching loops
-    df_bank = df_bank.reset_index(drop=True)
-
-    # Ensure the columns are strictly datetime objects (errors='coerce' turns bad dates to NaT)
-    df_cash['Date'] = pd.to_datetime(df_cash['Date'], errors='coerce')
-    #df_bank['Calculated_Date'] = pd.to_datetime(df_bank['Calculated_Date'], errors='coerce')
-
-    #df_cash = force_dates(df_cash, 'Date')
-    df_bank = force_dates(df_bank, 'Calculated_Date')
-    df_bank = use_bankref_dates(df_bank)
-    #print(df_bank['Calculated_Date'])
-
-    print(df_cash.head(3))
-    print(df_bank.head(3))
-
-    # Initialize the Reconciled column as an 'object' type (strings)
-    df_cash['Reconciled'] = None
-    df_cash['Reconciled'] = df_cash['Reconciled'].astype(object)
-
-    df_bank['Reconciled'] = None
-    df_bank['Reconciled'] = df_bank['Reconciled'].astype(object)
-
-    #df_bank['Acct_From_Filename'] = df_bank['Acct_From_Filename'].astype(str).str.strip()
-    acct_from_filename = int(df_bank['Acct_From_Filename'].iloc[0])
-    shortfundname = df_cash['FundShortName'].iloc[0]
-
-    # --- Data Cleaning (Add this section) ---
-    def clean_currency(column):
-        # 1. Convert to string and remove non-numeric chars
-        cleaned = column.astype(str).str.replace(r'[^\d.-]', '', regex=True)
-        # 2. Convert to numeric
-        numeric_vals = pd.to_numeric(cleaned, errors='coerce').fillna(0)
-        # 3. Round to 2 decimal places (nearest penny)
-        return numeric_vals.round(2)
-
-    # Helper to calculate Net Amount
-    def get_net(df):
-        return df['Credit'].fillna(0) - df['Debit'].fillna(0)
-
-    # Apply cleaning to both DataFrames
-    df_bank['Credit'] = clean_currency(df_bank['Credit'])
-    df_bank['Debit'] = clean_currency(df_bank['Debit'])
-    df_cash['Amount'] = clean_currency(df_cash['Amount'])
-
-    df_cash['Net'] = df_cash['Amount']
-    df_bank['Net'] = get_net(df_bank)
-
-    match_id = 1
-
+def match_missing_months(df_bank, df_cash, match_id):
     # --- 1. Check for Missing Bank Statement Months ---
     cash_months = df_cash['Date'].dt.to_period('M').unique()
     bank_months = df_bank['Calculated_Date'].dt.to_period('M').unique()
@@ -166,7 +106,9 @@ def cash_rec(data_dir, cash_rec_filename, bankstmt_filename):
 #        year = df_bank.loc[mask, 'Calculated_Date'].dt.year
         df_bank.loc[mask, 'Reconciled'] = f"CASH REC MISSING - {month}"
 
-    #print(df_bank[df_bank['Reconciled'].isna()])
+    return match_id
+
+def match_exact(df_bank, df_cash, match_id):
     # --- 2. Exact Matches (Date + Amount) ---
     # We iterate to ensure 1-to-1 matching if there are duplicate amounts on the same day
     for idx, row in df_bank[df_bank['Reconciled'].isna()].iterrows():
@@ -190,7 +132,9 @@ def cash_rec(data_dir, cash_rec_filename, bankstmt_filename):
             df_bank.at[idx, 'Reconciled'] = label
             df_cash.at[cash_idx, 'Reconciled'] = label
             match_id += 1
+    return match_id
 
+def match_split_same_day(df_bank, df_cash, match_id):
     # --- 3. Split Payments (2 Cash entries = 1 Bank entry) ---
     for idx, row in df_bank[df_bank['Reconciled'].isna()].iterrows():
         # Find all unreconciled cash items on the same day
@@ -209,7 +153,9 @@ def cash_rec(data_dir, cash_rec_filename, bankstmt_filename):
                     found = True
                     break
             if found: break
+    return match_id
 
+def match_year_offset(df_bank, df_cash, match_id):
     # --- 4. Bad Date: Year Errors (1, 2, 10 years) ---
     year_offsets = [1, 2, 10]
     for offset in year_offsets:
@@ -228,7 +174,9 @@ def cash_rec(data_dir, cash_rec_filename, bankstmt_filename):
                 df_bank.at[idx, 'Reconciled'] = label
                 df_cash.at[cash_idx, 'Reconciled'] = label
                 match_id += 1
+    return match_id
 
+def match_day_offset(df_bank, df_cash, match_id):
     # --- 5. Minor Bad Date: Day Errors (1 to 7 days) ---
     for days in range(1, 28):
         for idx, row in df_bank[df_bank['Reconciled'].isna()].iterrows():
@@ -244,7 +192,9 @@ def cash_rec(data_dir, cash_rec_filename, bankstmt_filename):
                 df_bank.at[idx, 'Reconciled'] = label
                 df_cash.at[cash_idx, 'Reconciled'] = label
                 match_id += 1
+    return match_id
 
+def match_penny_diff(df_bank, df_cash, match_id):
     # --- 5c. Small Amount Difference (Penny Matching) ---
     # We loop from 0.01 to 0.99 difference
     for diff in range(1, 100):
@@ -268,7 +218,9 @@ def cash_rec(data_dir, cash_rec_filename, bankstmt_filename):
                 df_bank.at[idx, 'Reconciled'] = label
                 df_cash.at[cash_idx, 'Reconciled'] = label
                 match_id += 1
+    return match_id
 
+def match_split_penny_diff(df_bank, df_cash, match_id):
     # --- 5d. Split Payments (Same Date) with Minor Amount Difference ---
     for diff in range(1, 100):
         tolerance = round(diff / 100, 2)
@@ -303,7 +255,10 @@ def cash_rec(data_dir, cash_rec_filename, bankstmt_filename):
                         found = True
                         break
                 if found: break
+    return match_id
 
+def match_split_near_date(df_bank, df_cash, match_id):
+    # --- 5e. Split Payments (2 Cash entries, one of them off by up to 7 days) ---
     for idx, row in df_bank[df_bank['Reconciled'].isna()].iterrows():
         bank_date = row['Calculated_Date']
         bank_net = row['Net']
@@ -338,7 +293,9 @@ def cash_rec(data_dir, cash_rec_filename, bankstmt_filename):
                     found = True
                     break
             if found: break
+    return match_id
 
+def match_split_date_shift(df_bank, df_cash, match_id):
     # --- 5f. Split Payments (Same Day) with Date Shift (< 3 days) ---
     # We loop through day offsets 1, 2, and 3
     for d_offset in range(1, 4):
@@ -379,7 +336,9 @@ def cash_rec(data_dir, cash_rec_filename, bankstmt_filename):
                             break
                     if found: break
                 if found: break
+    return match_id
 
+def match_month_offset(df_bank, df_cash, match_id):
     # --- 8. Moderate Bad Date: Day Errors (1 to 3 months) --- !!! CAUTION MANY PAYMENTS OFF BY A MONTH, THIS SHOULD BE ONE OF LAST CHECKS
     # We loop through a range of months (e.g., 1 to 3 months)
     for m_offset in range(1, 4):
@@ -405,7 +364,9 @@ def cash_rec(data_dir, cash_rec_filename, bankstmt_filename):
                 df_bank.at[idx, 'Reconciled'] = label
                 df_cash.at[cash_idx, 'Reconciled'] = label
                 match_id += 1
+    return match_id
 
+def match_daily_total(df_bank, df_cash, match_id):
     # --- 9. Bulk Daily Match (Totals per Date) ---
     # 1. Pre-calculate the daily sums for unreconciled cash
     # This creates a Series where the index is the Date and the value is the total Net
@@ -433,8 +394,158 @@ def cash_rec(data_dir, cash_rec_filename, bankstmt_filename):
             ] = label
 
             match_id += 1
+    return match_id
+
+# Matching stages in the order cash_rec runs them. Each takes the bank and cash frames,
+# labels rows in place and returns the next free match_id.
+MATCH_STAGES = [
+    ('missing_months', match_missing_months),
+    ('exact', match_exact),
+    ('split_same_day', match_split_same_day),
+    ('year_offset', match_year_offset),
+    ('day_offset', match_day_offset),
+    ('penny_diff', match_penny_diff),
+    ('split_penny_diff', match_split_penny_diff),
+    ('split_near_date', match_split_near_date),
+    ('split_date_shift', match_split_date_shift),
+    ('month_offset', match_month_offset),
+    ('daily_total', match_daily_total),
+]
+
+BACKENDS = ["pandas", "sqlite", "duckdb", "polars"]
+
+def make_matcher(backend, memory_budget=None):
+    """Stage engine for --backend (None = the pandas stages above)."""
+    if backend == "pandas":
+        return None
+    if backend == "polars":
+        return PolarsMatcher()
+    # --memory-budget text ('4GB', '2000000', ...) parsed once; the engine gets bytes
+    return SqlMatcher(backend, memory_limit=parse_size(memory_budget) if memory_budget else None,
+                      temp_dir=str(data_dir / "duckdb_tmp") if memory_budget else None)
+
+def file_digest(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+def compare_backend_timings(account_id, backend, pandas_records, backend_records, pandas_digest, backend_digest,
+                            events):
+    """
+    Per-stage wall time of one account on the pandas stages vs the selected backend, plus
+    whether both wrote the same report file (--compare).
+    """
+    identical = pandas_digest == backend_digest
+    backend_s = {r['stage']: r['wall_s'] for r in backend_records}
+    rows = [{
+        'account_id': account_id,
+        'stage': r['stage'],
+        'pandas_s': round(r['wall_s'], 6),
+        f'{backend}_s': round(backend_s.get(r['stage'], 0.0), 6),
+        'speedup': round(r['wall_s'] / backend_s[r['stage']], 2) if backend_s.get(r['stage']) else None,
+        'identical': identical,
+    } for r in pandas_records]
+    events.emit("backend_compare", account_id=account_id, backend=backend, identical=identical,
+                pandas_s=round(sum(r['wall_s'] for r in pandas_records), 3),
+                backend_s=round(sum(backend_s.values()), 3))
+    return rows
+
+# List of keywords to exclude
+exclude_keywords = [
+    "OPENING BALANCE",
+    "CLOSING BALANCE",
+    "BALANCE CARRIED FORWARD",
+    "BALANCE BROUGHT FORWARD"
+]
+
+def clean_bank_statement(df_bank):
+    # Create a combined regex pattern (e.g., "OPENING BALANCE|CLOSING BALANCE|...")
+    pattern = '|'.join(exclude_keywords)
+
+    # Filter the bank statement
+    # ~ is the 'NOT' operator, so we keep rows that DO NOT contain the pattern
+    df_bank = df_bank[~df_bank['Description1A'].astype(str).str.contains(pattern, case=False, na=False)].copy()
+
+    # Reset the index to keep things clean for the matching loops
+    df_bank = df_bank.reset_index(drop=True)
+
+    #df_bank['Calculated_Date'] = pd.to_datetime(df_bank['Calculated_Date'], errors='coerce')
+
+    #df_cash = force_dates(df_cash, 'Date')
+    df_bank = force_dates(df_bank, 'Calculated_Date')
+    df_bank = use_bankref_dates(df_bank)
+    #print(df_bank['Calculated_Date'])
+    return df_bank
+
+def init_match_columns(df_bank, df_cash):
+    # Initialize the Reconciled column as an 'object' type (strings)
+    df_cash['Reconciled'] = None
+    df_cash['Reconciled'] = df_cash['Reconciled'].astype(object)
+
+    df_bank['Reconciled'] = None
+    df_bank['Reconciled'] = df_bank['Reconciled'].astype(object)
 
-    print(f"Completed One-to-Many matching using Calculated_Date.")
+    # Net Amount (Credit, Debit and Amount are already cleaned to the nearest penny by the schema load)
+    df_cash['Net'] = df_cash['Amount']
+    df_bank['Net'] = df_bank['Credit'].fillna(0) - df_bank['Debit'].fillna(0)
+
+def cash_rec(data_dir, cash_rec_filename, bankstmt_filename, ledger=None, run_id=None, events=None, hooks=None,
+             chunk_rows=None, matcher=None, report_format="csv"):
+    # Progress goes out as structured events; the default stream just renders them on the console
+    if events is None:
+        events = EventStream.from_option(None)
+
+    # Per-stage wall time / matched counts, written to the run ledger at the end
+    account_start = time.perf_counter()
+    # (extra hooks, e.g. the --profile StageProfiler, see every stage too)
+    recorder = StageRecorder(Path(bankstmt_filename).stem.replace("bankstmt_flows_", ""),
+                             hooks=[events] + list(hooks or []))
+
+    with recorder.stage("load"):
+        # --- 0. Load Data ---
+        # Typed loads (src/schemas.py): only the columns used here, categoricals for the
+        # fund/type/currency labels, Amount/Debit/Credit cleaned to pennies
+        target_funds =  [fund_short_name]
+        if chunk_rows:
+            # Over the memory budget: stream the portfolio-wide cash file and keep only this fund's rows
+            df_cash = read_csv_filtered(data_dir / cash_rec_filename, 'FundShortName', target_funds, chunk_rows,
+                                        **read_kwargs("FullCashFlows"))
+            df_cash = apply_schema(df_cash, "FullCashFlows")
+        else:
+            df_cash = load_frame("FullCashFlows", data_dir / cash_rec_filename)
+        df_bank = load_frame("bankstmt_flows", input_path / bankstmt_filename)
+
+        # Filter cash flows for the right fund
+        df_cash = df_cash[df_cash['FundShortName'].isin(target_funds)].copy()
+        df_cash = df_cash.reset_index(drop=True)
+        df_cash['Date'] = pd.to_datetime(df_cash['Date'], errors='coerce')
+        events.log(f"Filtered Cash Rec to {len(df_cash)} relevant rows.", level="plain")
+
+        # Drop the balance lines and fix up Calculated_Date
+        df_bank = clean_bank_statement(df_bank)
+
+    with recorder.stage("prepare"):
+        # Reconciled (empty labels) and Net on both sides
+        init_match_columns(df_bank, df_cash)
+
+        #df_bank['Acct_From_Filename'] = df_bank['Acct_From_Filename'].astype(str).str.strip()
+        acct_from_filename = int(df_bank['Acct_From_Filename'].iloc[0])
+        shortfundname = df_cash['FundShortName'].iloc[0]
+        recorder.account_id = str(acct_from_filename)
+        events.emit("frames_loaded", account_id=acct_from_filename, fund_short_name=shortfundname,
+                    bank_rows=len(df_bank), cash_rows=len(df_cash),
+                    bank_mb=round(frame_memory_mb(df_bank), 3), cash_mb=round(frame_memory_mb(df_cash), 3))
+
+    match_id = 1
+
+    for stage_name, stage in MATCH_STAGES:
+        with recorder.stage(stage_name, df_bank, df_cash):
+            # --backend: sqlite/duckdb run the equality and offset stages as set-based SQL,
+            # polars runs every stage as joins on the open rows
+            if matcher is not None and matcher.handles(stage_name):
+                match_id = matcher.run(stage_name, df_bank, df_cash, match_id, fallback=stage)
+            else:
+                match_id = stage(df_bank, df_cash, match_id)
+
+    events.log("Completed One-to-Many matching using Calculated_Date.", level="plain")
 
 
     # 1. Group by Calculated_Date on the Bank side, and Date on the Cash side
@@ -527,175 +638,252 @@ def cash_rec(data_dir, cash_rec_filename, bankstmt_filename):
     missing_in_bank = sorted(list(cash_months - bank_months))
     missing_in_cash = sorted(list(bank_months - cash_months))
 
-    # 3. Print the Warning Report
-    print("\n" + "=" * 40)
-    print(f"       CASHREC AUDIT FOR {shortfundname} {acct_from_filename} ")
-    print("=" * 40)
-
-    if missing_in_bank:
-        print(f"⚠️  WARNING: Missing BANK STATEMENTS for the following months:")
-        for m in missing_in_bank:
-            print(f"   - {m}")
-    else:
-        print("✅ Bank Statement coverage is complete relative to CashRec.")
-
-    print("-" * 40)
+    # 3. Report coverage (rendered as the audit banner on the console)
+    events.emit("coverage", account_id=acct_from_filename, fund_short_name=shortfundname,
+                missing_bank_months=[str(m) for m in missing_in_bank],
+                missing_cash_months=[str(m) for m in missing_in_cash])
 
-    if missing_in_cash:
-        print(f"⚠️  WARNING: Missing CASHRECS for the following months:")
-        for m in missing_in_cash:
-            print(f"   - {m}")
-    else:
-        print("✅ CashRec coverage is complete relative to Bank Statements.")
-
-    print("=" * 40)
     # --- 6. List Remaining Differences ---
     unreconciled_bank = df_bank[df_bank['Reconciled'].isna()]
     unreconciled_cash = df_cash[df_cash['Reconciled'].isna()]
 
-    print(f"Unreconciled Bank Items: {len(unreconciled_bank)}")
-    print(f"Unreconciled Cash Items: {len(unreconciled_cash)}")
-
-    print("=" * 40 + "\n")
-
-    # --- 9. Save Summary to Audit Log CSV ---
-    log_file = project_root / "audit_log.csv"
-
-    # Prepare the data row
-    # We join the lists of missing months into strings so they fit in a single CSV cell
-    log_data = {
-        "Account Number": acct_from_filename,
-        "Fund Short Name": shortfundname,
-        "Unreconciled Cash Lines": len(unreconciled_cash),
-        "Unreconciled Bank Lines": len(unreconciled_bank),
-        "Number of Missing Bank Statements": len(missing_in_bank),
-        "Number of Missing Cash Rec Months": len(missing_in_cash),
-        "List of Missing Bank Statements": ", ".join([str(m) for m in missing_in_bank]),
-        "List of Missing Cash Rec Months": ", ".join([str(m) for m in missing_in_cash])
-    }
-
-    # Define headers
-    headers = log_data.keys()
-
-    # Write to CSV (Append mode 'a')
-    file_exists = os.path.isfile(log_file)
-
-    with open(log_file, mode='a', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=headers)
-
-        # Only write header if the file is new
-        if not file_exists:
-            writer.writeheader()
-
-        writer.writerow(log_data)
-
-    print(f"Audit log updated: {log_file}")
-
-    # Save to CSV
-    df_bank.to_csv(data_dir/'reconciled_bank.csv', index=False)
-    df_cash.to_csv(data_dir/'reconciled_cash.csv', index=False)
-
-    print("Reconciliation complete. Files saved.")
-
-    # --- 7. Create Combined Stacked Report (Clean Version) ---
-
-    # 1. Separate Matched from Unreconciled
-    # We identify 'Matched' as rows where 'Reconciled' is NOT null/empty
-    bank_matched = df_bank[df_bank['Reconciled'].notna()].copy()
-    cash_matched = df_cash[df_cash['Reconciled'].notna()].copy()
-
-    # Unreconciled are rows where 'Reconciled' IS null/empty
-    bank_unrec = df_bank[df_bank['Reconciled'].isna()].copy()
-    cash_unrec = df_cash[df_cash['Reconciled'].isna()].copy()
-
-    # 2. Block 1: Reconciled matches (Side-by-Side)
-    bank_sub = bank_matched[[
-        'Calculated_Date', 'Acct_From_Filename', 'Company_Name', 'CCY_Type',
-        'Description1A', 'Description1B', 'Description2', 'Debit', 'Credit', 'Reconciled'
-    ]]
-    cash_sub = cash_matched[[
-        'Reconciled', 'FundShortName', 'Type', 'Date', 'Detail', 'Net'
-    ]].rename(columns={'Date': 'Cash_Date', 'Net': 'Amount'})
-
-    # 1. Define the 'Missing' filter
-    missing_pattern = "MISSING"
-    # Missing = Has an ID and contains 'MISSING'
-    # (Usually these are in df_cash because the bank side doesn't exist)
-    bankstmt_missing = df_cash[df_cash['Reconciled'].str.contains(missing_pattern, na=False)].copy()
-
-    # Left merge handles the 1-to-1 and 1-to-many (splits)
-    block1 = pd.merge(bank_sub, cash_sub, on='Reconciled', how='left')
-
-    # Visual Blanking: Only show Bank info on the first row of a split match
-    bank_cols = ['Calculated_Date', 'Acct_From_Filename', 'Company_Name', 'CCY_Type',
-                 'Description1A', 'Description1B', 'Description2', 'Debit', 'Credit']
-    for col in bank_cols:
-        block1[col] = block1[col].astype(object)
-
-    # We only want to blank if:
-    # 1. The ID is duplicated (Split payment)
-    # 2. AND it's NOT a 'Missing' status label
-    is_duplicate = block1.duplicated(subset=['Reconciled'])
-    is_status_label = block1['Reconciled'].str.contains("MISSING|UNRECONCILED", na=False)
-
-    # Apply blanking only to real split duplicates
-    block1.loc[is_duplicate & ~is_status_label, bank_cols] = ""
-
-    #  block1.loc[block1.duplicated(subset=['Reconciled']), bank_cols] = ""
-
-    # 6. Block 4: Missing Statements (Cash side only)
-    block4 = bankstmt_missing[['Reconciled', 'FundShortName', 'Type', 'Date', 'Detail', 'Net']].rename(
-        columns={'Date': 'Cash_Date', 'Net': 'Amount'}).copy()
-    for col in bank_cols: block4[col] = ""
-
-    # 3. Block 2: Unreconciled Bank Rows
-    block2 = bank_unrec[[
-        'Calculated_Date', 'Acct_From_Filename', 'Company_Name', 'CCY_Type',
-        'Description1A', 'Description1B', 'Description2', 'Debit', 'Credit', 'Reconciled'
-    ]].copy()  # Added .copy() here for extra safety
-
-    for col in ['FundShortName', 'Type', 'Cash_Date', 'Detail', 'Amount']:
-        block2[col] = ""  # This will no longer trigger the warning
-
-    # 4. Block 3: Unreconciled Cash Rows
-    block3 = cash_unrec[[
-        'Reconciled', 'FundShortName', 'Type', 'Date', 'Detail', 'Net'
-    ]].rename(columns={'Date': 'Cash_Date', 'Net': 'Amount'}).copy()  # Added .copy() here
-
-    for col in bank_cols:
-        block3[col] = ""  # This will no longer trigger the warning
-
-    # 5. Combine and Export
-    final_report = pd.concat([block1, block4, block2, block3], ignore_index=True)
-
-    # Reorder columns for the final file
-    cols = bank_cols + ['Reconciled'] + ['FundShortName', 'Type', 'Cash_Date', 'Detail', 'Amount']
-    final_report = final_report[cols]
-
-    # Save to CSV
-    final_report.to_csv(data_dir/f'cashrec_report_{acct_from_filename}.csv', index=False)
-    return final_report
-
-## usage
-USDFundList_filename = "USDFund_Accountlist.csv"
-df_USDFundList = pd.read_csv(data_dir / USDFundList_filename)
-##"bankstmt_flows_400310050003.csv"
-
-for i, fund in enumerate(df_USDFundList['FundShortName']):
-    if i <133:
+    with recorder.stage("report"):
+        # Save the labelled frames (streamed out in chunks)
+        write_frame(df_bank, data_dir/'reconciled_bank', report_format)
+        write_frame(df_cash, data_dir/'reconciled_cash', report_format)
+
+        events.log("Reconciliation complete. Files saved.", level="plain")
+
+        # --- 7. Create Combined Stacked Report ---
+        # Matched bank rows each followed by their cash rows (bank cells blanked on the 2nd+ row
+        # of a split), then missing statements, unreconciled bank and unreconciled cash rows
+        report = ReportPlan(df_bank, df_cash)
+        report_path = report.write(data_dir/f'cashrec_report_{acct_from_filename}', report_format)
+
+    # --- 9. Save Summary to the Run Ledger ---
+    # One row per account plus one row per stage (replaces the old append-only audit_log.csv;
+    # `python -m src.run_ledger audit` exports a run in that layout)
+    if ledger is not None:
+        matched_bank = df_bank['Reconciled'].notna() & ~df_bank['Reconciled'].str.contains("MISSING", na=False)
+        matched_cash = df_cash['Reconciled'].notna() & ~df_cash['Reconciled'].str.contains("MISSING", na=False)
+        ledger.record_account(
+            run_id, acct_from_filename,
+            fund_short_name=shortfundname,
+            bank_lines=len(df_bank),
+            cash_lines=len(df_cash),
+            matched_bank_lines=int(matched_bank.sum()),
+            matched_cash_lines=int(matched_cash.sum()),
+            unreconciled_bank_lines=len(unreconciled_bank),
+            unreconciled_cash_lines=len(unreconciled_cash),
+            matched_bank_amount=float(df_bank.loc[matched_bank, 'Net'].abs().sum()),
+            missing_bank_months=len(missing_in_bank),
+            missing_cash_months=len(missing_in_cash),
+            missing_bank_list=", ".join([str(m) for m in missing_in_bank]),
+            missing_cash_list=", ".join([str(m) for m in missing_in_cash]),
+            wall_s=time.perf_counter() - account_start,
+            peak_mem_mb=peak_rss_mb(),
+            py_peak_mb=max((r['py_peak_mb'] for r in recorder.records if r.get('py_peak_mb') is not None), default=None),
+            load_mode="chunked" if chunk_rows else "full",
+        )
+        ledger.record_stages(run_id, acct_from_filename, recorder.records)
+        events.log(f"Run ledger updated: {ledger.db_path} (run {run_id})", level="plain")
+
+    account_wall = time.perf_counter() - account_start
+    events.emit("account_end", account_id=acct_from_filename, fund_short_name=shortfundname,
+                bank_rows=len(df_bank), cash_rows=len(df_cash),
+                unreconciled_bank=len(unreconciled_bank), unreconciled_cash=len(unreconciled_cash),
+                match_counts=match_label_counts(df_bank['Reconciled']),
+                wall_s=round(account_wall, 3),
+                rows_per_s=round((len(df_bank) + len(df_cash)) / account_wall, 1) if account_wall > 0 else None)
+    return report_path
+
+def preview_account(df_cash_all, bankstmt_path, fund, months_per_year=DEFAULT_PREVIEW_MONTHS, seed=0, matcher=None):
+    """
+    Quick look at one account: runs only the leading same-date stages (PREVIEW_STAGES) on a sample of
+    months per calendar year and extrapolates how many lines they leave open for the
+    expensive stages, with 95% confidence intervals. Line and missing-month counts are exact.
+    """
+    df_bank = clean_bank_statement(load_frame("bankstmt_flows", bankstmt_path))
+    df_cash = df_cash_all[df_cash_all['FundShortName'].isin([fund])].reset_index(drop=True)
+    df_cash['Date'] = pd.to_datetime(df_cash['Date'], errors='coerce')
+    bank_month = df_bank['Calculated_Date'].dt.to_period('M')
+    cash_month = df_cash['Date'].dt.to_period('M')
+    bank_months, cash_months = set(bank_month.dropna()), set(cash_month.dropna())
+    months = sorted(bank_months | cash_months)
+    sampled = sample_months(months, months_per_year, seed)
+
+    sample_bank = df_bank[bank_month.isin(sampled)].reset_index(drop=True)
+    sample_cash = df_cash[cash_month.isin(sampled)].reset_index(drop=True)
+    init_match_columns(sample_bank, sample_cash)
+    match_id = 1
+    stages = dict(MATCH_STAGES)
+    for stage_name in PREVIEW_STAGES:
+        if matcher is not None and matcher.handles(stage_name):
+            match_id = matcher.run(stage_name, sample_bank, sample_cash, match_id, fallback=stages[stage_name])
+        else:
+            match_id = stages[stage_name](sample_bank, sample_cash, match_id)
+
+    def per_month(df, date_col):
+        month = df[date_col].dt.to_period('M')
+        counts = pd.DataFrame({'lines': month.value_counts(), 'open': month[df['Reconciled'].isna()].value_counts()})
+        return counts.reindex(sampled).fillna(0)
+
+    row = {'account_id': int(df_bank['Acct_From_Filename'].iloc[0]) if len(df_bank) else None,
+           'fund_short_name': fund, 'months': len(months), 'sampled_months': len(sampled),
+           'missing_bank_months': len(cash_months - bank_months), 'missing_cash_months': len(bank_months - cash_months)}
+    for side, df, date_col in (('bank', sample_bank, 'Calculated_Date'), ('cash', sample_cash, 'Date')):
+        lines = len(df_bank) if side == 'bank' else len(df_cash)
+        for key, value in estimate_side(per_month(df, date_col), months, lines).items():
+            row[f'{side}_{key}'] = value
+    # Expected pain: lines the expensive stages will have to search / that may end up as exceptions
+    row['expected_open_lines'] = round(row['bank_open_est'] + row['cash_open_est'], 1)
+    return row
+
+def preview_portfolio(df_fund_list, months_per_year=DEFAULT_PREVIEW_MONTHS, seed=0, matcher=None, events=None,
+                      max_accounts=133):
+    """preview_account for every account of the fund list (cash flows file loaded once) -> ranking, worst first."""
+    if events is None:
+        events = EventStream.from_option(None)
+    df_cash_all = load_frame("FullCashFlows", data_dir / full_cashflows_filename)
+    rows = []
+    for i in range(min(len(df_fund_list), max_accounts)):
+        account_number = df_fund_list['Account'].iloc[i]
+        fund = df_fund_list['FundShortName'].iloc[i]
+        start = time.perf_counter()
         try:
-            account_number = df_USDFundList['Account'].iloc[i]
-            fund_short_name = df_USDFundList['FundShortName'].iloc[i]
-            print(i, fund_short_name, account_number)
-            #cash_rec_filename = f'cash_rec_{account_number}.csv'
-            cash_rec_filename = f'FullCashFlows_20260126v2.csv'
-            bankstmt_filename = f'bankstmt_flows_{account_number}.csv'
-            cash_rec(data_dir, cash_rec_filename, bankstmt_filename)
+            row = preview_account(df_cash_all, input_path / f'bankstmt_flows_{account_number}.csv', fund,
+                                  months_per_year, seed, matcher)
         except Exception as e:
-            print(e)
-# account_number = "400310062003"
-# #cash_rec_filename = f'cash_rec_{account_number}.csv'
-# cash_rec_filename = f'FullCashFlows.csv'
-# bankstmt_filename = f'bankstmt_flows_{account_number}.csv'
-#
-# cash_rec(data_dir, cash_rec_filename, bankstmt_filename)
\ No newline at end of file
+            events.emit("error", account_id=account_number, fund_short_name=fund,
+                        error=str(e), error_type=type(e).__name__, traceback=traceback.format_exc())
+            continue
+        row['wall_s'] = round(time.perf_counter() - start, 3)
+        events.log(f"{account_number} ({fund}): ~{row['expected_open_lines']:,.0f} open lines expected, "
+                   f"bank match rate {row['bank_match_rate']} [{row['bank_match_rate_ci_low']}, "
+                   f"{row['bank_match_rate_ci_high']}]", level="plain")
+        rows.append(row)
+    ranking = pd.DataFrame(rows)
+    if not ranking.empty:
+        ranking = ranking.sort_values('expected_open_lines', ascending=False, kind='stable').reset_index(drop=True)
+        ranking.insert(0, 'rank', np.arange(1, len(ranking) + 1))
+    return ranking
+
+## usage
+if __name__ == "__main__":
+    df_USDFundList = pd.read_csv(data_dir / USDFundList_filename)
+    ##"bankstmt_flows_400310050003.csv"
+
+    parser = argparse.ArgumentParser(description="Cash rec batch over the accounts in USDFund_Accountlist.csv")
+    parser.add_argument("--events", help="Also write JSONL progress events to this file ('-' = stdout only, no console text)")
+    parser.add_argument("--show-stages", action="store_true", help="Print per-stage timings on the console")
+    parser.add_argument("--profile", type=Path,
+                        help="Profile every stage of every account into this directory (cProfile + sampled stacks)")
+    parser.add_argument("--memory-budget",
+                        help="Per-account memory budget, e.g. 4GB; accounts estimated above it load the cash file in chunks")
+    parser.add_argument("--backend", choices=BACKENDS, default="pandas",
+                        help="Matching engine: sqlite (stdlib) / duckdb (optional, out-of-core) for the exact/offset/penny "
+                             "stages, polars (optional) for every stage")
+    parser.add_argument("--compare", action="store_true",
+                        help="Also run each account on the pandas path; check the reports match and write backend_timings.csv")
+    parser.add_argument("--report-format", choices=REPORT_FORMATS, default="csv",
+                        help="Format of cashrec_report_*, reconciled_bank and reconciled_cash (parquet needs pyarrow, "
+                             "xlsx needs xlsxwriter; the xlsx report has one sheet per block)")
+    parser.add_argument("--memory-trace", type=Path,
+                        help="Track RSS and tracemalloc peaks per account and stage; write snapshots and memory_profile.csv here")
+    parser.add_argument("--preview", action="store_true",
+                        help="Instead of the full batch, reconcile a sample of months per account with the leading "
+                             "same-date stages only and write preview_ranking.csv (accounts ranked by expected open lines)")
+    parser.add_argument("--preview-months", type=int, default=DEFAULT_PREVIEW_MONTHS,
+                        help="Months sampled per calendar year in --preview")
+    parser.add_argument("--seed", type=int, default=0, help="Month sample seed for --preview")
+    args = parser.parse_args()
+
+    events = EventStream.from_option(args.events, show_stages=args.show_stages)
+    if args.preview:
+        preview_start = time.perf_counter()
+        ranking = preview_portfolio(df_USDFundList, args.preview_months, args.seed,
+                                    make_matcher(args.backend, args.memory_budget), events)
+        ranking.to_csv(data_dir / "preview_ranking.csv", index=False)
+        events.log(f"Preview of {len(ranking)} accounts in {time.perf_counter() - preview_start:,.1f}s; "
+                   f"ranking written to {data_dir / 'preview_ranking.csv'}")
+        events.close()
+        raise SystemExit(0)
+    profiler = StageProfiler(args.profile) if args.profile else None
+    budget = MemoryBudget.from_option(args.memory_budget)
+    tracker = MemoryTracker(args.memory_trace) if args.memory_trace else None
+    hooks = [h for h in (profiler, tracker) if h is not None]
+    matcher = make_matcher(args.backend, args.memory_budget)
+    timings = []
+    ledger = RunLedger(LEDGER_PATH)
+    run_id = ledger.start_run("cashrec.py", {"accounts_file": USDFundList_filename,
+                                             "cash_rec_filename": full_cashflows_filename, **vars(args)})
+    events.run_id = run_id
+    events.emit("run_start", entry_point="cashrec.py", accounts=len(df_USDFundList))
+    run_start = time.perf_counter()
+    processed, failed = 0, 0
+
+    for i, fund in enumerate(df_USDFundList['FundShortName']):
+        if i <133:
+            try:
+                account_number = df_USDFundList['Account'].iloc[i]
+                fund_short_name = df_USDFundList['FundShortName'].iloc[i]
+                events.emit("account_start", index=i, account_id=account_number, fund_short_name=fund_short_name)
+                #cash_rec_filename = f'cash_rec_{account_number}.csv'
+                cash_rec_filename = full_cashflows_filename
+                bankstmt_filename = f'bankstmt_flows_{account_number}.csv'
+                chunk_rows = None
+                if budget is not None:
+                    estimate = estimate_frame_bytes([data_dir / cash_rec_filename, input_path / bankstmt_filename])
+                    if budget.exceeded_by(estimate):
+                        chunk_rows = budget.chunk_rows(data_dir / cash_rec_filename)
+                        events.log(f"Estimated {estimate / 2**20:,.0f} MB is over the memory budget; "
+                                   f"loading cash flows in chunks of {chunk_rows:,} rows", level="warn")
+                account_hooks = list(hooks)
+                if args.compare and matcher is not None:
+                    # Reference run on the pandas stages first (silent, no ledger), so the report
+                    # left on disk is the one from the selected backend
+                    pandas_log, backend_log = StageLog(), StageLog()
+                    pandas_digest = file_digest(cash_rec(data_dir, cash_rec_filename, bankstmt_filename,
+                                                         events=EventStream(), hooks=[pandas_log], chunk_rows=chunk_rows,
+                                                         report_format=args.report_format))
+                    account_hooks.append(backend_log)
+                try:
+                    report = cash_rec(data_dir, cash_rec_filename, bankstmt_filename, ledger=ledger, run_id=run_id,
+                                      events=events, hooks=account_hooks, chunk_rows=chunk_rows, matcher=matcher,
+                                      report_format=args.report_format)
+                except MemoryError:
+                    if chunk_rows:
+                        raise
+                    # Estimate was too optimistic (or no budget given): retry once with the chunked load
+                    chunk_rows = (budget or MemoryBudget(2**30)).chunk_rows(data_dir / cash_rec_filename)
+                    events.log(f"Out of memory; retrying with chunks of {chunk_rows:,} rows", level="warn")
+                    report = cash_rec(data_dir, cash_rec_filename, bankstmt_filename, ledger=ledger, run_id=run_id,
+                                      events=events, hooks=account_hooks, chunk_rows=chunk_rows, matcher=matcher,
+                                      report_format=args.report_format)
+                if args.compare and matcher is not None:
+                    timings += compare_backend_timings(account_number, args.backend, pandas_log.records,
+                                                       backend_log.records, pandas_digest, file_digest(report), events)
+                processed += 1
+            except Exception as e:
+                failed += 1
+                events.emit("error", account_id=account_number, fund_short_name=fund_short_name,
+                            error=str(e), error_type=type(e).__name__, traceback=traceback.format_exc())
+                ledger.record_account(run_id, account_number, fund_short_name=fund_short_name, error=repr(e))
+    ledger.finish_run(run_id)
+    if profiler is not None:
+        profiler.write_summary()
+        events.log(f"Stage profiles and cross-account summary written to {args.profile}")
+    if timings:
+        pd.DataFrame(timings).to_csv(data_dir / "backend_timings.csv", index=False)
+        events.log(f"Per-stage pandas vs {args.backend} timings written to {data_dir / 'backend_timings.csv'}")
+    if tracker is not None:
+        tracker.write_summary(args.memory_trace / "memory_profile.csv")
+        events.log(f"Memory snapshots and memory_profile.csv written to {args.memory_trace}")
+    events.emit("run_end", accounts=processed, failed=failed, wall_s=round(time.perf_counter() - run_start, 3))
+    events.close()
+    # account_number = "400310062003"
+    # #cash_rec_filename = f'cash_rec_{account_number}.csv'
+    # cash_rec_filename = f'FullCashFlows.csv'
+    # bankstmt_filename = f'bankstmt_flows_{account_number}.csv'
+    #
+    # cash_rec(data_dir, cash_rec_filename, bankstmt_filename)
\ No newline at end of file
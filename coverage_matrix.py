@@ -0,0 +1,125 @@
+import pandas as pd
+
+from cashrec import (
+    data_dir, input_path, USDFundList_filename, full_cashflows_filename,
+    force_dates, use_bankref_dates, exclude_keywords
+)
+
+# Default terminal output formatting
+pd.set_option('display.max_columns', None)
+pd.set_option('display.expand_frame_repr', False)
+
+matrix_filename = "statement_coverage_matrix.csv"
+gaps_filename = "statement_coverage_gaps.csv"
+
+
+def load_bank_months(df_accounts):
+    """
+    Reads only the date/description columns of every bankstmt_flows_{account}.csv and
+    returns one row per kept bank line: Account, Month.
+    """
+    frames = []
+    for account in df_accounts['Account'].unique():
+        bank_file = input_path / f'bankstmt_flows_{account}.csv'
+        if not bank_file.exists():
+            print(f"[WARN] No bank statement file for {account}: {bank_file}")
+            continue
+        df_bank = pd.read_csv(
+            bank_file,
+            usecols=lambda c: c in ('Calculated_Date', 'Date from BankRef', 'Description1A')
+        )
+        pattern = '|'.join(exclude_keywords)
+        df_bank = df_bank[~df_bank['Description1A'].astype(str).str.contains(pattern, case=False, na=False)].copy()
+        if 'Date from BankRef' not in df_bank.columns:
+            df_bank['Date from BankRef'] = None
+        df_bank = force_dates(df_bank, 'Calculated_Date')
+        df_bank = use_bankref_dates(df_bank)
+        frames.append(pd.DataFrame({
+            'Account': account,
+            'Month': df_bank['Calculated_Date'].dt.to_period('M'),
+        }))
+    if not frames:
+        return pd.DataFrame(columns=['Account', 'Month'])
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_cash_months(df_accounts, cash_rec_filename):
+    """
+    Reads FullCashFlows once (two columns only) and returns one row per cash line of a
+    listed fund: FundShortName, Month.
+    """
+    df_cash = pd.read_csv(data_dir / cash_rec_filename, usecols=['FundShortName', 'Date'])
+    df_cash = df_cash[df_cash['FundShortName'].isin(df_accounts['FundShortName'].unique())]
+    # Parsed per fund, as cash_rec does after its fund filter: the inferred date format
+    # comes from each fund's own rows, not from whichever fund is first in the file
+    dates = df_cash.groupby('FundShortName')['Date'].transform(lambda s: pd.to_datetime(s, errors='coerce'))
+    return pd.DataFrame({
+        'FundShortName': df_cash['FundShortName'],
+        'Month': pd.to_datetime(dates).dt.to_period('M'),
+    })
+
+
+def coverage_matrix(df_accounts, bank_months, cash_months):
+    """
+    Builds the long account x month coverage table with one groupby per source.
+    Status follows the cash_rec labels: a month with cash flows but no bank lines is
+    'BANK STATEMENT MISSING', a month with bank lines but no cash flows is 'CASH REC MISSING'.
+    """
+    accounts = df_accounts[['Account', 'FundShortName']].drop_duplicates()
+
+    bank_counts = bank_months.groupby(['Account', 'Month']).size().rename('Bank_Lines').reset_index()
+
+    # Cash flows are per fund; every account of the fund sees the same cash months (as in cash_rec)
+    cash_counts = cash_months.groupby(['FundShortName', 'Month']).size().rename('Cash_Lines').reset_index()
+    cash_counts = accounts.merge(cash_counts, on='FundShortName', how='inner')[['Account', 'Month', 'Cash_Lines']]
+
+    coverage = pd.merge(bank_counts, cash_counts, on=['Account', 'Month'], how='outer')
+    coverage = accounts.merge(coverage, on='Account', how='right')
+    coverage[['Bank_Lines', 'Cash_Lines']] = coverage[['Bank_Lines', 'Cash_Lines']].fillna(0).astype('int64')
+
+    coverage['Status'] = 'OK'
+    coverage.loc[coverage['Bank_Lines'].eq(0), 'Status'] = 'BANK STATEMENT MISSING'
+    coverage.loc[coverage['Cash_Lines'].eq(0), 'Status'] = 'CASH REC MISSING'
+
+    return coverage.sort_values(['Account', 'Month']).reset_index(drop=True)
+
+
+def coverage_pivot(coverage):
+    """Wide view: one row per account, one column per month, cells OK / NO BANK / NO CASH."""
+    codes = coverage['Status'].map({
+        'OK': 'OK',
+        'BANK STATEMENT MISSING': 'NO BANK',
+        'CASH REC MISSING': 'NO CASH',
+    })
+    wide = (
+        coverage.assign(Code=codes, Month=coverage['Month'].astype(str))
+        .pivot(index=['Account', 'FundShortName'], columns='Month', values='Code')
+        .fillna('')
+        .sort_index(axis=1)
+    )
+    return wide.reset_index()
+
+
+def run_coverage(cash_rec_filename=full_cashflows_filename, output_dir=data_dir):
+    df_accounts = pd.read_csv(data_dir / USDFundList_filename, usecols=['FundShortName', 'Account'])
+
+    bank_months = load_bank_months(df_accounts)
+    cash_months = load_cash_months(df_accounts, cash_rec_filename)
+
+    coverage = coverage_matrix(df_accounts, bank_months, cash_months)
+    gaps = coverage[coverage['Status'] != 'OK']
+
+    coverage_pivot(coverage).to_csv(output_dir / matrix_filename, index=False)
+    gaps.to_csv(output_dir / gaps_filename, index=False)
+
+    print(f"Coverage computed for {coverage['Account'].nunique()} accounts, "
+          f"{coverage['Month'].nunique()} months.")
+    print(f"Missing bank statement months: {(gaps['Status'] == 'BANK STATEMENT MISSING').sum()}")
+    print(f"Missing cash rec months: {(gaps['Status'] == 'CASH REC MISSING').sum()}")
+    print(f"Saved: {output_dir / matrix_filename}, {output_dir / gaps_filename}")
+    return coverage
+
+
+## usage
+if __name__ == "__main__":
+    run_coverage()
@@ -0,0 +1,321 @@
+import argparse
+import io
+import json
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+import cashrec
+from src.synthetic import write_dataset, parse_mix, CASH_FILENAME, ACCOUNTS_FILENAME
+
+# Default terminal output formatting
+pd.set_option('display.max_columns', None)
+pd.set_option('display.expand_frame_repr', False)
+
+project_root = Path(__file__).resolve().parent
+baselines_path = cashrec.data_dir / "benchmark" / "timing_baselines.json"
+differences_filename = "equivalence_differences.csv"
+timings_filename = "equivalence_timings.csv"
+
+# reconcile_account outputs compared row by row (all as text)
+TAGGING_COLS = ["Match_ID", "Type_Group", "Tag", "Investor", "Originator", "SPV", "Tag_Year", "Tag_Source",
+                "Tag_Year_Required_Missing", "Amount_Diff", "Date_Lag_Days", "Status"]
+# Columns shown next to a differing Reconciled label to identify the row
+BANK_ID_COLS = ["Calculated_Date", "Description1B", "Description2", "Net"]
+CASH_ID_COLS = ["Date", "Type", "Detail", "Net"]
+
+# Runs inside one source tree (cwd = the tree), so it only relies on what every revision of
+# cashrec.py has: cash_rec(data_dir, cash_rec_filename, bankstmt_filename) plus the
+# input_path / fund_short_name globals. Stage timings, the silent event stream and the
+# matcher are used only when that revision's cash_rec / reconcile_account accept them.
+DRIVER = r'''
+import inspect, json, sys, time
+from pathlib import Path
+import pandas as pd
+
+cfg = json.loads(Path(sys.argv[1]).read_text())
+import cashrec
+
+def stage_log():
+    try:
+        from src.stages import StageLog
+        return StageLog()
+    except ImportError:
+        return None
+
+def timed(fn, kwargs, params, prefix):
+    log = stage_log() if "hooks" in params or "recorder" in params else None
+    if log is not None and "hooks" in params:
+        kwargs["hooks"] = [log]
+    elif log is not None:
+        from src.stages import StageRecorder
+        kwargs["recorder"] = StageRecorder(hooks=[log])
+    start = time.perf_counter()
+    result = fn(**kwargs)
+    timings = {f"{prefix}.total": time.perf_counter() - start}
+    for r in (log.records if log is not None else []):
+        key = f"{prefix}.{r['stage']}"
+        timings[key] = timings.get(key, 0.0) + r["wall_s"]
+    return result, timings
+
+def best(runs):
+    return {k: min(t.get(k, float("inf")) for t in runs) for k in runs[0]}
+
+out = {}
+rec_params = inspect.signature(cashrec.cash_rec).parameters
+for acct in cfg["accounts"]:
+    work = Path(cfg["work"]) / str(acct["Account"])
+    work.mkdir(parents=True, exist_ok=True)
+    link = work / cfg["cash_filename"]
+    if not link.exists():
+        link.symlink_to(Path(cfg["dataset"]) / cfg["cash_filename"])
+    cashrec.input_path = Path(cfg["dataset"])
+    cashrec.fund_short_name = acct["FundShortName"]
+    runs = []
+    for _ in range(cfg["repeat"]):
+        kwargs = {"data_dir": work, "cash_rec_filename": cfg["cash_filename"],
+                  "bankstmt_filename": f"bankstmt_flows_{acct['Account']}.csv"}
+        if "events" in rec_params:
+            from src.events import EventStream
+            kwargs["events"] = EventStream()
+        if cfg["backend"] != "pandas" and "matcher" in rec_params:
+            kwargs["matcher"] = cashrec.make_matcher(cfg["backend"])
+        runs.append(timed(cashrec.cash_rec, kwargs, rec_params, "cash_rec")[1])
+    timings = best(runs)
+
+    if cfg["rules_dir"]:
+        from src.reconcile import reconcile_account
+        from src.rules_csv import load_rules_from_csv
+        rules = load_rules_from_csv(Path(cfg["rules_dir"]))
+        params = inspect.signature(reconcile_account).parameters
+        report_dir = Path(cfg["tag_input"]) / str(acct["Account"]) if cfg["tag_input"] else work
+        report = report_dir / f"cashrec_report_{acct['Account']}.csv"
+        runs = []
+        for _ in range(cfg["repeat"]):
+            df = pd.read_csv(report, dtype=str)
+            (detailed, *_), t = timed(reconcile_account, {"df": df, "account_id": str(acct["Account"]), "rules": rules},
+                                      params, "reconcile")
+            runs.append(t)
+        timings.update(best(runs))
+        detailed.reindex(columns=cfg["tagging_cols"]).to_csv(work / "tagged.csv", index=False)
+    out[str(acct["Account"])] = timings
+
+Path(sys.argv[2]).write_text(json.dumps(out))
+'''
+
+
+def export_revision(revision, dest, accounts_file):
+    """
+    Materialises `revision` of this repo into `dest` (git archive, so the work tree is
+    untouched). Older revisions of cashrec.py read USDFund_Accountlist.csv from their
+    data_dir (<tree>/../data) on import, so the dataset's account list is put there.
+    """
+    archive = subprocess.run(["git", "-C", str(project_root), "archive", "--format=tar", revision],
+                             check=True, capture_output=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(dest)
+    tree_data_dir = Path(dest).parent / cashrec.data_dir.name
+    tree_data_dir.mkdir(exist_ok=True)
+    shutil.copy(accounts_file, tree_data_dir / cashrec.USDFundList_filename)
+    return Path(dest)
+
+
+def run_tree(tree, work, dataset, backend, repeat, rules_dir=None, tag_input=None):
+    """Runs DRIVER in `tree` over every account of `dataset` -> {account: {stage: seconds}}."""
+    work.mkdir(parents=True, exist_ok=True)
+    cfg_path, result_path = work / "driver_config.json", work / "driver_result.json"
+    cfg_path.write_text(json.dumps({
+        "dataset": str(dataset["dir"]), "cash_filename": dataset["cash_filename"], "accounts": dataset["accounts"],
+        "work": str(work), "backend": backend, "repeat": repeat, "tagging_cols": TAGGING_COLS,
+        "rules_dir": str(rules_dir) if rules_dir else None, "tag_input": str(tag_input) if tag_input else None,
+    }))
+    proc = subprocess.run([sys.executable, "-c", DRIVER, str(cfg_path), str(result_path)], cwd=tree,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Driver failed in {tree}:\n{proc.stderr[-4000:]}")
+    return json.loads(result_path.read_text())
+
+
+def _read_text(path):
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def compare_reconciled(ref_work, cand_work, accounts):
+    """Row-by-row Reconciled labels of reconciled_bank / reconciled_cash -> one row per difference."""
+    diffs = []
+    for acct in accounts:
+        acct_id = str(acct["Account"])
+        for side, filename, id_cols in (("bank", "reconciled_bank.csv", BANK_ID_COLS),
+                                        ("cash", "reconciled_cash.csv", CASH_ID_COLS)):
+            ref, cand = _read_text(ref_work / acct_id / filename), _read_text(cand_work / acct_id / filename)
+            if len(ref) != len(cand):
+                diffs.append({"account_id": acct_id, "check": "reconciled", "side": side, "row": None,
+                              "reference": f"{len(ref)} rows", "candidate": f"{len(cand)} rows"})
+                continue
+            differs = (ref["Reconciled"] != cand["Reconciled"]).to_numpy().nonzero()[0]
+            for i in differs:
+                diffs.append({"account_id": acct_id, "check": "reconciled", "side": side, "row": int(i),
+                              "reference": ref["Reconciled"].iat[i], "candidate": cand["Reconciled"].iat[i],
+                              **{c: ref[c].iat[i] for c in id_cols if c in ref.columns}})
+    return diffs
+
+
+def compare_tagging(ref_work, cand_work, accounts):
+    """reconcile_account outputs (TAGGING_COLS) of both trees on the same report -> one row per differing cell."""
+    diffs = []
+    for acct in accounts:
+        acct_id = str(acct["Account"])
+        ref, cand = _read_text(ref_work / acct_id / "tagged.csv"), _read_text(cand_work / acct_id / "tagged.csv")
+        if len(ref) != len(cand):
+            diffs.append({"account_id": acct_id, "check": "tagging", "side": None, "row": None,
+                          "reference": f"{len(ref)} rows", "candidate": f"{len(cand)} rows"})
+            continue
+        for col in TAGGING_COLS:
+            for i in (ref[col] != cand[col]).to_numpy().nonzero()[0]:
+                diffs.append({"account_id": acct_id, "check": "tagging", "side": col, "row": int(i),
+                              "reference": ref[col].iat[i], "candidate": cand[col].iat[i]})
+    return diffs
+
+
+def total_timings(per_account):
+    """Stage seconds summed over the accounts."""
+    totals = {}
+    for timings in per_account.values():
+        for stage, seconds in timings.items():
+            totals[stage] = totals.get(stage, 0.0) + seconds
+    return totals
+
+
+def timing_table(reference, candidate, baseline, max_slowdown, min_seconds):
+    """Per stage: this session's reference and candidate seconds, the stored baseline and the verdict."""
+    rows = []
+    for stage, cand_s in candidate.items():
+        base_s = baseline.get(stage)
+        change = (cand_s - base_s) / base_s * 100 if base_s else None
+        if base_s is None:
+            status = "no baseline"
+        elif base_s < min_seconds:
+            status = "ignored (fast)"
+        elif change > max_slowdown:
+            status = "SLOWER"
+        else:
+            status = "ok"
+        rows.append({"stage": stage, "reference_s": reference.get(stage), "candidate_s": cand_s,
+                     "baseline_s": base_s, "change_pct": round(change, 1) if change is not None else None,
+                     "status": status})
+    return pd.DataFrame(rows, columns=["stage", "reference_s", "candidate_s", "baseline_s", "change_pct", "status"])
+
+
+def load_baselines(path):
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def save_baseline(path, key, timings, revision):
+    baselines = load_baselines(path)
+    baselines[key] = {"recorded": time.strftime("%Y-%m-%dT%H:%M:%S"), "candidate": revision,
+                      "stages": {stage: round(s, 4) for stage, s in timings.items()}}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(baselines, indent=2, sort_keys=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check a candidate cash_rec / reconcile_account gives the same matches as a frozen reference "
+                    "revision and has not got slower than its stored timing baselines")
+    parser.add_argument("--reference", default="HEAD", help="Git revision used as the frozen reference")
+    parser.add_argument("--candidate", help="Git revision to test (default: the current work tree)")
+    parser.add_argument("--dataset", type=Path,
+                        help=f"Directory with anonymised inputs: {CASH_FILENAME} (see --cash-file), bankstmt_flows_*.csv "
+                             f"and {ACCOUNTS_FILENAME} (FundShortName, Account); default: a synthetic dataset")
+    parser.add_argument("--cash-file", default=CASH_FILENAME, help="Cash flows file name inside --dataset")
+    parser.add_argument("--rows", type=int, default=2_000, help="Synthetic transactions per account")
+    parser.add_argument("--accounts", type=int, default=2, help="Synthetic accounts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mix", action="append", metavar="KIND=SHARE", help="Synthetic transaction mix override")
+    parser.add_argument("--backend", choices=cashrec.BACKENDS, default="pandas", help="Matching engine of both runs")
+    parser.add_argument("--rules-dir", type=Path,
+                        help="Also compare reconcile_account outputs with these CSV rules (both trees tag the "
+                             "reference's cashrec reports)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per tree; the fastest time per stage is kept")
+    parser.add_argument("--baselines", type=Path, default=baselines_path, help="Timing baselines JSON")
+    parser.add_argument("--max-slowdown", type=float, default=20.0,
+                        help="Fail when a stage is more than this many percent slower than its baseline")
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                        help="Stages with a baseline under this many seconds are not gated (timer noise)")
+    parser.add_argument("--update-baselines", action="store_true",
+                        help="Store the candidate's timings as the new baselines (only if the matches are identical)")
+    parser.add_argument("--out", type=Path, default=cashrec.data_dir / "equivalence",
+                        help="Directory for the differences and timings CSVs")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="cashrec_gate_") as tmp:
+        tmp = Path(tmp)
+        if args.dataset:
+            accounts = pd.read_csv(args.dataset / ACCOUNTS_FILENAME)[["FundShortName", "Account"]]
+            dataset = {"dir": args.dataset.resolve(), "cash_filename": args.cash_file,
+                       "accounts": [{"FundShortName": str(f), "Account": int(a)} for f, a in accounts.itertuples(index=False)]}
+            dataset_key = f"{args.dataset.resolve().name}/{args.backend}"
+        else:
+            info = write_dataset(tmp / "dataset", args.rows, accounts=args.accounts, seed=args.seed,
+                                 mix=parse_mix(args.mix))
+            dataset = {"dir": tmp / "dataset", "cash_filename": info["cash_filename"], "accounts": info["accounts"]}
+            mix = ",".join(sorted(args.mix or []))
+            dataset_key = f"synthetic-{args.rows}x{args.accounts}-seed{args.seed}{'-' + mix if mix else ''}/{args.backend}"
+
+        accounts_file = dataset["dir"] / ACCOUNTS_FILENAME
+        ref_tree = export_revision(args.reference, tmp / "reference", accounts_file)
+        cand_tree = export_revision(args.candidate, tmp / "candidate", accounts_file) if args.candidate else project_root
+        candidate_name = args.candidate or "work tree"
+        print(f"[INFO] {dataset_key}: {len(dataset['accounts'])} account(s); "
+              f"reference {args.reference} vs candidate {candidate_name}", flush=True)
+
+        ref_work, cand_work = tmp / "run_reference", tmp / "run_candidate"
+        ref_timings = run_tree(ref_tree, ref_work, dataset, args.backend, args.repeat, args.rules_dir)
+        print(f"[OK] Reference run done", flush=True)
+        cand_timings = run_tree(cand_tree, cand_work, dataset, args.backend, args.repeat, args.rules_dir,
+                                tag_input=ref_work if args.rules_dir else None)
+        print(f"[OK] Candidate run done", flush=True)
+
+        diffs = compare_reconciled(ref_work, cand_work, dataset["accounts"])
+        if args.rules_dir:
+            diffs += compare_tagging(ref_work, cand_work, dataset["accounts"])
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    df_diffs = pd.DataFrame(diffs, columns=["account_id", "check", "side", "row", "reference", "candidate"]
+                            + [c for c in dict.fromkeys(BANK_ID_COLS + CASH_ID_COLS)])
+    df_diffs.to_csv(args.out / differences_filename, index=False)
+
+    candidate = total_timings(cand_timings)
+    baseline = load_baselines(args.baselines).get(dataset_key, {}).get("stages", {})
+    table = timing_table(total_timings(ref_timings), candidate, baseline, args.max_slowdown, args.min_seconds)
+    table.to_csv(args.out / timings_filename, index=False)
+    print(table.round(4).to_string(index=False))
+
+    failed = False
+    if len(df_diffs):
+        failed = True
+        print(f"[WARN] {len(df_diffs)} difference(s) from the reference; first ones:")
+        print(df_diffs.head(20).dropna(axis=1, how="all").to_string(index=False))
+    else:
+        print("[OK] Reconciled assignments identical" + (" (and tagging)" if args.rules_dir else ""))
+    slower = table[table["status"] == "SLOWER"]
+    if len(slower):
+        failed = True
+        print(f"[WARN] {len(slower)} stage(s) more than {args.max_slowdown:g}% slower than baseline: "
+              f"{', '.join(slower['stage'])}")
+
+    if not len(df_diffs) and (args.update_baselines or not baseline):
+        save_baseline(args.baselines, dataset_key, candidate, candidate_name)
+        print(f"[OK] {'Updated' if baseline else 'Recorded'} timing baselines for {dataset_key} in {args.baselines}")
+    print(f"[{'WARN' if failed else 'OK'}] Wrote {differences_filename} and {timings_filename} to {args.out}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 
+from src.report import ReportPlan
+
 # Define your paths
 # 1. Get the path of the current script (src/<filename>.py)
 current_file = Path(__file__).resolve()
@@ -235,53 +237,9 @@ df_cash.to_csv(data_dir/'reconciled_cash.csv', index=False)
 print("Reconciliation complete. Files saved.")
 
 # --- 7. Create Combined Grouped Report ---
-
-# Filter for items that have been reconciled (exclude NaN/None)
-# 1. Label the leftovers first
-df_bank['Reconciled'] = df_bank['Reconciled'].fillna("*UNRECONCILED*")
-df_cash['Reconciled'] = df_cash['Reconciled'].fillna("*UNRECONCILED*")
-
-
-# Prepare Bank columns (rename or select only the ones you requested)
-bank_subset = df_bank[[
-    'Acct_From_Filename', 'Company_Name', 'CCY_Type',
-    'Date', 'Description1A', 'Description1B',
-    'Description2', 'Debit', 'Credit', 'Reconciled'
-]].rename(columns={'Date': 'Calculated_Date'})
-bank_subset['Source'] = 'BANK'
-
-# Prepare Cash columns
-cash_subset = df_cash[[
-    'FundShortName', 'Type', 'Date', 'Detail',
-    'Net', 'Reconciled'
-]].rename(columns={'Net': 'Amount','Date':'Cash_Date'})
-cash_subset['Source'] = 'CASH'
-
-# 3. Merge (Outer Join)
-# Using 'outer' ensures that an unreconciled Cash item still appears
-# even if it has no match on the Bank side.
-combined_df = pd.merge(bank_subset, cash_subset, on='Reconciled', how='outer')
-
-# 4. Sorting
-# Put Unreconciled items at the bottom or keep them in date order
-combined_df = combined_df.sort_values(by=['Calculated_Date', 'Reconciled'], na_position='last')
-
-# 6. Blank out duplicate Bank Info for split payments
-# This makes it so the Bank info only shows once, even if there are 2+ Cash rows
-bank_columns = [
-    'Calculated_Date', 'Acct_From_Filename', 'Company_Name',
-    'CCY_Type', 'Description1A', 'Description1B',
-    'Description2', 'Debit', 'Credit'
-]
-
-# 5. Blank out duplicate Bank headers for split payments
-# We only do this for rows that AREN'T marked as UNRECONCILED
-mask = (combined_df.duplicated(subset=['Reconciled'])) & (combined_df['Reconciled'] != "*UNRECONCILED*")
-combined_df.loc[mask, bank_columns] = ""
-
-# 7. Final Polish: Reorder columns to put Reconciled ID in the middle as a separator
-cols = bank_columns + ['Reconciled'] + ['FundShortName', 'Type', 'Cash_Date', 'Detail', 'Amount']
-combined_df = combined_df[cols]
-
-# Save to CSV
-combined_df.to_csv(data_dir/'reconciliation_final_report.csv', index=False)
\ No newline at end of file
+# Same builder as cashrec.py: matched bank rows each followed by their cash rows (bank info
+# only on the first row of a split), then missing statements, unreconciled bank and
+# unreconciled cash rows. Unmatched rows are stacked rather than joined on a shared key,
+# so the report is linear in the number of input rows.
+report = ReportPlan(df_bank, df_cash, unreconciled_label="*UNRECONCILED*")
+report.write(data_dir/'reconciliation_final_report')
@@ -1,78 +1,59 @@
 # /src/audit_mislabels.py
 import re
+import numpy as np
 import pandas as pd
 
-FEE_WORDS_RX = re.compile(r"\b(FEE|FEES|EXPENSE|CHARGE|BANK CHARGE|SWIFT)\b", re.I)
-BANKY_RX = re.compile(r"\b(HSBC|BARCLAYS|CITI|FRB|BONY|JPM|JPMORGAN|J\.P\. MORGAN|BNP|DEUTSCHE|TRANSFER|SWIFT|CHAPS|BACS)\b", re.I)
+from .text_utils import combined_text, TEXT_COL
+
+FEE_WORDS_RX = re.compile(r"\b(?:FEE|FEES|EXPENSE|CHARGE|BANK CHARGE|SWIFT)\b", re.I)
+BANKY_RX = re.compile(r"\b(?:HSBC|BARCLAYS|CITI|FRB|BONY|JPM|JPMORGAN|J\.P\. MORGAN|BNP|DEUTSCHE|TRANSFER|SWIFT|CHAPS|BACS)\b", re.I)
 MGMT_RX = re.compile(
-    r"\b(MANAGEMENT\s+FEES?|MGMT\s*FEES?|ADVIS(OR|ORY)\s+FEES?)\b",
+    r"\b(?:MANAGEMENT\s+FEES?|MGMT\s*FEES?|ADVIS(?:OR|ORY)\s+FEES?)\b",
     re.I
 )
 
-
-def _has_fee_like(text: str) -> bool:
-    return bool(FEE_WORDS_RX.search(text or ""))
-
-def _has_mgmt_like(text: str) -> bool:
-    return bool(MGMT_RX.search(text or ""))
-
-def _has_banky_counterparty(text: str) -> bool:
-    return bool(BANKY_RX.search(text or ""))
+SUSPECT_COLS = ["Calculated_Date", "Cash_Date", "Description1B", "Description2", "Detail", "Manual_Amount",
+                "Match_ID", "Tag", "Status"]
 
 def audit_mgmt_vs_expenses(detailed_df: pd.DataFrame) -> pd.DataFrame:
     """
     Heuristics to flag likely mislabels between "Mgmt Fees" and "Fees and Expenses".
     Returns a dataframe with Suggested_Type and Confidence for review.
     """
-    df = detailed_df.copy()
-    df["__text"] = (
-        df["Description1B"].astype(str) + " | " +
-        df["Description2"].astype(str) + " | " +
-        df["Detail"].astype(str)
-    )
-
-    suspects = []
-    for idx, r in df.iterrows():
-        cur_type = str(r.get("Type") or "")
-        text = r.get("__text") or ""
-        reasons = []
-        score = 0.0
-        suggested = None
-
-        if cur_type not in ("Mgmt Fees", "Fees and Expenses"):
-            continue
-
-        fee_like = _has_fee_like(text)
-        mgmt_like = _has_mgmt_like(text)
-        banky = _has_banky_counterparty(text)
-
-        if cur_type == "Mgmt Fees":
-            if fee_like and banky and not mgmt_like:
-                suggested = "Fees and Expenses"; score += 0.8; reasons.append("fee_words+bank_counterparty")
-            elif fee_like and not mgmt_like:
-                suggested = "Fees and Expenses"; score += 0.6; reasons.append("fee_words_no_mgmt")
-        elif cur_type == "Fees and Expenses":
-            if mgmt_like and not banky:
-                suggested = "Mgmt Fees"; score += 0.8; reasons.append("mgmt_words_no_banky")
-            elif mgmt_like:
-                suggested = "Mgmt Fees"; score += 0.6; reasons.append("mgmt_words")
-
-        if suggested and score >= 0.6:
-            suspects.append({
-                "Row_Index": idx,
-                "Current_Type": cur_type,
-                "Suggested_Type": suggested,
-                "Confidence": round(min(score, 1.0), 2),
-                "Reasons": ";".join(reasons),
-                "Calculated_Date": r.get("Calculated_Date"),
-                "Cash_Date": r.get("Cash_Date"),
-                "Description1B": r.get("Description1B"),
-                "Description2": r.get("Description2"),
-                "Detail": r.get("Detail"),
-                "Manual_Amount": r.get("Manual_Amount"),
-                "Match_ID": r.get("Match_ID"),
-                "Tag": r.get("Tag"),
-                "Status": r.get("Status"),
-            })
-
-    return pd.DataFrame(suspects)
\ No newline at end of file
+    df = detailed_df[detailed_df["Type"].isin(["Mgmt Fees", "Fees and Expenses"])]
+    if df.empty:
+        return pd.DataFrame()
+    # Combined description text (shared column from reconcile_account when present)
+    text = df[TEXT_COL] if TEXT_COL in df.columns else combined_text(df)
+
+    fee_like = text.str.contains(FEE_WORDS_RX, na=False)
+    mgmt_like = text.str.contains(MGMT_RX, na=False)
+    banky = text.str.contains(BANKY_RX, na=False)
+    is_mgmt = df["Type"] == "Mgmt Fees"
+    is_fees = df["Type"] == "Fees and Expenses"
+
+    conditions = [
+        is_mgmt & fee_like & banky & ~mgmt_like,
+        is_mgmt & fee_like & ~mgmt_like,
+        is_fees & mgmt_like & ~banky,
+        is_fees & mgmt_like,
+    ]
+    suggested = np.select(conditions, ["Fees and Expenses", "Fees and Expenses", "Mgmt Fees", "Mgmt Fees"], default="")
+    score = np.select(conditions, [0.8, 0.6, 0.8, 0.6], default=0.0)
+    reasons = np.select(conditions, ["fee_words+bank_counterparty", "fee_words_no_mgmt", "mgmt_words_no_banky",
+                                     "mgmt_words"], default="")
+    flagged = (suggested != "") & (score >= 0.6)
+    if not flagged.any():
+        return pd.DataFrame()
+
+    rows = df[flagged]
+    suspects = pd.DataFrame({
+        "Row_Index": rows.index,
+        "Current_Type": rows["Type"].astype(str).to_numpy(),
+        "Suggested_Type": suggested[flagged],
+        "Confidence": np.round(np.minimum(score[flagged], 1.0), 2),
+        "Reasons": reasons[flagged],
+    })
+    # Detail columns (missing columns -> empty)
+    details = rows.reindex(columns=SUSPECT_COLS).reset_index(drop=True)
+    return pd.concat([suspects, details], axis=1)
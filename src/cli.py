@@ -2,11 +2,21 @@
 import argparse
 from pathlib import Path
 import glob
+import time
+import traceback
 import pandas as pd
 
-from .config import INPUT_DIR, OUTPUT_DIR, RULES_DIR, DEFAULT_OUTPUT_ENCODING
+from .config import INPUT_DIR, OUTPUT_DIR, RULES_DIR, TAG_CACHE_PATH, DEFAULT_OUTPUT_ENCODING
 from .rules_csv import load_rules_from_csv
-from .reconcile import reconcile_account
+from .reconcile import reconcile_account, TAG_MODES
+from .events import EventStream
+from .profiling import StageProfiler
+from .stages import StageRecorder
+from .schemas import load_frame
+from .excel_report import write_frames_xlsx
+from .suggestion_miner import SUGGESTIONS_FILENAME, untagged_text, mine_suggestions
+from .tag_cache import TagCache, DEFAULT_MAX_ENTRIES
+from .retag import write_rules_snapshot
 
 def _load_accounts_from_csv(path: Path) -> list[str]:
     if not path.exists():
@@ -37,64 +47,140 @@ def main():
                         help="Also process accounts in input dir that are NOT in accounts_order.csv (appended after)")
     parser.add_argument("--strict-order", action="store_true",
                         help="Abort if any account in accounts_order.csv is missing in input dir")
+    parser.add_argument("--events", help="Also write JSONL progress events to this file ('-' = stdout only, no console text)")
+    parser.add_argument("--profile", type=Path,
+                        help="Profile every reconcile_account step per account into this directory")
+    parser.add_argument("--xlsx", action="store_true",
+                        help="Also write {account}_reconciliation.xlsx (one sheet per output; needs xlsxwriter)")
+    parser.add_argument("--tag-mode", choices=TAG_MODES, default="row",
+                        help="'group' tags each Match_ID group (bank line + its cash lines) once on their combined text")
+    parser.add_argument("--tag-cache", action="store_true",
+                        help="Tag each distinct description + Type once per run (LRU cache shared by all accounts)")
+    parser.add_argument("--tag-cache-file", type=Path, nargs="?", const=TAG_CACHE_PATH,
+                        help=f"Like --tag-cache, loaded from / saved to this JSON file between runs (default {TAG_CACHE_PATH})")
+    parser.add_argument("--tag-cache-size", type=int, default=DEFAULT_MAX_ENTRIES, help="Most cached tagging results kept")
     args = parser.parse_args()
 
+    events = EventStream.from_option(args.events)
+    profiler = StageProfiler(args.profile) if args.profile else None
+    events.emit("run_start", entry_point="src.cli")
+    run_start = time.perf_counter()
+
     # Load rules (CSV)
-    print(f"[INFO] Loading rules from CSVs in {args.rules_dir}")
+    events.log(f"Loading rules from CSVs in {args.rules_dir}")
     rules = load_rules_from_csv(args.rules_dir)
+    tag_cache = None
+    if args.tag_cache or args.tag_cache_file:
+        tag_cache = TagCache(args.tag_cache_size, args.tag_cache_file)
+        if args.tag_cache_file:
+            events.log(f"Tag cache: {len(tag_cache):,} entries loaded from {args.tag_cache_file}")
 
     # Determine account file mapping
     available = _list_available_accounts(args.input)
     if not available:
-        print(f"[WARN] No CSVs found in {args.input} matching 'cashrec_report_*.csv'")
+        events.log(f"No CSVs found in {args.input} matching 'cashrec_report_*.csv'", level="warn")
         return
 
     # Load ordered list
     ordered_accounts = _load_accounts_from_csv(args.accounts_file)
-    print(f"[INFO] Loaded {len(ordered_accounts)} accounts from {args.accounts_file}")
+    events.log(f"Loaded {len(ordered_accounts)} accounts from {args.accounts_file}")
 
     # Validate & queue
     missing = [a for a in ordered_accounts if a not in available]
     if missing:
-        msg = f"[WARN] {len(missing)} accounts in your list have no matching CSV in {args.input}: {missing}"
+        msg = f"{len(missing)} accounts in your list have no matching CSV in {args.input}: {missing}"
         if args.strict_order:
             raise FileNotFoundError(msg)
         else:
-            print(msg)
+            events.log(msg, level="warn", missing_accounts=missing)
 
     queue = [a for a in ordered_accounts if a in available]
 
     if args.include_unlisted:
         extras = [a for a in sorted(available.keys()) if a not in set(queue)]
         if extras:
-            print(f"[INFO] Appending {len(extras)} unlisted accounts after your ordered list: {extras}")
+            events.log(f"Appending {len(extras)} unlisted accounts after your ordered list: {extras}")
             queue.extend(extras)
 
     # Execute
     args.output.mkdir(parents=True, exist_ok=True)
+    suggestion_texts = []   # untagged lines of every account, mined together at the end
     for account_id in queue:
         csv_path = available[account_id]
-        print(f"[INFO] Processing account (in order): {account_id} -> {csv_path}")
-        df = pd.read_csv(csv_path, dtype=str)
-
-        detailed_df, exceptions_df, summary_df, suggestions_df = reconcile_account(df, account_id, rules)
-
-        # Optional: mislabel auditor, if present
+        events.emit("account_start", account_id=account_id, path=str(csv_path))
+        account_start = time.perf_counter()
+        recorder = StageRecorder(account_id, hooks=[events] + ([profiler] if profiler else []))
         try:
-            from .audit_mislabels import audit_mgmt_vs_expenses
-            mislabels_df = audit_mgmt_vs_expenses(detailed_df)
-        except Exception:
-            mislabels_df = pd.DataFrame()
-
-        out_prefix = args.output / f"{account_id}"
-        detailed_df.to_csv(f"{out_prefix}_reconciliation_detailed.csv", index=False, encoding=DEFAULT_OUTPUT_ENCODING)
-        exceptions_df.to_csv(f"{out_prefix}_exceptions.csv", index=False, encoding=DEFAULT_OUTPUT_ENCODING)
-        summary_df.to_csv(f"{out_prefix}_summary.csv", index=False, encoding=DEFAULT_OUTPUT_ENCODING)
-        suggestions_df.to_csv(f"{out_prefix}_tag_suggestions.csv", index=False, encoding=DEFAULT_OUTPUT_ENCODING)
-        if not mislabels_df.empty:
-            mislabels_df.to_csv(f"{out_prefix}_mislabel_suspicions.csv", index=False, encoding=DEFAULT_OUTPUT_ENCODING)
-
-        print(f"[OK] Wrote outputs for {account_id} to {args.output}")
+            with recorder.stage("load"):
+                df = load_frame("cashrec_report", csv_path)
+
+            detailed_df, exceptions_df, summary_df, suggestions_df = reconcile_account(df, account_id, rules, recorder,
+                                                                                      tag_mode=args.tag_mode, tag_cache=tag_cache)
+            tagging = next(r for r in recorder.records if r["stage"] == "tagging")
+            suggestion_texts.append(untagged_text(detailed_df, account_id))
+
+            # Optional: mislabel auditor, if present
+            with recorder.stage("audit_mislabels"):
+                try:
+                    from .audit_mislabels import audit_mgmt_vs_expenses
+                    mislabels_df = audit_mgmt_vs_expenses(detailed_df)
+                except Exception:
+                    mislabels_df = pd.DataFrame()
+
+            with recorder.stage("write_outputs"):
+                out_prefix = args.output / f"{account_id}"
+                detailed_df.to_csv(f"{out_prefix}_reconciliation_detailed.csv", index=False, encoding=DEFAULT_OUTPUT_ENCODING)
+                exceptions_df.to_csv(f"{out_prefix}_exceptions.csv", index=False, encoding=DEFAULT_OUTPUT_ENCODING)
+                summary_df.to_csv(f"{out_prefix}_summary.csv", index=False, encoding=DEFAULT_OUTPUT_ENCODING)
+                suggestions_df.to_csv(f"{out_prefix}_tag_suggestions.csv", index=False, encoding=DEFAULT_OUTPUT_ENCODING)
+                if not mislabels_df.empty:
+                    mislabels_df.to_csv(f"{out_prefix}_mislabel_suspicions.csv", index=False, encoding=DEFAULT_OUTPUT_ENCODING)
+                if args.xlsx:
+                    write_frames_xlsx(Path(f"{out_prefix}_reconciliation.xlsx"), {
+                        "Detailed": detailed_df,
+                        "Exceptions": exceptions_df,
+                        "Summary": summary_df,
+                        "Tag suggestions": suggestions_df,
+                        "Mislabel suspicions": mislabels_df,
+                    })
+        except Exception as e:
+            events.emit("error", account_id=account_id, error=str(e), error_type=type(e).__name__,
+                        traceback=traceback.format_exc())
+            events.close()
+            raise
+
+        wall = time.perf_counter() - account_start
+        events.emit(
+            "account_end", account_id=account_id, rows=len(detailed_df), exceptions=len(exceptions_df),
+            mislabels=len(mislabels_df), tag_calls=tagging["tag_calls"], tag_calls_saved=tagging["tag_calls_saved"],
+            match_counts={k: int(v) for k, v in detailed_df["Status"].value_counts().items()},
+            wall_s=round(wall, 3), rows_per_s=round(len(detailed_df) / wall, 1) if wall > 0 else None,
+        )
+
+    if suggestion_texts:
+        try:
+            suggestions = mine_suggestions(pd.concat(suggestion_texts, ignore_index=True), rules)
+        except ImportError as e:
+            events.log(f"{e}; skipping {SUGGESTIONS_FILENAME}", level="warn")
+        else:
+            suggestions.to_csv(args.output / SUGGESTIONS_FILENAME, index=False, encoding=DEFAULT_OUTPUT_ENCODING)
+            events.log(f"{len(suggestions)} portfolio tag suggestions written to {args.output / SUGGESTIONS_FILENAME}")
+
+    # The rules these outputs were tagged with: src.retag re-tags only what later rule edits affect
+    write_rules_snapshot(rules, args.output, args.tag_mode)
+
+    if tag_cache is not None:
+        if args.tag_cache_file:
+            tag_cache.save()
+        stats = tag_cache.stats()
+        events.log(f"Tag cache: {stats['hits']:,} hits, {stats['misses']:,} misses (hit rate {stats['hit_rate']}), "
+                   f"{stats['entries']:,} entries", **{f"tag_cache_{k}": v for k, v in stats.items()})
+
+    if profiler is not None:
+        profiler.write_summary()
+        events.log(f"Stage profiles and cross-account summary written to {args.profile}")
+    events.emit("run_end", accounts=len(queue), failed=0, wall_s=round(time.perf_counter() - run_start, 3))
+    events.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -12,3 +12,11 @@ RULES_PATH = RULES_DIR / "tag_rules.json"
 DEFAULT_TOLERANCE = 0.01        # currency tolerance for matching (e.g., £0.01)
 MAX_DATE_LAG_DAYS = 5           # flag if cash vs bank dates differ by > N days
 DEFAULT_OUTPUT_ENCODING = "utf-8-sig"
+
+# Tagging cache (JSON) reused across runs when src.cli is given --tag-cache-file
+TAG_CACHE_PATH = DATA_DIR / "tag_cache.json"
+
+# Run ledger (SQLite) shared by the batch entry points. Anchored on cashrec.py's data_dir
+# (<repo>/../data) rather than the working directory, so the batch and the query command
+# open the same file
+LEDGER_PATH = Path(__file__).resolve().parents[2] / "data" / "run_ledger.sqlite"
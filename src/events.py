@@ -0,0 +1,157 @@
+# /src/events.py
+import json
+import sys
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+def match_label_counts(reconciled) -> Dict[str, int]:
+    """Counts of Reconciled labels by kind ("EXACT MATCH - 12" -> "EXACT MATCH")."""
+    kinds = reconciled.dropna().astype(str).str.split(" - ", n=1).str[0]
+    return {k: int(v) for k, v in kinds.value_counts().items()}
+
+class JsonlSink:
+    """Writes one JSON object per event, flushed per line so the file can be tailed."""
+
+    def __init__(self, target: str):
+        self.target = target
+        if target == "-":
+            self._fh = sys.stdout
+        else:
+            self._fh = open(target, "a", encoding="utf-8")
+
+    def __call__(self, event: Dict) -> None:
+        self._fh.write(json.dumps(event, default=str) + "\n")
+        self._fh.flush()
+
+    def close(self) -> None:
+        if self._fh is not sys.stdout:
+            self._fh.close()
+
+class ConsoleRenderer:
+    """Human-readable console view of the event stream (what used to be ad-hoc prints)."""
+
+    def __init__(self, stream=None, show_stages: bool = False):
+        self.stream = stream or sys.stdout
+        self.show_stages = show_stages
+
+    def _print(self, text: str = "") -> None:
+        print(text, file=self.stream)
+
+    def __call__(self, event: Dict) -> None:
+        handler = getattr(self, "_on_" + event["event"], None)
+        if handler is not None:
+            handler(event)
+
+    def _on_run_start(self, e):
+        run = f" {e['run_id']}" if e.get("run_id") else ""
+        self._print(f"[INFO] Run{run} started ({e.get('entry_point')})")
+
+    def _on_run_end(self, e):
+        run = f" {e['run_id']}" if e.get("run_id") else ""
+        self._print(f"[INFO] Run{run} finished: {e.get('accounts', 0)} accounts, "
+                    f"{e.get('failed', 0)} failed, {e.get('wall_s', 0):.1f}s")
+
+    def _on_account_start(self, e):
+        if e.get("path"):
+            self._print(f"[INFO] Processing account (in order): {e.get('account_id')} -> {e['path']}")
+            return
+        prefix = f"{e['index']} " if e.get("index") is not None else ""
+        self._print(f"{prefix}{e.get('fund_short_name') or ''} {e.get('account_id')}".strip())
+
+    def _on_frames_loaded(self, e):
+        self._print(f"Loaded {e.get('bank_rows')} bank rows and {e.get('cash_rows')} cash rows.")
+
+    def _on_stage_end(self, e):
+        if self.show_stages:
+            self._print(f"  {e['stage']:<18} {e.get('wall_s', 0):8.3f}s  matched {e.get('matched_bank')}")
+
+    def _on_coverage(self, e):
+        self._print("\n" + "=" * 40)
+        self._print(f"       CASHREC AUDIT FOR {e.get('fund_short_name')} {e.get('account_id')} ")
+        self._print("=" * 40)
+        if e.get("missing_bank_months"):
+            self._print("⚠️  WARNING: Missing BANK STATEMENTS for the following months:")
+            for m in e["missing_bank_months"]:
+                self._print(f"   - {m}")
+        else:
+            self._print("✅ Bank Statement coverage is complete relative to CashRec.")
+        self._print("-" * 40)
+        if e.get("missing_cash_months"):
+            self._print("⚠️  WARNING: Missing CASHRECS for the following months:")
+            for m in e["missing_cash_months"]:
+                self._print(f"   - {m}")
+        else:
+            self._print("✅ CashRec coverage is complete relative to Bank Statements.")
+        self._print("=" * 40)
+
+    def _on_account_end(self, e):
+        if "unreconciled_bank" in e:
+            self._print(f"Unreconciled Bank Items: {e['unreconciled_bank']}")
+            self._print(f"Unreconciled Cash Items: {e['unreconciled_cash']}")
+            self._print("=" * 40 + "\n")
+        self._print(f"[OK] {e.get('account_id')} done in {e.get('wall_s', 0):.1f}s "
+                    f"({e.get('rows_per_s') or 0:,.0f} rows/s)")
+        if e.get("tag_calls_saved"):
+            self._print(f"[INFO] Group tagging: {e['tag_calls']:,} tag calls, {e['tag_calls_saved']:,} saved")
+
+    def _on_backend_compare(self, e):
+        verdict = "identical" if e.get("identical") else "DIFFERENT"
+        self._print(f"[COMPARE] {e.get('account_id')}: pandas {e.get('pandas_s', 0):.2f}s vs "
+                    f"{e.get('backend')} {e.get('backend_s', 0):.2f}s, report {verdict}")
+
+    def _on_error(self, e):
+        self._print(f"[ERROR] {e.get('account_id')}: {e.get('error')}")
+
+    def _on_log(self, e):
+        level = e.get("level", "info").upper()
+        self._print(e["message"] if level == "PLAIN" else f"[{level}] {e['message']}")
+
+class EventStream:
+    """
+    Fan-out of structured batch events to sinks (JSONL file/stdout, console renderer).
+    Also a StageRecorder hook, so every timed stage emits stage_start / stage_end.
+    """
+
+    def __init__(self, sinks: Optional[List[Callable[[Dict], None]]] = None, run_id: Optional[str] = None):
+        self.sinks = list(sinks or [])
+        self.run_id = run_id
+
+    @classmethod
+    def from_option(cls, target: Optional[str], show_stages: bool = False) -> "EventStream":
+        """`--events` handling: None = console only, '-' = JSONL on stdout only, path = console + JSONL file."""
+        sinks = []
+        if target != "-":
+            sinks.append(ConsoleRenderer(show_stages=show_stages))
+        if target:
+            sinks.append(JsonlSink(target))
+        return cls(sinks)
+
+    def emit(self, event: str, **fields) -> None:
+        record = {"ts": datetime.now().isoformat(timespec="milliseconds"), "event": event}
+        if self.run_id is not None:
+            record["run_id"] = self.run_id
+        record.update(fields)
+        for sink in self.sinks:
+            sink(record)
+
+    def log(self, message: str, level: str = "info", **fields) -> None:
+        self.emit("log", level=level, message=message, **fields)
+
+    # StageRecorder hook interface
+    def stage_start(self, rec: Dict) -> None:
+        self.emit("stage_start", account_id=rec.get("account_id"), stage=rec["stage"], rows_in=rec.get("rows_in"))
+
+    def stage_end(self, rec: Dict) -> None:
+        wall = rec.get("wall_s") or 0.0
+        rows = rec.get("rows_in")
+        self.emit(
+            "stage_end", account_id=rec.get("account_id"), stage=rec["stage"], rows_in=rows,
+            matched_bank=rec.get("matched_bank"), matched_cash=rec.get("matched_cash"), wall_s=round(wall, 6),
+            rows_per_s=round(rows / wall, 1) if rows and wall > 0 else None,
+            peak_growth_mb=rec.get("peak_growth_mb"), py_peak_mb=rec.get("py_peak_mb"),
+        )
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            if hasattr(sink, "close"):
+                sink.close()
@@ -0,0 +1,131 @@
+# /src/excel_report.py
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+
+from .report import BLOCK_NAMES, BLOCK_ORDER, DEFAULT_CHUNK_ROWS, ReportPlan
+
+# Rows are flushed to disk as they are written (one row of one sheet in memory at a time),
+# so sheets have to be filled top to bottom, one after the other.
+WORKBOOK_OPTIONS = {
+    "constant_memory": True,
+    "strings_to_numbers": False,
+    "strings_to_formulas": False,
+    "strings_to_urls": False,
+    "default_date_format": "yyyy-mm-dd",
+}
+MONEY_FORMAT = "#,##0.00;[Red]-#,##0.00"
+DATE_FORMAT = WORKBOOK_OPTIONS["default_date_format"]
+MONEY_RX = re.compile(r"Amount|Debit|Credit|_Total|_Diff")   # float columns shown as money
+MAX_SHEET_ROWS = 1_048_576                                   # Excel limit (header included)
+COLUMN_WIDTHS = {"date": 12, "money": 14, "number": 10, "text": 24}
+
+def _xlsxwriter():
+    try:
+        import xlsxwriter
+    except ImportError as e:
+        raise ImportError("Excel output needs the xlsxwriter package (pip install xlsxwriter)") from e
+    return xlsxwriter
+
+def _column_kind(name: str, dtype) -> str:
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "date"
+    if pd.api.types.is_bool_dtype(dtype) or not pd.api.types.is_numeric_dtype(dtype):
+        return "text"
+    if pd.api.types.is_float_dtype(dtype) and MONEY_RX.search(str(name)):
+        return "money"
+    return "number"
+
+def frame_chunks(df: pd.DataFrame, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """A frame as consecutive row slices (an empty frame still yields its header)."""
+    for lo in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[lo:lo + chunk_rows]
+
+class ExcelWriter:
+    """
+    Streaming .xlsx writer (xlsxwriter in constant-memory mode). Each sheet is filled from an
+    iterable of DataFrame chunks: frozen header row, autofilter, date and money formats,
+    missing values left as empty cells. Sheets past Excel's row limit continue on
+    '<name> (2)', '<name> (3)', ...
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.workbook = _xlsxwriter().Workbook(str(self.path), WORKBOOK_OPTIONS)
+        self.formats = {
+            "header": self.workbook.add_format({"bold": True, "bottom": 1}),
+            "date": self.workbook.add_format({"num_format": DATE_FORMAT}),
+            "money": self.workbook.add_format({"num_format": MONEY_FORMAT}),
+            "number": None,
+            "text": None,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        self.workbook.close()
+
+    def _start_sheet(self, name: str, columns: List[str], kinds: List[str]):
+        ws = self.workbook.add_worksheet(name[:31])
+        for j, (col, kind) in enumerate(zip(columns, kinds)):
+            ws.set_column(j, j, max(COLUMN_WIDTHS[kind], min(len(str(col)) + 2, 40)))
+            ws.write_string(0, j, str(col), self.formats["header"])
+        ws.freeze_panes(1, 0)
+        return ws
+
+    def add_sheet(self, name: str, chunks: Iterable[pd.DataFrame]) -> int:
+        """Writes the chunks to a new sheet (or several, past the row limit); returns the data rows written."""
+        ws, kinds, columns, row, part, written = None, None, None, 0, 1, 0
+        for chunk in chunks:
+            if ws is None:
+                columns = list(chunk.columns)
+                kinds = [_column_kind(col, dtype) for col, dtype in chunk.dtypes.items()]
+                ws = self._start_sheet(name, columns, kinds)
+                row = 1
+            cells = [s.astype(object).where(s.notna(), None).tolist()
+                     for s in (chunk.iloc[:, j] for j in range(len(columns)))]
+            for values in zip(*cells):
+                if row == MAX_SHEET_ROWS:
+                    ws.autofilter(0, 0, row - 1, len(columns) - 1)
+                    part += 1
+                    ws = self._start_sheet(f"{name[:26]} ({part})", columns, kinds)
+                    row = 1
+                for j, value in enumerate(values):
+                    if value is None:
+                        continue
+                    kind = kinds[j]
+                    if kind == "date":
+                        ws.write_datetime(row, j, value.to_pydatetime(), self.formats["date"])
+                    elif kind in ("money", "number"):
+                        ws.write_number(row, j, value, self.formats[kind])
+                    elif isinstance(value, str):
+                        ws.write_string(row, j, value)
+                    else:
+                        ws.write(row, j, value)
+                row += 1
+                written += 1
+        if ws is not None:
+            ws.autofilter(0, 0, max(row - 1, 0), len(columns) - 1)
+        return written
+
+def write_report_xlsx(plan: ReportPlan, path: Path, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Path:
+    """The stacked cash rec report as a workbook with one sheet per block, in report order."""
+    with ExcelWriter(path) as xl:
+        for block in BLOCK_ORDER:
+            xl.add_sheet(BLOCK_NAMES[block], plan.iter_chunks(chunk_rows, block=block, as_csv=False))
+    return Path(path)
+
+def write_frames_xlsx(path: Path, sheets: Dict[str, Optional[pd.DataFrame]],
+                      chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Path:
+    """Several frames as one workbook, one sheet each (None / empty frames are skipped)."""
+    with ExcelWriter(path) as xl:
+        for name, df in sheets.items():
+            if df is not None and not df.empty:
+                xl.add_sheet(name, frame_chunks(df, chunk_rows))
+    return Path(path)
@@ -0,0 +1,130 @@
+# /src/memory.py
+import os
+import re
+import tracemalloc
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from .config import DEFAULT_OUTPUT_ENCODING
+
+MB = 1024 * 1024
+
+# Rough in-memory size of a default-dtype pandas frame relative to its CSV on disk
+# (object columns hold one Python str per cell, so text-heavy files expand a lot).
+CSV_TO_FRAME_FACTOR = 6.0
+MIN_CHUNK_ROWS = 10_000
+
+_SIZE_RX = re.compile(r"^\s*([\d.]+)\s*([KMGT]?)I?B?\s*$", re.I)
+
+def parse_size(text: str) -> int:
+    """'512MB', '4G', '1.5GiB', '2000000' -> bytes."""
+    m = _SIZE_RX.match(str(text))
+    if not m:
+        raise ValueError(f"Can't parse memory size: {text!r} (use e.g. 512MB, 4GB)")
+    value, unit = float(m.group(1)), m.group(2).upper()
+    return int(value * 1024 ** " KMGT".index(unit or " "))
+
+def current_rss_mb() -> Optional[float]:
+    """Current resident set size in MB (psutil if installed, /proc on Linux, else None)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / MB
+    except ImportError:
+        pass
+    statm = Path("/proc/self/statm")
+    if statm.exists():
+        pages = int(statm.read_text().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / MB
+    return None
+
+def estimate_frame_bytes(paths: Iterable[Path]) -> int:
+    """Estimated memory to load these CSVs fully with default dtypes."""
+    return int(sum(Path(p).stat().st_size for p in paths if Path(p).exists()) * CSV_TO_FRAME_FACTOR)
+
+def _bytes_per_line(path: Path, sample_bytes: int = 1 << 16) -> float:
+    with open(path, "rb") as f:
+        sample = f.read(sample_bytes)
+    return max(len(sample) / max(sample.count(b"\n"), 1), 1.0)
+
+class MemoryBudget:
+    """A per-account memory budget and the chunk sizing that keeps a load inside it."""
+
+    def __init__(self, limit_bytes: int):
+        self.limit_bytes = int(limit_bytes)
+
+    @classmethod
+    def from_option(cls, text: Optional[str]) -> Optional["MemoryBudget"]:
+        return cls(parse_size(text)) if text else None
+
+    def exceeded_by(self, estimate_bytes: int) -> bool:
+        return estimate_bytes > self.limit_bytes
+
+    def chunk_rows(self, path: Path) -> int:
+        """Rows per chunk so that one parsed chunk uses at most a quarter of the budget."""
+        per_row = _bytes_per_line(path) * CSV_TO_FRAME_FACTOR
+        return max(MIN_CHUNK_ROWS, int(self.limit_bytes / 4 / per_row))
+
+def read_csv_filtered(path: Path, column: str, keep_values, chunk_rows: int, **read_kwargs) -> pd.DataFrame:
+    """
+    Chunked read of a large CSV keeping only rows where `column` is in `keep_values`,
+    so the full file never has to be in memory at once.
+    """
+    keep = set(keep_values)
+    parts = [
+        chunk[chunk[column].isin(keep)]
+        for chunk in pd.read_csv(path, chunksize=chunk_rows, **read_kwargs)
+    ]
+    if not parts:
+        return pd.read_csv(path, nrows=0, **read_kwargs)
+    return pd.concat(parts, ignore_index=True)
+
+class MemoryTracker:
+    """
+    StageRecorder hook recording memory per account and stage: current RSS and, with
+    tracemalloc on, the Python allocation peak inside the stage. With `out_dir` set it also
+    writes the top allocation sites of each stage's tracemalloc snapshot.
+    """
+
+    def __init__(self, out_dir: Optional[Path] = None, trace: bool = True, top_n: int = 15):
+        self.out_dir = Path(out_dir) if out_dir else None
+        if self.out_dir:
+            self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.top_n = top_n
+        self.rows: List[Dict] = []
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stage_start(self, rec: Dict) -> None:
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+
+    def stage_end(self, rec: Dict) -> None:
+        rec["rss_mb"] = current_rss_mb()
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            rec["py_current_mb"] = current / MB
+            rec["py_peak_mb"] = peak / MB
+            if self.out_dir:
+                self._write_snapshot(rec)
+        self.rows.append({k: rec.get(k) for k in
+                          ("account_id", "seq", "stage", "wall_s", "rss_mb", "peak_growth_mb", "py_current_mb", "py_peak_mb")})
+
+    def _write_snapshot(self, rec: Dict) -> None:
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        account_dir = self.out_dir / re.sub(r"[^A-Za-z0-9_.-]+", "_", str(rec.get("account_id")))
+        account_dir.mkdir(parents=True, exist_ok=True)
+        lines = [f"{rec['stage']}: python peak {rec['py_peak_mb']:.1f} MB, current {rec['py_current_mb']:.1f} MB"]
+        lines += [str(stat) for stat in snapshot.statistics("lineno")[: self.top_n]]
+        (account_dir / f"{rec['seq']:02d}_{rec['stage']}_memory.txt").write_text("\n".join(lines), encoding="utf-8")
+
+    def write_summary(self, path: Path) -> Optional[pd.DataFrame]:
+        if not self.rows:
+            return None
+        df = pd.DataFrame(self.rows)
+        df.to_csv(path, index=False, encoding=DEFAULT_OUTPUT_ENCODING)
+        return df
@@ -0,0 +1,339 @@
+# /src/polars_backend.py
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+NS_PER_DAY = 86_400 * 10**9
+
+# Python-rounded tolerances of the penny passes, indexed by pennies (as the pandas stages compute them)
+_TOLERANCE = np.array([round(k / 100, 2) for k in range(101)])
+
+def _polars():
+    try:
+        import polars as pl
+    except ImportError as e:
+        raise ImportError("The polars backend needs the polars package (pip install polars)") from e
+    return pl
+
+def _open_frame(pl, dates: pd.Series, net: pd.Series, reconciled: pd.Series, row_col: str):
+    """Open (unlabelled, dated) rows: row id, timestamp/day number/calendar parts, net and an exact net key."""
+    keep = (reconciled.isna() & dates.notna()).to_numpy()
+    ns = dates.to_numpy(dtype="datetime64[ns]")[keep].astype("int64")
+    values = net.to_numpy(dtype=float)[keep]
+    parts = pd.DatetimeIndex(dates[keep])
+    return pl.DataFrame({
+        row_col: dates.index.to_numpy()[keep].astype("int64"),
+        "ns": ns,
+        "day": ns // NS_PER_DAY,
+        "y": parts.year.to_numpy().astype("int64"),
+        "m": parts.month.to_numpy().astype("int64"),
+        "dd": parts.day.to_numpy().astype("int64"),
+        "net": values,
+        # float equality as an integer key (+0.0 folds -0.0 into 0.0, as == does)
+        "key": (values + 0.0).view("int64"),
+    })
+
+def _day_gap(pl, cash_ns: str = "c_ns", bank_ns: str = "b_ns"):
+    """(cash date - bank date).days as pandas computes it (floored)."""
+    return (pl.col(cash_ns) - pl.col(bank_ns)) // NS_PER_DAY
+
+def _near_days(pl, bank, cash, max_days: int):
+    """All (bank, cash) pairs whose day numbers are at most `max_days` (+1 for time-of-day) apart."""
+    offsets = pl.DataFrame({"off": np.arange(-max_days - 1, max_days + 2, dtype="int64")})
+    expanded = bank.join(offsets, how="cross").with_columns((pl.col("b_day") + pl.col("off")).alias("day"))
+    return expanded.join(cash, on="day").drop("off", "day")
+
+def _resolve_pairs(pl, pairs):
+    """
+    "First free row wins" for 1:1 candidates (bank_row, cash_row), in rounds: a bank row takes
+    its lowest candidate once no lower bank row still has that cash row as a candidate.
+    Gives exactly the pairs of the row-by-row loop, in bank row order.
+    """
+    accepted = []
+    while pairs.height:
+        acc = pairs.filter(
+            (pl.col("cash_row") == pl.col("cash_row").min().over("bank_row"))
+            & (pl.col("bank_row") == pl.col("bank_row").min().over("cash_row"))
+        )
+        accepted.append(acc)
+        pairs = (pairs.join(acc.select("bank_row"), on="bank_row", how="anti")
+                      .join(acc.select("cash_row"), on="cash_row", how="anti"))
+    if not accepted:
+        return pairs
+    return pl.concat(accepted).sort("bank_row")
+
+def _resolve_splits(pl, cands, order: List[str], footprint=None, free_cash=None):
+    """
+    Same rule for two-cash-row candidates (bank_row, i, j): each bank row takes its first
+    candidate in `order` once no lower bank row has a candidate touching the rows that decide
+    it: i, j and, if given, its `footprint` (bank_row, cash_row). With `free_cash`
+    (cash_row, c_ns) candidates are first ordered by the first free row on their date.
+    """
+    accepted = []
+    while cands.height:
+        ranked = cands
+        sort_cols = list(order)
+        if free_cash is not None:
+            first_on_date = free_cash.group_by("c_ns").agg(pl.col("cash_row").min().alias("date_first"))
+            ranked = ranked.join(first_on_date, on="c_ns", how="left")
+            sort_cols = ["date_first"] + sort_cols
+        best = ranked.sort(["bank_row"] + sort_cols).group_by("bank_row", maintain_order=True).first()
+
+        touched = pl.concat([
+            cands.select("bank_row", pl.col("i").alias("cash_row")),
+            cands.select("bank_row", pl.col("j").alias("cash_row")),
+        ]).group_by("cash_row").agg(pl.col("bank_row").min().alias("first_bank"))
+        deciding = [best.select("bank_row", pl.col("i").alias("cash_row")),
+                    best.select("bank_row", pl.col("j").alias("cash_row"))]
+        if footprint is not None:
+            deciding.append(footprint.join(best.select("bank_row"), on="bank_row"))
+        blocked = (pl.concat(deciding).join(touched, on="cash_row")
+                     .filter(pl.col("first_bank") < pl.col("bank_row")).select("bank_row").unique())
+        acc = best.join(blocked, on="bank_row", how="anti").drop("date_first", strict=False)
+        accepted.append(acc)
+
+        taken = pl.concat([acc.select(pl.col("i").alias("cash_row")), acc.select(pl.col("j").alias("cash_row"))])
+        cands = (cands.join(acc.select("bank_row"), on="bank_row", how="anti")
+                      .join(taken.rename({"cash_row": "i"}), on="i", how="anti")
+                      .join(taken.rename({"cash_row": "j"}), on="j", how="anti"))
+        if footprint is not None:
+            footprint = footprint.join(taken, on="cash_row", how="anti")
+        if free_cash is not None:
+            free_cash = free_cash.join(taken, on="cash_row", how="anti")
+    if not accepted:
+        return cands
+    return pl.concat(accepted).sort("bank_row")
+
+class PolarsMatcher:
+    """
+    Runs every matching stage of cash_rec as joins / anti-joins on the open bank and cash
+    rows in Polars (multithreaded), writing the same Reconciled labels and match ids back
+    into the pandas frames. Loading and the report stay on the shared pandas code.
+    """
+
+    backend = "polars"
+
+    def __init__(self, **_):
+        self.pl = _polars()
+        self._stages: Dict[str, Callable] = {
+            "missing_months": self._missing_months,
+            "exact": self._exact,
+            "split_same_day": self._split_same_day,
+            "year_offset": self._year_offset,
+            "day_offset": self._day_offset,
+            "penny_diff": self._penny_diff,
+            "split_penny_diff": self._split_penny_diff,
+            "split_near_date": self._split_near_date,
+            "split_date_shift": self._split_date_shift,
+            "month_offset": self._month_offset,
+            "daily_total": self._daily_total,
+        }
+
+    def handles(self, stage_name: str) -> bool:
+        return stage_name in self._stages
+
+    def run(self, stage_name: str, df_bank: pd.DataFrame, df_cash: pd.DataFrame, match_id: int,
+            fallback: Optional[Callable] = None) -> int:
+        pl = self.pl
+        bank = _open_frame(pl, df_bank['Calculated_Date'], df_bank['Net'], df_bank['Reconciled'], "bank_row")
+        cash = _open_frame(pl, df_cash['Date'], df_cash['Net'], df_cash['Reconciled'], "cash_row")
+        bank = bank.rename({c: "b_" + c for c in bank.columns if c != "bank_row"})
+        cash = cash.rename({c: "c_" + c for c in cash.columns if c != "cash_row"})
+        return self._stages[stage_name](df_bank, df_cash, bank, cash, match_id)
+
+    # --- writing back -------------------------------------------------------
+
+    @staticmethod
+    def _label(df_bank, df_cash, matches, match_id: int, label: Callable, cash_cols=("cash_row",)) -> int:
+        """Labels the matched rows (bank row order = match id order) and returns the next match id."""
+        if matches.height == 0:
+            return match_id
+        rows = matches.to_dict(as_series=False)
+        labels = [label(match_id + n, {k: v[n] for k, v in rows.items()}) for n in range(matches.height)]
+        df_bank.loc[rows["bank_row"], 'Reconciled'] = labels
+        for col in cash_cols:
+            df_cash.loc[rows[col], 'Reconciled'] = labels
+        return match_id + matches.height
+
+    def _one_to_one_passes(self, df_bank, df_cash, cands, passes, match_id, label) -> int:
+        pl = self.pl
+        for k in passes:
+            matches = _resolve_pairs(pl, cands.filter(pl.col("k") == k).select("bank_row", "cash_row"))
+            if matches.height == 0:
+                continue
+            cands = (cands.join(matches.select("bank_row"), on="bank_row", how="anti")
+                          .join(matches.select("cash_row"), on="cash_row", how="anti"))
+            match_id = self._label(df_bank, df_cash, matches, match_id, lambda mid, r: label(k, mid, r))
+        return match_id
+
+    def _split_passes(self, df_bank, df_cash, cands, passes, match_id, label, order=("i", "j"),
+                      footprint=None, free_cash=None) -> int:
+        pl = self.pl
+        for k in passes:
+            pass_cands = cands.filter(pl.col("k") == k)
+            pass_foot = footprint.filter(pl.col("k") == k).drop("k") if footprint is not None else None
+            matches = _resolve_splits(pl, pass_cands, list(order), pass_foot, free_cash)
+            if matches.height == 0:
+                continue
+            taken = pl.concat([matches.select(pl.col("i").alias("cash_row")),
+                               matches.select(pl.col("j").alias("cash_row"))])
+            cands = (cands.join(matches.select("bank_row"), on="bank_row", how="anti")
+                          .join(taken.rename({"cash_row": "i"}), on="i", how="anti")
+                          .join(taken.rename({"cash_row": "j"}), on="j", how="anti"))
+            if footprint is not None:
+                footprint = footprint.join(taken, on="cash_row", how="anti")
+            if free_cash is not None:
+                free_cash = free_cash.join(taken, on="cash_row", how="anti")
+            match_id = self._label(df_bank, df_cash, matches, match_id, lambda mid, r: label(k, mid, r),
+                                   cash_cols=("i", "j"))
+        return match_id
+
+    def _same_day_splits(self, bank, cash):
+        """Bank rows x pairs (i < j) of free cash rows on the bank row's date."""
+        pl = self.pl
+        left = cash.select(pl.col("cash_row").alias("i"), "c_ns", pl.col("c_net").alias("net_i"))
+        right = cash.select(pl.col("cash_row").alias("j"), "c_ns", pl.col("c_net").alias("net_j"))
+        pairs = left.join(right, on="c_ns").filter(pl.col("i") < pl.col("j"))
+        return bank.join(pairs, left_on="b_ns", right_on="c_ns")
+
+    # --- stages -------------------------------------------------------------
+
+    def _missing_months(self, df_bank, df_cash, bank, cash, match_id):
+        cash_months = df_cash['Date'].dt.to_period('M')
+        bank_months = df_bank['Calculated_Date'].dt.to_period('M')
+        cash_set, bank_set = set(cash_months.dropna()), set(bank_months.dropna())
+        mask = cash_months.isin(cash_set - bank_set) & df_cash['Reconciled'].isna()
+        df_cash.loc[mask, 'Reconciled'] = "BANK STATEMENT MISSING - " + cash_months[mask].astype(str)
+        mask = bank_months.isin(bank_set - cash_set) & df_bank['Reconciled'].isna()
+        df_bank.loc[mask, 'Reconciled'] = "CASH REC MISSING - " + bank_months[mask].astype(str)
+        return match_id
+
+    def _exact(self, df_bank, df_cash, bank, cash, match_id):
+        # Same (date, amount) is an equivalence class: the n-th open bank row of a class
+        # takes its n-th free cash row, i.e. a join on (date, amount, rank)
+        pl = self.pl
+        b = bank.sort("bank_row").with_columns(pl.int_range(pl.len()).over("b_ns", "b_key").alias("rank"))
+        c = cash.sort("cash_row").with_columns(pl.int_range(pl.len()).over("c_ns", "c_key").alias("rank"))
+        matches = (b.join(c, left_on=["b_ns", "b_key", "rank"], right_on=["c_ns", "c_key", "rank"])
+                    .select("bank_row", "cash_row").sort("bank_row"))
+        return self._label(df_bank, df_cash, matches, match_id, lambda mid, r: f"EXACT MATCH - {mid}")
+
+    def _split_same_day(self, df_bank, df_cash, bank, cash, match_id):
+        pl = self.pl
+        cands = (self._same_day_splits(bank, cash)
+                 .filter(pl.col("net_i") + pl.col("net_j") == pl.col("b_net"))
+                 .select("bank_row", "i", "j", pl.lit(0).alias("k")))
+        return self._split_passes(df_bank, df_cash, cands, [0], match_id,
+                                  lambda k, mid, r: f"EXACT BUT SPLIT - {mid}")
+
+    def _year_offset(self, df_bank, df_cash, bank, cash, match_id):
+        pl = self.pl
+        cands = (bank.join(cash, left_on=["b_m", "b_dd", "b_key"], right_on=["c_m", "c_dd", "c_key"])
+                 .with_columns((pl.col("b_y") - pl.col("c_y")).abs().alias("k"))
+                 .filter(pl.col("k").is_in([1, 2, 10])))
+        return self._one_to_one_passes(
+            df_bank, df_cash, cands, [1, 2, 10], match_id,
+            lambda k, mid, r: f"BAD DATE, CORRECT AMOUNT - Date off {k} years - {mid}")
+
+    def _day_offset(self, df_bank, df_cash, bank, cash, match_id):
+        pl = self.pl
+        cands = (bank.join(cash, left_on="b_key", right_on="c_key")
+                 .with_columns(_day_gap(pl).abs().alias("k"))
+                 .filter(pl.col("k").is_between(1, 27)))
+        return self._one_to_one_passes(
+            df_bank, df_cash, cands, range(1, 28), match_id,
+            lambda k, mid, r: f"MINOR BAD DATE, CORRECT AMOUNT - Date off {k} days - {mid}")
+
+    def _penny_diff(self, df_bank, df_cash, bank, cash, match_id):
+        pl = self.pl
+        pairs = bank.join(cash, left_on="b_ns", right_on="c_ns")
+        pairs = pairs.filter((pl.col("c_net") - pl.col("b_net")).abs() < 1.0)
+        # Bucket by pennies with numpy's rounding, exactly as abs(cash - bank).round(2) == tol
+        gap = np.round(np.abs(pairs["c_net"].to_numpy() - pairs["b_net"].to_numpy()), 2)
+        k = np.rint(gap * 100).astype("int64").clip(0, 100)
+        cands = pairs.with_columns(pl.Series("k", k)).filter(pl.Series(gap == _TOLERANCE[k]) & (pl.col("k") >= 1))
+
+        def label(k, mid, r):
+            diff = (np.float64(df_bank.at[r["bank_row"], 'Net']) - np.float64(df_cash.at[r["cash_row"], 'Net'])).round(2)
+            return f"MINOR AMOUNT DIFF - {diff} difference - {mid}"
+        return self._one_to_one_passes(df_bank, df_cash, cands, range(1, 100), match_id, label)
+
+    def _split_penny_diff(self, df_bank, df_cash, bank, cash, match_id):
+        pl = self.pl
+        cands = self._same_day_splits(bank, cash)
+        bank_net = cands["b_net"].to_numpy()
+        cash_sum = np.round(cands["net_i"].to_numpy() + cands["net_j"].to_numpy(), 2)
+        gap = np.round(np.abs(bank_net - cash_sum), 2)
+        k = np.rint(gap * 100).astype("int64").clip(0, 100)
+        cands = (cands.with_columns(pl.Series("k", k), pl.Series("diff", np.round(bank_net - cash_sum, 2)))
+                      .filter(pl.Series(gap == _TOLERANCE[k]) & pl.col("k").is_between(1, 99))
+                      .select("bank_row", "i", "j", "k", "diff"))
+        return self._split_passes(
+            df_bank, df_cash, cands, range(1, 100), match_id,
+            lambda k, mid, r: f"SPLIT MATCH, MINOR DIFF - {np.float64(r['diff'])} difference - {mid}")
+
+    def _split_near_date(self, df_bank, df_cash, bank, cash, match_id):
+        # One cash row on the bank date, the other within 7 days but not on it
+        pl = self.pl
+        same_day = bank.join(cash.select(pl.col("cash_row").alias("i"), "c_ns", pl.col("c_net").alias("net_i")),
+                             left_on="b_ns", right_on="c_ns")
+        near = _near_days(pl, same_day, cash.select(pl.col("cash_row").alias("j"), pl.col("c_day").alias("day"),
+                                                    pl.col("c_ns").alias("ns_j"), pl.col("c_net").alias("net_j")), 7)
+        near = near.with_columns(_day_gap(pl, "ns_j", "b_ns").alias("gap"))
+        near = near.filter((pl.col("gap").abs() <= 7) & (pl.col("ns_j") != pl.col("b_ns")))
+        net_sum = np.round(near["net_i"].to_numpy() + near["net_j"].to_numpy(), 2)
+        cands = (near.filter(pl.Series(net_sum == near["b_net"].to_numpy()))
+                     .select("bank_row", "i", "j", pl.col("gap").abs().alias("day_diff"), pl.lit(0).alias("k")))
+        return self._split_passes(
+            df_bank, df_cash, cands, [0], match_id,
+            lambda k, mid, r: f"MATCHED, BUT SPLIT, ONE PAYMENT OFF BY {r['day_diff']} days - {mid}")
+
+    def _split_date_shift(self, df_bank, df_cash, bank, cash, match_id):
+        # Both cash rows on one date exactly k days away; the pandas loop tries those dates
+        # in order of their first free cash row, so that is the first sort key.
+        pl = self.pl
+        nearby = _near_days(pl, bank, cash.rename({"c_day": "day"}), 3)
+        nearby = nearby.with_columns(_day_gap(pl).abs().alias("k")).filter(pl.col("k").is_between(1, 3))
+        footprint = nearby.select("bank_row", "cash_row", "k")
+        left = nearby.select("bank_row", "k", "c_ns", "b_net", pl.col("cash_row").alias("i"), pl.col("c_net").alias("net_i"))
+        right = nearby.select("bank_row", "k", "c_ns", pl.col("cash_row").alias("j"), pl.col("c_net").alias("net_j"))
+        pairs = left.join(right, on=["bank_row", "k", "c_ns"]).filter(pl.col("i") < pl.col("j"))
+        net_sum = np.round(pairs["net_i"].to_numpy() + pairs["net_j"].to_numpy(), 2)
+        cands = pairs.filter(pl.Series(net_sum == pairs["b_net"].to_numpy())).select("bank_row", "i", "j", "k", "c_ns")
+        return self._split_passes(
+            df_bank, df_cash, cands, [1, 2, 3], match_id,
+            lambda k, mid, r: f"SPLIT MATCH, DATE SHIFT - {k} days off - {mid}",
+            footprint=footprint, free_cash=cash.select("cash_row", "c_ns"))
+
+    def _month_offset(self, df_bank, df_cash, bank, cash, match_id):
+        pl = self.pl
+        cands = (bank.join(cash, left_on=["b_y", "b_dd", "b_key"], right_on=["c_y", "c_dd", "c_key"])
+                 .with_columns((pl.col("c_m") - pl.col("b_m")).abs().alias("k"))
+                 .filter(pl.col("k").is_between(1, 3)))
+        return self._one_to_one_passes(
+            df_bank, df_cash, cands, [1, 2, 3], match_id,
+            lambda k, mid, r: f"MONTH ERROR, CORRECT AMOUNT - Off by {k} months - {mid}")
+
+    def _daily_total(self, df_bank, df_cash, bank, cash, match_id):
+        # Daily sums are taken once, before any bank row is matched (as in the pandas stage);
+        # the sum itself stays on pandas so the float result is bit-identical.
+        pl = self.pl
+        sums = df_cash[df_cash['Reconciled'].isna()].groupby('Date')['Net'].sum().round(2)
+        if sums.empty or bank.height == 0:
+            return match_id
+        sums = pl.DataFrame({"b_ns": sums.index.to_numpy(dtype="datetime64[ns]").astype("int64"),
+                             "day_total": sums.to_numpy(dtype=float)})
+        matched = bank.join(sums, on="b_ns").sort("bank_row")
+        matched = matched.filter(pl.Series(np.round(matched["b_net"].to_numpy(), 2) == matched["day_total"].to_numpy()))
+        if matched.height == 0:
+            return match_id
+        matched = matched.with_columns((pl.int_range(pl.len()) + match_id).alias("match_id"))
+        labels = [f"SINGLE BANK TO DAILY CASH - {mid}" for mid in matched["match_id"]]
+        df_bank.loc[matched["bank_row"].to_list(), 'Reconciled'] = labels
+        # The first matched bank row of a date takes all of that date's free cash rows
+        first = matched.group_by("b_ns", maintain_order=True).first().select("b_ns", "match_id")
+        cash_rows = cash.join(first, left_on="c_ns", right_on="b_ns")
+        df_cash.loc[cash_rows["cash_row"].to_list(), 'Reconciled'] = [
+            f"SINGLE BANK TO DAILY CASH - {mid}" for mid in cash_rows["match_id"]]
+        return match_id + matched.height
@@ -0,0 +1,68 @@
+# /src/preview.py
+import math
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# The leading same-date stages of MATCH_STAGES: they only pair lines within one day and run
+# before any offset stage, so on whole sampled months they give the labels of the full run.
+# daily_total is same-date too but runs last, on what the offset stages leave, so it is left out.
+PREVIEW_STAGES = ["missing_months", "exact", "split_same_day"]
+DEFAULT_MONTHS_PER_YEAR = 2
+Z_95 = 1.96
+
+def sample_months(months: List[pd.Period], per_year: int = DEFAULT_MONTHS_PER_YEAR,
+                  seed: int = 0) -> List[pd.Period]:
+    """Up to `per_year` random months of every calendar year present (strata = years)."""
+    rng = np.random.default_rng(seed)
+    by_year: Dict[int, List[pd.Period]] = {}
+    for m in months:
+        by_year.setdefault(m.year, []).append(m)
+    sample = []
+    for year in sorted(by_year):
+        pool = sorted(by_year[year])
+        picks = rng.choice(len(pool), size=min(per_year, len(pool)), replace=False)
+        sample.extend(pool[i] for i in sorted(picks))
+    return sample
+
+def stratified_total(values: pd.Series, months: List[pd.Period], z: float = Z_95) -> Tuple[float, float, float]:
+    """
+    Estimated sum over all `months` of a per-month count observed on the sampled months
+    (`values`, indexed by month), with a normal-approximation confidence interval.
+    Strata are calendar years; a stratum with a single sampled month borrows the
+    variance of all sampled months. Fully sampled strata contribute no variance.
+    """
+    strata_sizes = pd.Series([m.year for m in months]).value_counts()
+    if values.empty:
+        return 0.0, 0.0, 0.0
+    years = pd.Index([m.year for m in values.index])
+    pooled_var = float(values.var(ddof=1)) if len(values) > 1 else 0.0
+    total, variance = 0.0, 0.0
+    for year, group in values.groupby(years):
+        n, size = len(group), int(strata_sizes.get(year, len(group)))
+        var = float(group.var(ddof=1)) if n > 1 else pooled_var
+        total += size * float(group.mean())
+        variance += size ** 2 * (1 - n / size) * var / n
+    half = z * math.sqrt(max(variance, 0.0))
+    return total, max(total - half, 0.0), total + half
+
+def estimate_side(per_month: pd.DataFrame, months: List[pd.Period], lines: int, z: float = Z_95) -> Dict[str, float]:
+    """
+    One side's preview figures from its sampled months (`lines`, `open` per month):
+    estimated lines the cheap stages leave open, and the cheap-stage match rate, with CIs.
+    """
+    open_est, open_low, open_high = stratified_total(per_month["open"], months, z)
+    open_high = min(open_high, lines)
+    open_est = min(open_est, lines)
+    rate = lambda n_open: round(1 - n_open / lines, 4) if lines else None
+    return {
+        "lines": lines,
+        "sampled_lines": int(per_month["lines"].sum()),
+        "open_est": round(open_est, 1),
+        "open_ci_low": round(open_low, 1),
+        "open_ci_high": round(open_high, 1),
+        "match_rate": rate(open_est),
+        "match_rate_ci_low": rate(open_high),
+        "match_rate_ci_high": rate(open_low),
+    }
@@ -0,0 +1,144 @@
+# /src/profiling.py
+import cProfile
+import io
+import pstats
+import re
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from .config import DEFAULT_OUTPUT_ENCODING
+
+DEFAULT_SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+
+def _safe_name(value) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", str(value)) or "unknown"
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, thread_ident: int, interval: float):
+        super().__init__(name="stage-stack-sampler", daemon=True)
+        self.thread_ident = thread_ident
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_ident)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self) -> Counter:
+        self._halt.set()
+        self.join()
+        return self.counts
+
+def _top_function(profile: cProfile.Profile) -> Optional[str]:
+    stats = pstats.Stats(profile).stats
+    if not stats:
+        return None
+    (filename, lineno, func), _ = max(stats.items(), key=lambda kv: kv[1][2])  # by own time
+    return f"{func} ({Path(filename).name}:{lineno})"
+
+class StageProfiler:
+    """
+    StageRecorder hook that profiles every stage of every account.
+
+    Per stage it writes, under <out_dir>/<account>/:
+      NN_<stage>.prof       cProfile output (snakeviz / pstats)
+      NN_<stage>.txt        top functions by cumulative time
+      NN_<stage>.collapsed  sampled stacks in collapsed format (flamegraph.pl, speedscope)
+    `write_summary()` adds the cross-account stage ranking and merged per-stage stacks.
+    """
+
+    def __init__(self, out_dir: Path, sample_interval: float = DEFAULT_SAMPLE_INTERVAL, top_n: int = 30):
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.sample_interval = sample_interval
+        self.top_n = top_n
+        self.rows: List[Dict] = []
+        self._stage_stacks: Dict[str, Counter] = {}
+        self._active = None
+
+    def stage_start(self, rec: Dict) -> None:
+        if self._active is not None:  # nested stage: the outer one already covers it
+            return
+        profile = cProfile.Profile()
+        sampler = _StackSampler(threading.get_ident(), self.sample_interval)
+        sampler.start()
+        profile.enable()
+        self._active = (rec, profile, sampler)
+
+    def stage_end(self, rec: Dict) -> None:
+        if self._active is None or self._active[0] is not rec:
+            return
+        _, profile, sampler = self._active
+        profile.disable()
+        stacks = sampler.stop()
+        self._active = None
+
+        account_dir = self.out_dir / _safe_name(rec.get("account_id"))
+        account_dir.mkdir(parents=True, exist_ok=True)
+        stem = account_dir / f"{rec['seq']:02d}_{_safe_name(rec['stage'])}"
+
+        profile.dump_stats(str(stem.with_suffix(".prof")))
+        text = io.StringIO()
+        pstats.Stats(profile, stream=text).sort_stats("cumulative").print_stats(self.top_n)
+        stem.with_suffix(".txt").write_text(text.getvalue(), encoding="utf-8")
+        with stem.with_suffix(".collapsed").open("w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        self._stage_stacks.setdefault(rec["stage"], Counter()).update(stacks)
+        self.rows.append({
+            "account_id": rec.get("account_id"),
+            "seq": rec["seq"],
+            "stage": rec["stage"],
+            "wall_s": rec.get("wall_s"),
+            "rows_in": rec.get("rows_in"),
+            "matched_bank": rec.get("matched_bank"),
+            "samples": sum(stacks.values()),
+            "top_function": _top_function(profile),
+        })
+
+    def write_summary(self) -> Optional[pd.DataFrame]:
+        """Writes stage_detail.csv, stage_summary.csv and all_accounts/<stage>.collapsed."""
+        if not self.rows:
+            return None
+        detail = pd.DataFrame(self.rows)
+        detail.to_csv(self.out_dir / "stage_detail.csv", index=False, encoding=DEFAULT_OUTPUT_ENCODING)
+
+        slowest = detail.loc[detail.groupby("stage")["wall_s"].idxmax(), ["stage", "account_id", "top_function"]]
+        summary = (
+            detail.groupby("stage")
+            .agg(accounts=("account_id", "nunique"), total_s=("wall_s", "sum"),
+                 mean_s=("wall_s", "mean"), max_s=("wall_s", "max"))
+            .reset_index()
+            .merge(slowest.rename(columns={"account_id": "slowest_account",
+                                           "top_function": "top_function_in_slowest"}), on="stage")
+            .sort_values("total_s", ascending=False)
+        )
+        summary["share_pct"] = (100 * summary["total_s"] / summary["total_s"].sum()).round(1)
+        summary[["total_s", "mean_s", "max_s"]] = summary[["total_s", "mean_s", "max_s"]].round(4)
+        summary.to_csv(self.out_dir / "stage_summary.csv", index=False, encoding=DEFAULT_OUTPUT_ENCODING)
+
+        merged_dir = self.out_dir / "all_accounts"
+        merged_dir.mkdir(exist_ok=True)
+        for stage, stacks in self._stage_stacks.items():
+            with (merged_dir / f"{_safe_name(stage)}.collapsed").open("w", encoding="utf-8") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        return summary
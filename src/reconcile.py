@@ -1,132 +1,51 @@
 # /src/reconcile.py
+import numpy as np
 import pandas as pd
-from typing import Tuple
+from typing import Optional, Tuple
 from .config import DEFAULT_TOLERANCE, MAX_DATE_LAG_DAYS
-from .tagging import tag_row
-from .text_utils import (
-    coerce_date, coerce_number, parse_match_id, signed_bank_amount, first_nonempty
-)
-
-def _status(row, tol: float):
-    match_id = row.get("Match_ID")
-    if not match_id:
-        return "UNLINKED_NO_MATCH_ID"
-    amt_diff = row.get("Amount_Diff")
-    try:
-        amt_diff = float(amt_diff)
-    except Exception:
-        return "INVALID_AMOUNTS"
-    return "MATCHED" if abs(amt_diff) <= float(tol) else "MISMATCH"
-
-def reconcile_account(df: pd.DataFrame, account_id: str, rules) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
-    # Ensure required columns
-    for col in ["Calculated_Date", "Cash_Date", "Description1A", "Description1B", "Description2",
-                "Detail", "Type", "Amount", "Reconciled", "Debit", "Credit"]:
-        if col not in df.columns:
-            df[col] = None
-
-    # Coerce
-    df["Calculated_Date"] = coerce_date(df.get("Calculated_Date"))
-    df["Cash_Date"] = coerce_date(df.get("Cash_Date"))
-    df["Debit"] = coerce_number(df.get("Debit"))
-    df["Credit"] = coerce_number(df.get("Credit"))
-    df["CashRec_Amount"] = coerce_number(df.get("Amount"))
-    df["Bank_Amount"] = df.apply(lambda r: signed_bank_amount(r["Debit"], r["Credit"]), axis=1)
-    df["Match_ID"] = df["Reconciled"].apply(parse_match_id)
-
-    # Tagging
-    tag_results = df.apply(lambda r: tag_row(r, rules), axis=1, result_type='expand')
-    tag_results.columns = ["Type_Group", "Tag", "Investor", "Originator", "SPV", "Tag_Year", "Tag_Source", "Tag_Year_Required_Missing"]
-    detailed_df = pd.concat([df, tag_results], axis=1)
-
-    # Ensure numeric before aggregations
-    detailed_df["Bank_Amount"] = pd.to_numeric(detailed_df["Bank_Amount"], errors="coerce").fillna(0.0)
-    detailed_df["CashRec_Amount"] = pd.to_numeric(detailed_df["CashRec_Amount"], errors="coerce").fillna(0.0)
-
-    # ✅ Ensure datetime64[ns] for date columns (blanks -> NaT)
-    for col in ["Calculated_Date", "Cash_Date"]:
-        detailed_df[col] = pd.to_datetime(detailed_df[col], errors="coerce")
-
-    # Aggregates per Match_ID: bank
-    bank_agg = (
-        detailed_df
-        .groupby("Match_ID", dropna=False)
-        .agg(
-            Bank_Amount_Total=("Bank_Amount", "sum"),
-            Bank_Date_Min=("Calculated_Date", "min"),
-            Bank_Date_Max=("Calculated_Date", "max"),
-            Bank_Desc1B=("Description1B", lambda x: first_nonempty(*x)),
-            Bank_Desc2=("Description2", lambda x: first_nonempty(*x)),
-        )
-        .reset_index()
-    )
-    # Aggregates per Match_ID: manual
-    manual_agg = (
-        detailed_df
-        .groupby("Match_ID", dropna=False)
-        .agg(
-            CashRec_Amount_Total=("CashRec_Amount", "sum"),
-            Cash_Date_Min=("Cash_Date", "min"),
-            Cash_Date_Max=("Cash_Date", "max"),
-        )
-        .reset_index()
-    )
-
-    detailed_df = detailed_df.merge(bank_agg, on="Match_ID", how="left") \
-                             .merge(manual_agg, on="Match_ID", how="left")
-
-    # --- Amount_Diff numeric & safe ---
-    detailed_df["Amount_Diff"] = (
-        pd.to_numeric(detailed_df["Bank_Amount_Total"], errors="coerce").fillna(0)
-        - pd.to_numeric(detailed_df["CashRec_Amount_Total"], errors="coerce").fillna(0)
-    ).round(2)
-
-    # --- Date lag numeric or NaN ---
-    def min_date_lag(row):
-        bmin, cmin = row["Bank_Date_Min"], row["Cash_Date_Min"]
-        if pd.isna(bmin) or pd.isna(cmin):
-            return float("nan")
-        try:
-            return abs((pd.to_datetime(bmin) - pd.to_datetime(cmin)).days)
-        except Exception:
-            return float("nan")
-
-    detailed_df["Date_Lag_Days"] = detailed_df.apply(min_date_lag, axis=1)
-    detailed_df["Date_Lag_Days"] = pd.to_numeric(detailed_df["Date_Lag_Days"], errors="coerce")
-
-    detailed_df["Status"] = detailed_df.apply(lambda r: _status(r, DEFAULT_TOLERANCE), axis=1)
-
-    # Split/fee heuristic (numeric-safe group_ok)
-    amt_diff_num = pd.to_numeric(detailed_df["Amount_Diff"], errors="coerce")
-    group_ok = (
-        amt_diff_num.groupby(detailed_df["Match_ID"], dropna=False)
-        .first()
-        .abs()
-        .le(float(DEFAULT_TOLERANCE))
+from .stages import StageRecorder
+from .tagging import tag_frame, tag_groups
+from .text_utils import coerce_date, coerce_number, add_text_columns, MATCH_ID_PATTERN, TEXT_COL, TEXT_NORM_COL
+
+def _status(match_id: pd.Series, amount_diff: pd.Series, tol: float) -> pd.Series:
+    """
+    Per-row status: UNLINKED_NO_MATCH_ID without a match ID, INVALID_AMOUNTS when Amount_Diff
+    is not a number (missing / text), else MATCHED within `tol` and MISMATCH otherwise
+    (a NaN difference is a MISMATCH).
+    """
+    if pd.api.types.is_numeric_dtype(amount_diff):
+        amt_diff = amount_diff.astype(float)
+        invalid = pd.Series(False, index=amount_diff.index)
+    else:
+        amt_diff = pd.to_numeric(amount_diff, errors="coerce")
+        invalid = amt_diff.isna() & amount_diff.map(type).ne(float)
+    status = np.select(
+        [match_id.isna(), invalid, amt_diff.abs() <= float(tol)],
+        ["UNLINKED_NO_MATCH_ID", "INVALID_AMOUNTS", "MATCHED"],
+        default="MISMATCH",
     )
+    return pd.Series(status, index=match_id.index, dtype=object)
 
-    fee_like = (
-        detailed_df["Detail"].astype(str).str.contains(r"\bFEE|CHARGE|EXPENSE\b", regex=True, case=False, na=False)
-        | detailed_df["Description2"].astype(str).str.contains(r"\bFEE|CHARGE|EXPENSE\b", regex=True, case=False, na=False)
-        | detailed_df["Description1B"].astype(str).str.contains(r"\bFEE|CHARGE|EXPENSE\b", regex=True, case=False, na=False)
-    )
-    detailed_df.loc[
-        (detailed_df["Status"] == "MISMATCH")
-        & (fee_like | detailed_df["Match_ID"].map(group_ok).fillna(False)),
-        "Status"
-    ] = "MATCHED_WITH_SPLIT_FEES"
+def _nonempty_text(s: pd.Series) -> pd.Series:
+    """Text cells that are non-blank strings; everything else missing (so GroupBy.first skips it)."""
+    s = s.astype(object)
+    return s.where(s.str.strip().fillna("").ne(""))
 
-    # Exceptions
+def untagged_rows(detailed_df: pd.DataFrame) -> pd.Series:
+    """Rows a new rule could tag: untagged non-investment rows and investment rows with neither originator nor SPV."""
     untagged = detailed_df["Tag"].isna() & detailed_df["Type_Group"].ne("Investment payments")
     inv_missing = (detailed_df["Type_Group"] == "Investment payments") & detailed_df["Originator"].isna() & detailed_df["SPV"].isna()
+    return untagged | inv_missing
+
+def exceptions_mask(detailed_df: pd.DataFrame) -> pd.Series:
+    """Rows for the exceptions output: untagged, year missing, bad status or a large date lag."""
     year_missing = detailed_df.get("Tag_Year_Required_Missing", False) == True
     bad_status = detailed_df["Status"].isin(["UNLINKED_NO_MATCH_ID", "INVALID_AMOUNTS", "MISMATCH"])
     big_lag = detailed_df["Date_Lag_Days"].fillna(0) > float(MAX_DATE_LAG_DAYS)
+    return untagged_rows(detailed_df) | year_missing | bad_status | big_lag
 
-    exceptions_df = detailed_df[untagged | inv_missing | year_missing | bad_status | big_lag].copy()
-
-    # Summary
-    summary_df = (
+def summary_frame(detailed_df: pd.DataFrame) -> pd.DataFrame:
+    return (
         detailed_df
         .groupby(["Type", "Type_Group", "Tag", "Tag_Year"], dropna=False)
         .agg(CashRec_Amount_Total=("CashRec_Amount", "sum"), Rows=("CashRec_Amount", "count"))
@@ -134,17 +53,13 @@ def reconcile_account(df: pd.DataFrame, account_id: str, rules) -> Tuple[pd.Data
         .sort_values(["Type_Group", "Type", "Tag", "Tag_Year"], na_position="last")
     )
 
-    # Suggestions (from untagged lines)
-    def text_for_suggestions(r):
-        return " ".join([str(r.get("Description1B") or ""), str(r.get("Description2") or ""), str(r.get("Detail") or "")])
-
-    from .text_utils import normalize_text, tokenize, ngrams
-    untagged_rows = detailed_df[untagged | inv_missing].copy()
+def suggestions_frame(detailed_df: pd.DataFrame) -> pd.DataFrame:
+    """Top 2-3-grams and tokens of the untagged lines' normalized text, side by side."""
+    from .text_utils import ngrams
 
     token_counts, ngram_counts = {}, {}
-    for _, r in untagged_rows.iterrows():
-        t = normalize_text(text_for_suggestions(r))
-        toks = [tok for tok in tokenize(t) if len(tok) >= 3 and not tok.isdigit()]
+    for t in detailed_df.loc[untagged_rows(detailed_df), TEXT_NORM_COL]:
+        toks = [tok for tok in t.split() if len(tok) >= 3 and not tok.isdigit()]
         for tok in toks:
             token_counts[tok] = token_counts.get(tok, 0) + 1
         for g in ngrams(toks, 2, 3):
@@ -161,7 +76,124 @@ def reconcile_account(df: pd.DataFrame, account_id: str, rules) -> Tuple[pd.Data
     max_len = max(len(suggestions_df), len(top_tokens_df))
     suggestions_df = suggestions_df.reindex(range(max_len))
     top_tokens_df = top_tokens_df.reindex(range(max_len))
-    suggestions_df = pd.concat([suggestions_df, top_tokens_df], axis=1)
+    return pd.concat([suggestions_df, top_tokens_df], axis=1)
+
+TAG_MODES = ("row", "group")
+
+def reconcile_account(df: pd.DataFrame, account_id: str, rules,
+                      recorder: Optional[StageRecorder] = None,
+                      tag_mode: str = "row", tag_cache=None) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    # Steps run as named stages so they can be timed / profiled by the caller.
+    # tag_mode "group" tags each Match_ID group once (tagging.tag_groups) instead of every row;
+    # a TagCache (src.tag_cache) shared across accounts reuses the tags of repeated descriptions.
+    if tag_mode not in TAG_MODES:
+        raise ValueError(f"Unknown tag_mode {tag_mode!r} (choose from {', '.join(TAG_MODES)})")
+    if recorder is None:
+        recorder = StageRecorder(account_id)
+
+    with recorder.stage("coerce"):
+        # Ensure required columns
+        for col in ["Calculated_Date", "Cash_Date", "Description1A", "Description1B", "Description2",
+                    "Detail", "Type", "Amount", "Reconciled", "Debit", "Credit"]:
+            if col not in df.columns:
+                df[col] = None
+
+        # Coerce
+        df["Calculated_Date"] = coerce_date(df.get("Calculated_Date"))
+        df["Cash_Date"] = coerce_date(df.get("Cash_Date"))
+        df["Debit"] = coerce_number(df.get("Debit"))
+        df["Credit"] = coerce_number(df.get("Credit"))
+        df["CashRec_Amount"] = coerce_number(df.get("Amount"))
+        df["Bank_Amount"] = df["Credit"].astype(float) - df["Debit"].astype(float)
+        # Trailing number of the Reconciled label (None for blanks / labels without one)
+        match_id = df["Reconciled"].astype(object).str.strip().str.extract(MATCH_ID_PATTERN, expand=False)
+        df["Match_ID"] = match_id.astype(object).where(match_id.notna(), None)
+
+    with recorder.stage("text"):
+        # Combined original / normalized description text, read by every step below
+        add_text_columns(df)
+
+    with recorder.stage("tagging") as rec:
+        # Tagging
+        if tag_mode == "group":
+            tag_results, rec["tag_calls_saved"] = tag_groups(df, rules, tag_cache)
+        else:
+            tag_results = tag_frame(df, rules, tag_cache)
+            rec["tag_calls_saved"] = 0
+        rec["tag_calls"] = len(df) - rec["tag_calls_saved"]
+        detailed_df = pd.concat([df, tag_results], axis=1)
+
+    with recorder.stage("aggregates"):
+        # Ensure numeric before aggregations
+        detailed_df["Bank_Amount"] = pd.to_numeric(detailed_df["Bank_Amount"], errors="coerce").fillna(0.0)
+        detailed_df["CashRec_Amount"] = pd.to_numeric(detailed_df["CashRec_Amount"], errors="coerce").fillna(0.0)
+
+        # ✅ Ensure datetime64[ns] for date columns (blanks -> NaT)
+        for col in ["Calculated_Date", "Cash_Date"]:
+            detailed_df[col] = pd.to_datetime(detailed_df[col], errors="coerce")
+
+        # One Match_ID grouping for every group-level metric: integer group codes (rows
+        # without a Match_ID form their own group), one aggregation pass, then each group
+        # value is broadcast back to its rows by indexing with the codes
+        detailed_df = detailed_df.reset_index(drop=True)
+        group_codes, _ = pd.factorize(detailed_df["Match_ID"], use_na_sentinel=False)
+        group_aggs = (
+            pd.DataFrame({
+                "Bank_Amount": detailed_df["Bank_Amount"],
+                "Calculated_Date": detailed_df["Calculated_Date"],
+                "Description1B": _nonempty_text(detailed_df["Description1B"]),
+                "Description2": _nonempty_text(detailed_df["Description2"]),
+                "CashRec_Amount": detailed_df["CashRec_Amount"],
+                "Cash_Date": detailed_df["Cash_Date"],
+            })
+            .groupby(group_codes, sort=True)
+            .agg(
+                Bank_Amount_Total=("Bank_Amount", "sum"),
+                Bank_Date_Min=("Calculated_Date", "min"),
+                Bank_Date_Max=("Calculated_Date", "max"),
+                Bank_Desc1B=("Description1B", "first"),
+                Bank_Desc2=("Description2", "first"),
+                CashRec_Amount_Total=("CashRec_Amount", "sum"),
+                Cash_Date_Min=("Cash_Date", "min"),
+                Cash_Date_Max=("Cash_Date", "max"),
+            )
+        )
+        # first_nonempty semantics: the first non-blank text of the group, else ""
+        group_aggs[["Bank_Desc1B", "Bank_Desc2"]] = group_aggs[["Bank_Desc1B", "Bank_Desc2"]].fillna("")
+
+        # --- Amount_Diff numeric & safe ---
+        group_aggs["Amount_Diff"] = (group_aggs["Bank_Amount_Total"].fillna(0)
+                                     - group_aggs["CashRec_Amount_Total"].fillna(0)).round(2)
+
+        # --- Date lag numeric or NaN (whole days between the earliest bank and cash dates) ---
+        group_aggs["Date_Lag_Days"] = (group_aggs["Bank_Date_Min"] - group_aggs["Cash_Date_Min"]).dt.days.abs()
+
+        # Split/fee heuristic input: the group's amounts agree within tolerance
+        group_ok = (group_aggs["Amount_Diff"].abs() <= float(DEFAULT_TOLERANCE)).to_numpy()
+
+        for col in group_aggs.columns:
+            detailed_df[col] = group_aggs[col].take(group_codes).to_numpy()
+
+    with recorder.stage("status"):
+        detailed_df["Status"] = _status(detailed_df["Match_ID"], detailed_df["Amount_Diff"], DEFAULT_TOLERANCE)
+
+        # Split/fee heuristic (group_ok from the Match_ID grouping above)
+        # (one pass over the combined text: the pattern can't match across the " | " joins)
+        fee_like = detailed_df[TEXT_COL].str.contains(r"\bFEE|CHARGE|EXPENSE\b", regex=True, case=False, na=False)
+        detailed_df.loc[
+            (detailed_df["Status"] == "MISMATCH")
+            & (fee_like | group_ok[group_codes]),
+            "Status"
+        ] = "MATCHED_WITH_SPLIT_FEES"
+
+    with recorder.stage("exceptions"):
+        exceptions_df = detailed_df[exceptions_mask(detailed_df)].copy()
+
+    with recorder.stage("summary"):
+        summary_df = summary_frame(detailed_df)
+
+    with recorder.stage("suggestions"):
+        suggestions_df = suggestions_frame(detailed_df)
 
     # Traceability
     for df_out in (detailed_df, exceptions_df, summary_df, suggestions_df):
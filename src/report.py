@@ -0,0 +1,212 @@
+# /src/report.py
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+# Stacked reconciliation report (cashrec_report_{account}.csv) layout
+REPORT_BANK_COLS = ['Calculated_Date', 'Acct_From_Filename', 'Company_Name', 'CCY_Type',
+                    'Description1A', 'Description1B', 'Description2', 'Debit', 'Credit']
+REPORT_CASH_COLS = ['FundShortName', 'Type', 'Cash_Date', 'Detail', 'Amount']
+REPORT_COLS = REPORT_BANK_COLS + ['Reconciled'] + REPORT_CASH_COLS
+# report column -> df_cash column
+CASH_SOURCE = {'FundShortName': 'FundShortName', 'Type': 'Type', 'Cash_Date': 'Date', 'Detail': 'Detail', 'Amount': 'Net'}
+
+# Blocks in file order
+MATCHED, MISSING_STATEMENTS, UNRECONCILED_BANK, UNRECONCILED_CASH = 1, 4, 2, 3
+BLOCK_NAMES = {
+    MATCHED: "Matched",
+    MISSING_STATEMENTS: "Missing statements",
+    UNRECONCILED_BANK: "Unreconciled bank",
+    UNRECONCILED_CASH: "Unreconciled cash",
+}
+BLOCK_ORDER = [MATCHED, MISSING_STATEMENTS, UNRECONCILED_BANK, UNRECONCILED_CASH]
+
+MISSING_PATTERN = "MISSING"
+STATUS_PATTERN = "MISSING|UNRECONCILED"   # labels shared by many rows; never blanked as splits
+DEFAULT_CHUNK_ROWS = 50_000
+FORMATS = ["csv", "parquet", "xlsx"]
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet output needs the pyarrow package (pip install pyarrow)") from e
+    return pa, pq
+
+class ReportPlan:
+    """
+    The stacked report as a row plan over the reconciled bank and cash frames: for every
+    output row its block, bank row and cash row (-1 = none) and whether the bank cells are
+    blanked (2nd+ cash row of a split match). Built with one sort and one grouped pass over
+    integer label codes; columns are only materialised chunk by chunk when writing.
+
+    Row order and cell values are those of the original block1/4/2/3 concat: matched bank
+    rows in bank order, each followed by its cash rows in cash order, then MISSING cash
+    rows, unreconciled bank rows and unreconciled cash rows.
+    """
+
+    def __init__(self, df_bank: pd.DataFrame, df_cash: pd.DataFrame, unreconciled_label: Optional[str] = None):
+        self.df_bank = df_bank
+        self.df_cash = df_cash
+        self.unreconciled_label = unreconciled_label   # Reconciled value of unmatched rows (default: empty)
+        bank_label = df_bank['Reconciled']
+        cash_label = df_cash['Reconciled']
+
+        # Integer codes for the labels of both sides (-1 = unreconciled)
+        codes, uniques = pd.factorize(pd.concat([bank_label, cash_label], ignore_index=True))
+        bank_codes, cash_codes = codes[:len(df_bank)], codes[len(df_bank):]
+        is_status = np.asarray(pd.Index(uniques).astype(str).str.contains(STATUS_PATTERN), dtype=bool)
+
+        # Block 1: each matched bank row joined to the matched cash rows sharing its label
+        bank_matched = np.flatnonzero(bank_codes >= 0)
+        cash_matched = np.flatnonzero(cash_codes >= 0)
+        order = cash_matched[np.argsort(cash_codes[cash_matched], kind="stable")]
+        per_code = np.bincount(cash_codes[cash_matched], minlength=len(uniques))
+        starts = np.concatenate([[0], np.cumsum(per_code)[:-1]]).astype("int64")
+
+        b_codes = bank_codes[bank_matched]
+        n_cash = per_code[b_codes] if len(b_codes) else np.zeros(0, dtype="int64")
+        reps = np.maximum(n_cash, 1)
+        m_bank = np.repeat(bank_matched, reps)
+        m_codes = np.repeat(b_codes, reps)
+        offset = np.arange(reps.sum()) - np.repeat(np.cumsum(reps) - reps, reps)
+        has_cash = np.repeat(n_cash, reps) > 0
+        m_cash = np.full(len(m_bank), -1, dtype="int64")
+        m_cash[has_cash] = order[np.repeat(starts[b_codes], reps)[has_cash] + offset[has_cash]]
+        m_blank = pd.Series(m_codes).duplicated().to_numpy() & ~is_status[m_codes] if len(m_codes) else np.zeros(0, bool)
+
+        missing = np.flatnonzero(cash_label.str.contains(MISSING_PATTERN, na=False).to_numpy())
+        bank_open = np.flatnonzero(bank_codes < 0)
+        cash_open = np.flatnonzero(cash_codes < 0)
+
+        none = lambda n: np.full(n, -1, dtype="int64")
+        self.block = np.concatenate([np.full(len(m_bank), MATCHED), np.full(len(missing), MISSING_STATEMENTS),
+                                     np.full(len(bank_open), UNRECONCILED_BANK),
+                                     np.full(len(cash_open), UNRECONCILED_CASH)]).astype("int8")
+        self.bank_pos = np.concatenate([m_bank, none(len(missing)), bank_open, none(len(cash_open))]).astype("int64")
+        self.cash_pos = np.concatenate([m_cash, missing, none(len(bank_open)), cash_open]).astype("int64")
+        self.blank = np.concatenate([m_blank, np.zeros(len(self.block) - len(m_blank), dtype=bool)])
+
+        # A column comes out as object (dates as Timestamps, blanks as "") whenever a block
+        # that fills it with "" is present, exactly as the block concat typed it; otherwise
+        # it keeps its native dtype.
+        present = set(np.unique(self.block).tolist())
+        self._object_cols = set()
+        if present & {MATCHED, MISSING_STATEMENTS, UNRECONCILED_CASH}:
+            self._object_cols.update(REPORT_BANK_COLS)
+        if UNRECONCILED_BANK in present:
+            self._object_cols.update(REPORT_CASH_COLS)
+        self._bank_labels = bank_label.to_numpy(dtype=object)
+        self._cash_labels = cash_label.to_numpy(dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.block)
+
+    def block_counts(self) -> Dict[str, int]:
+        return {BLOCK_NAMES[b]: int((self.block == b).sum()) for b in BLOCK_ORDER}
+
+    def _column(self, col: str, rows: slice, as_csv: bool):
+        if col == 'Reconciled':
+            bank_pos, cash_pos = self.bank_pos[rows], self.cash_pos[rows]
+            labels = np.where(bank_pos >= 0, self._bank_labels[bank_pos], self._cash_labels[cash_pos])
+            if self.unreconciled_label is not None:
+                labels[np.isin(self.block[rows], [UNRECONCILED_BANK, UNRECONCILED_CASH])] = self.unreconciled_label
+            return pd.Series(labels, dtype=object)
+        if col in CASH_SOURCE:
+            values = self.df_cash[CASH_SOURCE[col]].array.take(self.cash_pos[rows], allow_fill=True)
+            empty = self.block[rows] == UNRECONCILED_BANK
+        else:
+            values = self.df_bank[col].array.take(self.bank_pos[rows], allow_fill=True)
+            empty = np.isin(self.block[rows], [MISSING_STATEMENTS, UNRECONCILED_CASH]) | self.blank[rows]
+        if not as_csv:
+            # typed: blanks become missing values
+            return pd.Series(values).mask(empty) if empty.any() else values
+        if col not in self._object_cols:
+            return values
+        out = np.asarray(values.astype(object), dtype=object)
+        out[empty] = ""
+        return pd.Series(out, dtype=object)   # no dtype inference: Timestamps stay objects
+
+    def iter_chunks(self, chunk_rows: int = DEFAULT_CHUNK_ROWS, block: Optional[int] = None,
+                    as_csv: bool = True) -> Iterator[pd.DataFrame]:
+        """
+        Report rows as DataFrames of at most `chunk_rows` rows (only `block` if given).
+        `as_csv=True` gives the cells of the CSV report ("" blanks, object columns);
+        `as_csv=False` keeps native dtypes with blanks as missing values.
+        """
+        if block is None:
+            start, stop = 0, len(self)
+        else:
+            rows = np.flatnonzero(self.block == block)
+            start, stop = (int(rows[0]), int(rows[-1]) + 1) if len(rows) else (0, 0)
+        if start == stop:
+            yield pd.DataFrame({col: pd.Series(dtype=object) for col in REPORT_COLS})
+            return
+        for lo in range(start, stop, chunk_rows):
+            rows = slice(lo, min(lo + chunk_rows, stop))
+            yield pd.DataFrame({col: self._column(col, rows, as_csv) for col in REPORT_COLS})
+
+    def write(self, stem: Path, fmt: str = "csv", chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Path:
+        """Streams the report to `<stem>.csv`, `.parquet` or `.xlsx` (one sheet per block) and returns the path."""
+        path = Path(stem).with_suffix("." + fmt)
+        if fmt == "csv":
+            for n, chunk in enumerate(self.iter_chunks(chunk_rows)):
+                chunk.to_csv(path, index=False, header=(n == 0), mode="w" if n == 0 else "a")
+        elif fmt == "parquet":
+            _write_parquet(self.iter_chunks(chunk_rows, as_csv=False), path)
+        elif fmt == "xlsx":
+            from .excel_report import write_report_xlsx
+            write_report_xlsx(self, path, chunk_rows)
+        else:
+            raise ValueError(f"Unknown report format {fmt!r} (expected one of {FORMATS})")
+        return path
+
+def _arrow_schema(pa, df: pd.DataFrame):
+    fields = []
+    for col, dtype in df.dtypes.items():
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            arrow_type = pa.timestamp("ns")
+        elif pd.api.types.is_float_dtype(dtype):
+            arrow_type = pa.float64()
+        elif pd.api.types.is_integer_dtype(dtype):
+            arrow_type = pa.int64()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(str(col), arrow_type))
+    return pa.schema(fields)
+
+def _write_parquet(chunks: Iterator[pd.DataFrame], path: Path) -> None:
+    pa, pq = _pyarrow()
+    writer = None
+    try:
+        for chunk in chunks:
+            for col in chunk.columns:
+                if isinstance(chunk[col].dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(chunk[col].dtype):
+                    chunk[col] = chunk[col].astype(object).where(chunk[col].notna(), None)
+            if writer is None:
+                schema = _arrow_schema(pa, chunk)
+                writer = pq.ParquetWriter(path, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+def write_frame(df: pd.DataFrame, stem: Path, fmt: str = "csv", chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Path:
+    """Writes a whole frame (e.g. reconciled_bank) to `<stem>.csv` / `.parquet` / `.xlsx` in chunks."""
+    path = Path(stem).with_suffix("." + fmt)
+    chunks = (df.iloc[lo:lo + chunk_rows] for lo in range(0, max(len(df), 1), chunk_rows))
+    if fmt == "csv":
+        for n, chunk in enumerate(chunks):
+            chunk.to_csv(path, index=False, header=(n == 0), mode="w" if n == 0 else "a")
+    elif fmt == "parquet":
+        _write_parquet((chunk.copy() for chunk in chunks), path)
+    elif fmt == "xlsx":
+        from .excel_report import ExcelWriter
+        with ExcelWriter(path) as xl:
+            xl.add_sheet(Path(stem).name, chunks)
+    else:
+        raise ValueError(f"Unknown report format {fmt!r} (expected one of {FORMATS})")
+    return path
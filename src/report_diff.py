@@ -0,0 +1,147 @@
+# /src/report_diff.py
+import argparse
+import glob
+import re
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .config import DEFAULT_OUTPUT_ENCODING
+from .schemas import load_frame
+
+# Columns that identify a source row across runs (match IDs are renumbered every run)
+BANK_KEY = ["Acct_From_Filename", "Calculated_Date", "Description1A", "Description1B", "Description2", "Debit", "Credit"]
+CASH_KEY = ["FundShortName", "Type", "Cash_Date", "Detail", "Amount"]
+DATE_COLS = {"Calculated_Date", "Cash_Date"}
+MONEY_COLS = {"Debit", "Credit", "Amount"}
+
+STATUS_RX = "MISSING|UNRECONCILED"
+MATCH_ID_RX = re.compile(r"\s*-\s*\d+\s*$")
+
+# Per-item change kinds, in summary column order
+CHANGES = ["newly_matched", "newly_unmatched", "moved_counterpart", "moved_stage", "status_changed", "added", "removed"]
+
+def _list_reports(run_dir: Path) -> Dict[str, Path]:
+    return {Path(p).stem.replace("cashrec_report_", ""): Path(p)
+            for p in glob.glob(str(Path(run_dir) / "cashrec_report_*.csv"))}
+
+def _normalise(df: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
+    """Identity columns as canonical text (the report prints dates with or without a time part)."""
+    out = pd.DataFrame(index=df.index)
+    for col in cols:
+        s = df[col]
+        if col in DATE_COLS:
+            out[col] = pd.to_datetime(s, errors="coerce", format="mixed").dt.strftime("%Y-%m-%d").fillna("")
+        elif col in MONEY_COLS:
+            num = pd.to_numeric(s, errors="coerce").round(2)
+            out[col] = np.where(num.isna(), "", num.astype(str))
+        else:
+            out[col] = s.astype(object).where(s.notna(), "").astype(str).str.strip()
+    return out
+
+def report_items(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per source item (bank or cash line) of a cashrec report: its identity key, state
+    (matched / missing / unmatched), stage (label without the match ID), label and the
+    items on the other side of its match. Identical lines are told apart by occurrence.
+    """
+    label = df["Reconciled"].astype(object).where(df["Reconciled"].notna(), "").astype(str)
+    frames = []
+    for side, key_cols in (("bank", BANK_KEY), ("cash", CASH_KEY)):
+        keys = _normalise(df, key_cols)
+        present = (keys != "").any(axis=1)   # blanked split rows / the other side's rows have no cells here
+        keys = keys[present]
+        key = keys[key_cols[0]].str.cat([keys[c] for c in key_cols[1:]], sep=" | ")
+        frames.append(pd.DataFrame({"side": side, "key": key, "label": label[present]}))
+    items = pd.concat(frames, ignore_index=True)
+    items["occurrence"] = items.groupby(["side", "key"]).cumcount()
+
+    status = items["label"].str.contains(STATUS_RX, regex=True)
+    items["state"] = np.where(items["label"] == "", "unmatched", np.where(status, "missing", "matched"))
+    items["stage"] = items["label"].str.replace(MATCH_ID_RX, "", regex=True)
+
+    # Counterpart = sorted keys of the other side's items sharing the match label
+    matched = items[items["state"] == "matched"]
+    members = (matched.sort_values("key", kind="stable")
+               .groupby(["label", "side"])["key"].agg("; ".join).unstack("side"))
+    members = members.reindex(columns=["bank", "cash"])
+    other_side = {"bank": "cash", "cash": "bank"}
+    counterpart = pd.Series("", index=items.index, dtype=object)
+    for side in ("bank", "cash"):
+        rows = (items["state"] == "matched") & (items["side"] == side)
+        counterpart[rows] = items.loc[rows, "label"].map(members[other_side[side]]).fillna("").to_numpy()
+    items["counterpart"] = counterpart
+    return items
+
+def diff_items(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """Joins two runs' items on (side, key, occurrence) and classifies what changed."""
+    cols = ["state", "stage", "label", "counterpart"]
+    merged = old.merge(new, on=["side", "key", "occurrence"], how="outer", suffixes=("_old", "_new"), indicator=True)
+    both = merged["_merge"] == "both"
+    was_matched, is_matched = merged["state_old"] == "matched", merged["state_new"] == "matched"
+    conditions = [
+        merged["_merge"] == "right_only",
+        merged["_merge"] == "left_only",
+        both & ~was_matched & is_matched,
+        both & was_matched & ~is_matched,
+        both & was_matched & is_matched & (merged["counterpart_old"] != merged["counterpart_new"]),
+        both & was_matched & is_matched & (merged["stage_old"] != merged["stage_new"]),
+        both & ~was_matched & ~is_matched & (merged["stage_old"] != merged["stage_new"]),
+    ]
+    choices = ["added", "removed", "newly_matched", "newly_unmatched", "moved_counterpart", "moved_stage",
+               "status_changed"]
+    merged["change"] = np.select(conditions, choices, default="unchanged")
+    out_cols = ["change", "side", "key", "occurrence"] + [f"{c}_{s}" for c in cols for s in ("old", "new")]
+    return merged[out_cols]
+
+def diff_account(old_path: Optional[Path], new_path: Optional[Path]) -> pd.DataFrame:
+    empty = pd.DataFrame(columns=["side", "key", "occurrence", "state", "stage", "label", "counterpart"])
+    old = report_items(load_frame("cashrec_report", old_path)) if old_path else empty
+    new = report_items(load_frame("cashrec_report", new_path)) if new_path else empty
+    return diff_items(old, new)
+
+def diff_runs(old_dir: Path, new_dir: Path, out_dir: Path, accounts: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Diffs every account's cashrec report between two run directories. Writes
+    report_diff_{account}.csv (changed items only) per account and returns the per-account
+    summary (also written to report_diff_summary.csv).
+    """
+    old_reports, new_reports = _list_reports(old_dir), _list_reports(new_dir)
+    accounts = accounts or sorted(set(old_reports) | set(new_reports))
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    summary = []
+    for account_id in accounts:
+        diff = diff_account(old_reports.get(account_id), new_reports.get(account_id))
+        changed = diff[diff["change"] != "unchanged"]
+        changed.to_csv(out_dir / f"report_diff_{account_id}.csv", index=False, encoding=DEFAULT_OUTPUT_ENCODING)
+        counts = changed["change"].value_counts()
+        summary.append({
+            "account_id": account_id,
+            "items_old": int(diff["state_old"].notna().sum()),
+            "items_new": int(diff["state_new"].notna().sum()),
+            **{c: int(counts.get(c, 0)) for c in CHANGES},
+        })
+    summary_df = pd.DataFrame(summary, columns=["account_id", "items_old", "items_new"] + CHANGES)
+    summary_df.to_csv(out_dir / "report_diff_summary.csv", index=False, encoding=DEFAULT_OUTPUT_ENCODING)
+    return summary_df
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff the cashrec reports of two runs (e.g. last quarter vs this quarter)")
+    parser.add_argument("old", type=Path, help="Directory with the previous run's cashrec_report_{account}.csv")
+    parser.add_argument("new", type=Path, help="Directory with the new run's cashrec_report_{account}.csv")
+    parser.add_argument("--out", type=Path, default=Path("report_diff"), help="Directory for the diff CSVs")
+    parser.add_argument("--account", action="append", help="Only this account (repeatable)")
+    args = parser.parse_args()
+
+    summary = diff_runs(args.old, args.new, args.out, args.account)
+    if summary.empty:
+        print("[INFO] No reports found")
+        return
+    print(summary.to_string(index=False))
+    print(f"[OK] Wrote per-account diffs and report_diff_summary.csv to {args.out}")
+
+if __name__ == "__main__":
+    main()
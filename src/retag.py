@@ -0,0 +1,230 @@
+# /src/retag.py
+import argparse
+import bisect
+import glob
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .audit_mislabels import audit_mgmt_vs_expenses
+from .config import OUTPUT_DIR, RULES_DIR, DEFAULT_OUTPUT_ENCODING
+from .reconcile import exceptions_mask, summary_frame, suggestions_frame, TAG_MODES
+from .rules_csv import load_rules_from_csv
+from .tagging import CompiledRules, tag_frame, tag_groups, match_groups, TAG_COLUMNS
+from .text_utils import add_text_columns, TEXT_NORM_COL
+
+RULES_SNAPSHOT_FILENAME = "tag_rules_snapshot.json"
+DETAILED_SUFFIX = "_reconciliation_detailed.csv"
+# tag_row sources whose missing Tag_Year is "" (first_nonempty) rather than None
+YEAR_BLANK_SOURCES = {"priority_phrase", "investment_no_match", "investor_no_match",
+                      "expense_fallback_type", "type_passthrough"}
+
+def write_rules_snapshot(rules: Dict, output_dir: Path, tag_mode: str = "row") -> Path:
+    """The rules and tag mode a set of outputs was tagged with, for the next incremental re-tag."""
+    path = Path(output_dir) / RULES_SNAPSHOT_FILENAME
+    path.write_text(json.dumps({"tag_mode": tag_mode, "rules": rules}, indent=1, default=str), encoding="utf-8")
+    return path
+
+def read_rules_snapshot(path: Path, tag_mode: str = "row") -> Tuple[Dict, str]:
+    """(rules, tag_mode) of a snapshot; `tag_mode` for the earlier snapshots holding the rules only."""
+    snapshot = json.loads(Path(path).read_text(encoding="utf-8"))
+    if "rules" not in snapshot:
+        return snapshot, tag_mode
+    return snapshot["rules"], snapshot["tag_mode"]
+
+def _moved(order_old: List, order_new: List) -> Set:
+    """Entries of both lists whose relative order changed (all but a longest common increasing run)."""
+    first_new = {}
+    for i, entry in enumerate(order_new):
+        first_new.setdefault(entry, i)
+    seq = [(first_new[e], e) for e in dict.fromkeys(order_old) if e in first_new]
+    # Longest increasing subsequence of the new positions, in old order
+    tails, tail_idx, prev = [], [], [-1] * len(seq)
+    for i, (pos, _) in enumerate(seq):
+        k = bisect.bisect_left(tails, pos)
+        if k == len(tails):
+            tails.append(pos)
+            tail_idx.append(i)
+        else:
+            tails[k] = pos
+            tail_idx[k] = i
+        prev[i] = tail_idx[k - 1] if k else -1
+    keep, i = set(), tail_idx[-1] if tail_idx else -1
+    while i >= 0:
+        keep.add(i)
+        i = prev[i]
+    return {e for i, (_, e) in enumerate(seq) if i not in keep}
+
+def changed_phrases(old_rules: Dict, new_rules: Dict) -> Tuple[Set[Tuple[str, ...]], bool]:
+    """
+    Token tuples of the phrases added, removed, changed or reordered between two rule sets,
+    and whether every row must be re-tagged (type groups changed, or a changed phrase can
+    match any text).
+    """
+    if old_rules.get("type_groups") != new_rules.get("type_groups"):
+        return set(), True
+    old, new = CompiledRules(old_rules).phrase_families(), CompiledRules(new_rules).phrase_families()
+    changed = set()
+    for family in set(old) | set(new):
+        a, b = old.get(family, []), new.get(family, [])
+        changed |= {tokens for tokens, _ in set(a) ^ set(b)}
+        changed |= {tokens for tokens, _ in _moved(a, b)}
+    return changed, () in changed
+
+def token_index(text_norm: pd.Series) -> Dict[str, np.ndarray]:
+    """Reverse index: normalized token -> positions of the rows whose text contains it."""
+    tokens = text_norm.reset_index(drop=True).fillna("").str.split().explode().dropna()
+    rows = tokens.index.to_numpy()
+    return {tok: np.unique(rows[pos]) for tok, pos in tokens.groupby(tokens.to_numpy()).indices.items()}
+
+def affected_rows(index: Dict[str, np.ndarray], phrases: Set[Tuple[str, ...]],
+                  groups: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Positions of the rows containing every token of at least one of the phrases. With `groups`
+    (a group code per row, tagging.match_groups) the tokens may come from different rows of a
+    group, since group mode tags the joined text, and every row of a group found is returned.
+    """
+    hits = []
+    for tokens in phrases:
+        found = None
+        for tok in tokens:
+            posting = index.get(tok)
+            if posting is None:
+                found = None
+                break
+            if groups is not None:
+                posting = np.unique(groups[posting])
+            found = posting if found is None else np.intersect1d(found, posting, assume_unique=True)
+        if found is not None and len(found):
+            hits.append(found)
+    if not hits:
+        return np.zeros(0, dtype=np.int64)
+    hit = np.unique(np.concatenate(hits))
+    return hit if groups is None else np.flatnonzero(np.isin(groups, hit))
+
+def _read_output(path: Path) -> pd.DataFrame:
+    # Text as written: only empty cells are missing (keeps tags such as "nan" / "None")
+    df = pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[""], encoding=DEFAULT_OUTPUT_ENCODING)
+    # Outputs written before the shared text columns existed get them rebuilt
+    return add_text_columns(df)
+
+def _typed(detailed_df: pd.DataFrame) -> pd.DataFrame:
+    """The read-back detailed output with the dtypes reconcile_account produced them in."""
+    df = detailed_df.copy()
+    no_year = df["Tag_Year"].isna() & df["Tag_Source"].isin(YEAR_BLANK_SOURCES)
+    df["Tag_Year"] = df["Tag_Year"].astype(object).where(~no_year, "")
+    df["Tag_Year_Required_Missing"] = df["Tag_Year_Required_Missing"].astype(str).eq("True")
+    for col in ["Date_Lag_Days", "CashRec_Amount"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df[TEXT_NORM_COL] = df[TEXT_NORM_COL].fillna("")
+    return df
+
+def retag_account(detailed_path: Path, rules: Dict, phrases: Set[Tuple[str, ...]], all_rows: bool,
+                  tag_mode: str = "row") -> Dict:
+    """
+    Re-tags the rows of one account's outputs that the changed phrases could affect and
+    rewrites its detailed / exceptions / summary / tag suggestions / mislabel suspicions
+    CSVs from the result. Group-mode outputs are re-tagged a whole Match_ID group at a time.
+    """
+    account_id = detailed_path.name[:-len(DETAILED_SUFFIX)]
+    detailed_df = _read_output(detailed_path)
+    groups = match_groups(detailed_df) if tag_mode == "group" and len(detailed_df) else None
+    if all_rows:
+        rows = np.arange(len(detailed_df))
+    else:
+        rows = affected_rows(token_index(detailed_df[TEXT_NORM_COL]), phrases, groups)
+    stats = {"account_id": account_id, "rows": len(detailed_df), "retagged": len(rows), "changed": 0}
+    if not len(rows):
+        return stats
+
+    before = _typed(detailed_df).iloc[rows][TAG_COLUMNS]
+    if groups is not None:
+        tags, _ = tag_groups(detailed_df.iloc[rows], rules)
+    else:
+        tags = tag_frame(detailed_df.iloc[rows], rules)
+    na = "\0"   # missing tags compare equal (None vs NaN), "" stays distinct
+    changed = ~(before.fillna(na).astype(str) == tags.fillna(na).astype(str)).all(axis=1)
+    stats["changed"] = int(changed.sum())
+    if not stats["changed"]:
+        return stats
+
+    for col in TAG_COLUMNS:
+        detailed_df[col] = detailed_df[col].astype(object)
+        detailed_df.loc[tags.index, col] = tags[col].to_numpy()
+    typed = _typed(detailed_df)
+    out_prefix = detailed_path.parent / account_id
+    detailed_df.to_csv(detailed_path, index=False, encoding=DEFAULT_OUTPUT_ENCODING)
+    detailed_df[exceptions_mask(typed)].to_csv(f"{out_prefix}_exceptions.csv", index=False, encoding=DEFAULT_OUTPUT_ENCODING)
+    for name, frame in (("summary", summary_frame(typed)), ("tag_suggestions", suggestions_frame(typed))):
+        frame["Account_ID"] = account_id
+        frame.to_csv(f"{out_prefix}_{name}.csv", index=False, encoding=DEFAULT_OUTPUT_ENCODING)
+    # Written only when there are suspicions, as src.cli does
+    mislabels_path = Path(f"{out_prefix}_mislabel_suspicions.csv")
+    mislabels_df = audit_mgmt_vs_expenses(typed)
+    if not mislabels_df.empty:
+        mislabels_df.to_csv(mislabels_path, index=False, encoding=DEFAULT_OUTPUT_ENCODING)
+    elif mislabels_path.exists():
+        mislabels_path.unlink()
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-tag existing src.cli outputs after the rule CSVs changed, "
+                                                 "touching only rows whose text contains a changed phrase "
+                                                 "(.xlsx workbooks are not rewritten)")
+    parser.add_argument("--output", type=Path, default=OUTPUT_DIR, help="Directory with the src.cli outputs")
+    parser.add_argument("--rules-dir", type=Path, default=RULES_DIR, help="Directory containing the updated CSV rules")
+    parser.add_argument("--previous-rules", type=Path,
+                        help=f"Rules snapshot the outputs were tagged with (default: <output>/{RULES_SNAPSHOT_FILENAME})")
+    parser.add_argument("--accounts-file", type=Path, default=RULES_DIR / "accounts_order.csv",
+                        help="accounts_order.csv the outputs were run with (account order of the portfolio suggestions)")
+    parser.add_argument("--tag-mode", choices=TAG_MODES, default="row",
+                        help="Tag mode the outputs were run with, when the rules snapshot does not record it")
+    args = parser.parse_args()
+
+    rules = load_rules_from_csv(args.rules_dir)
+    snapshot = args.previous_rules or args.output / RULES_SNAPSHOT_FILENAME
+    tag_mode = args.tag_mode
+    if snapshot.exists():
+        previous, tag_mode = read_rules_snapshot(snapshot, args.tag_mode)
+        phrases, all_rows = changed_phrases(previous, rules)
+        print(f"[INFO] {len(phrases):,} changed phrases since {snapshot} ({tag_mode} tags)"
+              + ("; re-tagging every row" if all_rows else ""))
+    else:
+        phrases, all_rows = set(), True
+        print(f"[WARN] No rules snapshot at {snapshot}; re-tagging every row ({tag_mode} tags)")
+
+    paths = sorted(Path(p) for p in glob.glob(str(args.output / f"*{DETAILED_SUFFIX}")))
+    if args.accounts_file.exists():
+        order = pd.read_csv(args.accounts_file, dtype=str).iloc[:, 0].str.strip().tolist()
+        rank = {account_id: i for i, account_id in enumerate(order)}
+        paths.sort(key=lambda p: rank.get(p.name[:-len(DETAILED_SUFFIX)], len(rank)))
+    if not phrases and not all_rows:
+        print("[OK] Rules unchanged since the snapshot; nothing to re-tag")
+        return
+    results = []
+    for path in paths:
+        stats = retag_account(path, rules, phrases, all_rows, tag_mode)
+        results.append(stats)
+        print(f"[OK] {stats['account_id']}: {stats['retagged']:,} of {stats['rows']:,} rows re-tagged, "
+              f"{stats['changed']:,} changed")
+
+    if any(r["changed"] for r in results):
+        from .suggestion_miner import SUGGESTIONS_FILENAME, untagged_text, mine_suggestions
+        try:
+            texts = pd.concat([untagged_text(_typed(_read_output(p)), p.name[:-len(DETAILED_SUFFIX)]) for p in paths],
+                              ignore_index=True)
+            mine_suggestions(texts, rules).to_csv(args.output / SUGGESTIONS_FILENAME, index=False,
+                                                  encoding=DEFAULT_OUTPUT_ENCODING)
+        except ImportError as e:
+            print(f"[WARN] {e}; {SUGGESTIONS_FILENAME} not updated")
+    write_rules_snapshot(rules, args.output, tag_mode)
+    total = sum(r["rows"] for r in results)
+    retagged = sum(r["retagged"] for r in results)
+    print(f"[OK] {len(paths)} accounts: {retagged:,} of {total:,} rows re-tagged, "
+          f"{sum(r['changed'] for r in results):,} changed; snapshot updated")
+
+if __name__ == "__main__":
+    main()
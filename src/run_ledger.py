@@ -0,0 +1,281 @@
+# /src/run_ledger.py
+import argparse
+import json
+import socket
+import sqlite3
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+
+from .config import LEDGER_PATH, DEFAULT_OUTPUT_ENCODING
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id        TEXT PRIMARY KEY,
+    entry_point   TEXT NOT NULL,
+    started_at    TEXT NOT NULL,
+    finished_at   TEXT,
+    status        TEXT NOT NULL DEFAULT 'running',
+    host          TEXT,
+    args          TEXT
+);
+CREATE TABLE IF NOT EXISTS accounts (
+    run_id                  TEXT NOT NULL REFERENCES runs(run_id),
+    account_id              TEXT NOT NULL,
+    fund_short_name         TEXT,
+    recorded_at             TEXT NOT NULL,
+    status                  TEXT NOT NULL,
+    bank_lines              INTEGER,
+    cash_lines              INTEGER,
+    matched_bank_lines      INTEGER,
+    matched_cash_lines      INTEGER,
+    unreconciled_bank_lines INTEGER,
+    unreconciled_cash_lines INTEGER,
+    matched_bank_amount     REAL,
+    missing_bank_months     INTEGER,
+    missing_cash_months     INTEGER,
+    missing_bank_list       TEXT,
+    missing_cash_list       TEXT,
+    wall_s                  REAL,
+    peak_mem_mb             REAL,
+    py_peak_mb              REAL,
+    load_mode               TEXT,
+    error                   TEXT,
+    PRIMARY KEY (run_id, account_id)
+);
+CREATE TABLE IF NOT EXISTS stages (
+    run_id         TEXT NOT NULL REFERENCES runs(run_id),
+    account_id     TEXT NOT NULL,
+    seq            INTEGER NOT NULL,
+    stage          TEXT NOT NULL,
+    rows_in        INTEGER,
+    matched_bank   INTEGER,
+    matched_cash   INTEGER,
+    wall_s         REAL,
+    peak_growth_mb REAL,
+    py_peak_mb     REAL,
+    PRIMARY KEY (run_id, account_id, seq)
+);
+CREATE INDEX IF NOT EXISTS ix_accounts_account ON accounts(account_id);
+CREATE INDEX IF NOT EXISTS ix_stages_stage ON stages(stage);
+"""
+
+ACCOUNT_FIELDS = [
+    "fund_short_name", "status", "bank_lines", "cash_lines", "matched_bank_lines", "matched_cash_lines",
+    "unreconciled_bank_lines", "unreconciled_cash_lines", "matched_bank_amount",
+    "missing_bank_months", "missing_cash_months", "missing_bank_list", "missing_cash_list",
+    "wall_s", "peak_mem_mb", "py_peak_mb", "load_mode", "error",
+]
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+class RunLedger:
+    """
+    Embedded SQLite ledger of batch runs: one row per run, per (run, account) and per
+    (run, account, stage). Every write is its own short transaction and the database runs
+    in WAL mode, so several batch processes can write to the same file at once.
+    """
+
+    def __init__(self, db_path: Path = LEDGER_PATH):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _write(self, sql: str, params) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                if isinstance(params, list):
+                    conn.executemany(sql, params)
+                else:
+                    conn.execute(sql, params)
+        finally:
+            conn.close()
+
+    def start_run(self, entry_point: str, args: Optional[Dict] = None) -> str:
+        run_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        self._write(
+            "INSERT INTO runs (run_id, entry_point, started_at, host, args) VALUES (?, ?, ?, ?, ?)",
+            (run_id, entry_point, _now(), socket.gethostname(), json.dumps(args or {}, default=str)),
+        )
+        return run_id
+
+    def finish_run(self, run_id: str, status: str = "ok") -> None:
+        self._write("UPDATE runs SET finished_at = ?, status = ? WHERE run_id = ?", (_now(), status, run_id))
+
+    def record_account(self, run_id: str, account_id, **fields) -> None:
+        unknown = set(fields) - set(ACCOUNT_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown account ledger fields: {sorted(unknown)}")
+        values = [fields.get(f) for f in ACCOUNT_FIELDS]
+        if values[ACCOUNT_FIELDS.index("status")] is None:
+            values[ACCOUNT_FIELDS.index("status")] = "error" if fields.get("error") else "ok"
+        self._write(
+            f"INSERT OR REPLACE INTO accounts (run_id, account_id, recorded_at, {', '.join(ACCOUNT_FIELDS)}) "
+            f"VALUES (?, ?, ?, {', '.join('?' for _ in ACCOUNT_FIELDS)})",
+            (run_id, str(account_id), _now(), *values),
+        )
+
+    def record_stages(self, run_id: str, account_id, stage_records: Iterable[Dict]) -> None:
+        rows = [
+            (run_id, str(account_id), r["seq"], r["stage"], r.get("rows_in"), r.get("matched_bank"),
+             r.get("matched_cash"), r.get("wall_s"), r.get("peak_growth_mb"), r.get("py_peak_mb"))
+            for r in stage_records
+        ]
+        if rows:
+            self._write(
+                "INSERT OR REPLACE INTO stages (run_id, account_id, seq, stage, rows_in, matched_bank, "
+                "matched_cash, wall_s, peak_growth_mb, py_peak_mb) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def query(self, sql: str, params=()) -> pd.DataFrame:
+        conn = self._connect()
+        try:
+            return pd.read_sql_query(sql, conn, params=params)
+        finally:
+            conn.close()
+
+    def latest_run_id(self) -> Optional[str]:
+        df = self.query("SELECT run_id FROM runs ORDER BY started_at DESC, run_id DESC LIMIT 1")
+        return None if df.empty else df["run_id"].iloc[0]
+
+# --- Query command ---
+
+def runs_report(ledger: RunLedger, limit: int) -> pd.DataFrame:
+    return ledger.query(
+        """
+        SELECT r.run_id, r.entry_point, r.started_at, r.finished_at, r.status,
+               COUNT(a.account_id)                                   AS accounts,
+               SUM(a.status = 'error')                               AS failed,
+               SUM(a.unreconciled_bank_lines)                        AS unreconciled_bank,
+               SUM(a.unreconciled_cash_lines)                        AS unreconciled_cash,
+               ROUND(SUM(a.wall_s), 1)                               AS wall_s,
+               ROUND(MAX(a.peak_mem_mb), 1)                          AS peak_mem_mb
+        FROM runs r LEFT JOIN accounts a ON a.run_id = r.run_id
+        GROUP BY r.run_id
+        ORDER BY r.started_at DESC
+        LIMIT ?
+        """,
+        (limit,),
+    )
+
+def unreconciled_trend(ledger: RunLedger, account_id: Optional[str], limit: int) -> pd.DataFrame:
+    """Unreconciled bank + cash lines per account (rows) for the last `limit` runs (columns)."""
+    where, params = "", [limit]
+    if account_id:
+        where, params = "WHERE a.account_id = ?", [limit, account_id]
+    df = ledger.query(
+        f"""
+        SELECT a.account_id, r.run_id,
+               a.unreconciled_bank_lines + a.unreconciled_cash_lines AS unreconciled
+        FROM accounts a
+        JOIN (SELECT run_id, started_at FROM runs ORDER BY started_at DESC LIMIT ?) r ON r.run_id = a.run_id
+        {where}
+        """,
+        params,
+    )
+    if df.empty:
+        return df
+    return df.pivot(index="account_id", columns="run_id", values="unreconciled").sort_index(axis=1)
+
+def slowest_stages(ledger: RunLedger, run_id: Optional[str], limit: int) -> pd.DataFrame:
+    where, params = "", [limit]
+    if run_id:
+        where, params = "WHERE run_id = ?", [run_id, limit]
+    return ledger.query(
+        f"""
+        SELECT stage,
+               COUNT(*)                  AS calls,
+               ROUND(SUM(wall_s), 3)     AS total_s,
+               ROUND(AVG(wall_s), 3)     AS mean_s,
+               ROUND(MAX(wall_s), 3)     AS max_s,
+               (SELECT s2.account_id FROM stages s2
+                 WHERE s2.stage = s.stage {'AND s2.run_id = s.run_id' if run_id else ''}
+                 ORDER BY s2.wall_s DESC LIMIT 1) AS slowest_account,
+               SUM(matched_bank)         AS matched_bank,
+               ROUND(MAX(peak_growth_mb), 1) AS max_peak_growth_mb,
+               ROUND(MAX(py_peak_mb), 1) AS max_py_peak_mb
+        FROM stages s
+        {where}
+        GROUP BY stage
+        ORDER BY total_s DESC
+        LIMIT ?
+        """,
+        params,
+    )
+
+def audit_export(ledger: RunLedger, run_id: str) -> pd.DataFrame:
+    """The per-account summary in the column layout of the old audit_log.csv."""
+    return ledger.query(
+        """
+        SELECT account_id              AS "Account Number",
+               fund_short_name         AS "Fund Short Name",
+               unreconciled_cash_lines AS "Unreconciled Cash Lines",
+               unreconciled_bank_lines AS "Unreconciled Bank Lines",
+               missing_bank_months     AS "Number of Missing Bank Statements",
+               missing_cash_months     AS "Number of Missing Cash Rec Months",
+               missing_bank_list       AS "List of Missing Bank Statements",
+               missing_cash_list       AS "List of Missing Cash Rec Months"
+        FROM accounts WHERE run_id = ? AND status = 'ok'
+        ORDER BY recorded_at
+        """,
+        (run_id,),
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the cash rec run ledger")
+    parser.add_argument("--db", type=Path, default=LEDGER_PATH, help="Path to the run ledger SQLite file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_runs = sub.add_parser("runs", help="Recent runs with totals")
+    p_runs.add_argument("--limit", type=int, default=20)
+
+    p_unrec = sub.add_parser("unreconciled", help="Unreconciled lines per account across runs")
+    p_unrec.add_argument("--account", help="Only this account")
+    p_unrec.add_argument("--limit", type=int, default=8, help="Number of most recent runs")
+
+    p_slow = sub.add_parser("slowest-stages", help="Stages ranked by total wall time")
+    p_slow.add_argument("--run", help="Run ID (default: all runs)")
+    p_slow.add_argument("--limit", type=int, default=20)
+
+    p_audit = sub.add_parser("audit", help="Export one run in the old audit_log.csv layout")
+    p_audit.add_argument("--run", help="Run ID (default: latest run)")
+    p_audit.add_argument("--out", type=Path, help="Write CSV here instead of printing")
+
+    args = parser.parse_args()
+    ledger = RunLedger(args.db)
+
+    if args.command == "runs":
+        df = runs_report(ledger, args.limit)
+    elif args.command == "unreconciled":
+        df = unreconciled_trend(ledger, args.account, args.limit)
+    elif args.command == "slowest-stages":
+        df = slowest_stages(ledger, args.run, args.limit)
+    else:
+        run_id = args.run or ledger.latest_run_id()
+        if run_id is None:
+            print("[WARN] Ledger is empty")
+            return
+        df = audit_export(ledger, run_id)
+        if args.out:
+            df.to_csv(args.out, index=False, encoding=DEFAULT_OUTPUT_ENCODING)
+            print(f"[OK] Wrote {len(df)} rows for run {run_id} to {args.out}")
+            return
+
+    if df.empty:
+        print("[INFO] No rows")
+    else:
+        print(df.to_string())
+
+if __name__ == "__main__":
+    main()
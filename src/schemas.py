@@ -0,0 +1,120 @@
+# /src/schemas.py
+import re
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# Column kinds
+TEXT = "text"          # free text: Arrow-backed strings when pyarrow is installed, else object
+CATEGORY = "category"  # low-cardinality labels (fund, type, currency, company)
+MONEY = "money"        # currency text -> float64 rounded to the penny (+ optional int64 cents)
+DATE = "date"          # datetime64[ns], unparseable -> NaT
+INT = "int"            # nullable Int64
+
+# Known file types: column -> kind. Only these columns are read; any that are missing
+# from a file are added as empty so callers can rely on them being present.
+SCHEMAS: Dict[str, Dict[str, str]] = {
+    # bankstmt_flows_{account}.csv. The date columns stay text: cash_rec parses them
+    # with its own ISO / day-first fallback (force_dates, use_bankref_dates).
+    "bankstmt_flows": {
+        "Acct_From_Filename": INT,
+        "Company_Name": CATEGORY,
+        "CCY_Type": CATEGORY,
+        "Calculated_Date": TEXT,
+        "Date from BankRef": TEXT,
+        "Description1A": TEXT,
+        "Description1B": TEXT,
+        "Description2": TEXT,
+        "Debit": MONEY,
+        "Credit": MONEY,
+    },
+    # FullCashFlows_*.csv (all funds). Date stays text: cash_rec parses it after the
+    # fund filter, so the inferred format comes from that fund's own rows.
+    "FullCashFlows": {
+        "FundShortName": CATEGORY,
+        "Type": CATEGORY,
+        "Date": TEXT,
+        "Detail": TEXT,
+        "Amount": MONEY,
+    },
+    # cashrec_report_{account}.csv as read by src.cli. Everything stays text:
+    # reconcile_account does its own date/number coercion and groups on Type.
+    "cashrec_report": {
+        col: TEXT for col in [
+            "Calculated_Date", "Acct_From_Filename", "Company_Name", "CCY_Type",
+            "Description1A", "Description1B", "Description2", "Debit", "Credit", "Reconciled",
+            "FundShortName", "Type", "Cash_Date", "Detail", "Amount",
+        ]
+    },
+}
+
+_MONEY_RX = re.compile(r"[^\d.-]")
+
+def text_dtype():
+    """Arrow-backed string dtype with NaN as the missing value (same semantics as object), if available."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return object
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)  # pandas >= 2.3
+    except TypeError:
+        return "string[pyarrow_numpy]"                     # pandas 2.1 / 2.2
+
+def parse_money(series: pd.Series) -> pd.Series:
+    """'1,234.56' / '$-12' / blanks -> float rounded to 2 dp (blanks and junk -> 0)."""
+    cleaned = series.astype(str).str.replace(_MONEY_RX, "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce").fillna(0).round(2)
+
+def to_cents(series: pd.Series) -> pd.Series:
+    """Penny amounts as exact int64 cents (for equality joins without float noise)."""
+    return (series.astype(float) * 100).round().astype("int64")
+
+def read_kwargs(kind: str) -> Dict:
+    """pd.read_csv arguments for a schema: only its columns, with parse-time dtypes."""
+    schema = SCHEMAS[kind]
+    dtypes = {}
+    for col, col_kind in schema.items():
+        if col_kind == CATEGORY:
+            dtypes[col] = "category"
+        elif col_kind == TEXT:
+            dtypes[col] = text_dtype()
+        elif col_kind in (MONEY, DATE):
+            dtypes[col] = object  # parsed after the read
+    return {"usecols": lambda c: c in schema, "dtype": dtypes}
+
+def apply_schema(df: pd.DataFrame, kind: str, cents: bool = False) -> pd.DataFrame:
+    """
+    Casts an already-read frame to its schema (also used after chunked reads, where
+    concatenating chunks turns categoricals with different categories back into object).
+    With `cents=True` every money column also gets an int64 `<col>_Cents` twin.
+    """
+    schema = SCHEMAS[kind]
+    for col, col_kind in schema.items():
+        if col not in df.columns:
+            df[col] = None
+        if col_kind == CATEGORY:
+            df[col] = df[col].astype("category")
+        elif col_kind == TEXT:
+            df[col] = df[col].astype(text_dtype())
+        elif col_kind == MONEY:
+            df[col] = parse_money(df[col])
+            if cents:
+                df[f"{col}_Cents"] = to_cents(df[col])
+        elif col_kind == DATE:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+        elif col_kind == INT:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
+    return df
+
+def load_frame(kind: str, path: Path, cents: bool = False, **read_options) -> pd.DataFrame:
+    """Reads a known file type with its schema (extra pd.read_csv options pass through)."""
+    return apply_schema(pd.read_csv(path, **read_kwargs(kind), **read_options), kind, cents=cents)
+
+def frame_memory_mb(df: Optional[pd.DataFrame]) -> float:
+    """Deep memory use of a frame in MB (object strings included)."""
+    if df is None:
+        return 0.0
+    return float(df.memory_usage(deep=True).sum()) / (1024 * 1024)
@@ -0,0 +1,215 @@
+# /src/sql_backend.py
+import sqlite3
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+NS_PER_DAY = 86_400 * 10**9
+
+# Stage -> (candidate pairs SQL, passes in run order, label). Each candidate query joins the
+# open bank rows (bank_row, d, y, m, dd, net) to the free cash rows and returns
+# (bank_row, cash_row, k) where k is the pass the pair belongs to (offset in days/years/...).
+# d is days since 1970-01-01; y/m/dd are the calendar parts.
+STAGE_SQL: Dict[str, Tuple[str, List[int], Callable]] = {
+    "exact": (
+        """
+        SELECT bk.bank_row, ca.cash_row, 0 AS k
+        FROM bank bk JOIN cash ca ON ca.d = bk.d AND ca.net = bk.net
+        """,
+        [0],
+        lambda k, match_id, diff: f"EXACT MATCH - {match_id}",
+    ),
+    "year_offset": (
+        """
+        SELECT bk.bank_row, ca.cash_row, ABS(bk.y - ca.y) AS k
+        FROM bank bk JOIN cash ca
+          ON ca.m = bk.m AND ca.dd = bk.dd AND ca.net = bk.net AND ABS(bk.y - ca.y) IN (1, 2, 10)
+        """,
+        [1, 2, 10],
+        lambda k, match_id, diff: f"BAD DATE, CORRECT AMOUNT - Date off {k} years - {match_id}",
+    ),
+    "day_offset": (
+        """
+        SELECT bk.bank_row, ca.cash_row, ABS(ca.d - bk.d) AS k
+        FROM bank bk JOIN cash ca ON ca.net = bk.net AND ABS(ca.d - bk.d) BETWEEN 1 AND 27
+        """,
+        list(range(1, 28)),
+        lambda k, match_id, diff: f"MINOR BAD DATE, CORRECT AMOUNT - Date off {k} days - {match_id}",
+    ),
+    # The pass (difference in pennies) is assigned in Python with the same float rounding
+    # the pandas stage uses; SQL only narrows the pairs down to same-day, under-a-unit gaps.
+    "penny_diff": (
+        """
+        SELECT bk.bank_row, ca.cash_row, bk.net AS bank_net, ca.net AS cash_net
+        FROM bank bk JOIN cash ca ON ca.d = bk.d AND ABS(ca.net - bk.net) < 1.0
+        """,
+        list(range(1, 100)),
+        lambda k, match_id, diff: f"MINOR AMOUNT DIFF - {diff} difference - {match_id}",
+    ),
+    "month_offset": (
+        """
+        SELECT bk.bank_row, ca.cash_row, ABS(ca.m - bk.m) AS k
+        FROM bank bk JOIN cash ca
+          ON ca.y = bk.y AND ca.dd = bk.dd AND ca.net = bk.net AND ABS(ca.m - bk.m) BETWEEN 1 AND 3
+        """,
+        [1, 2, 3],
+        lambda k, match_id, diff: f"MONTH ERROR, CORRECT AMOUNT - Off by {k} months - {match_id}",
+    ),
+}
+
+# One round of "first free row wins": a bank row takes its lowest free candidate, but only once
+# no lower bank row still has that cash row as a candidate. Repeated until no pairs are left,
+# this gives exactly the pairs the row-by-row loop produces.
+ROUND_SQL = """
+CREATE TEMP TABLE accepted AS
+SELECT bank_row, cash_row FROM (
+    SELECT bank_row, cash_row,
+           ROW_NUMBER() OVER (PARTITION BY bank_row ORDER BY cash_row) AS cash_rank,
+           MIN(bank_row) OVER (PARTITION BY cash_row)                  AS first_bank
+    FROM pass_pairs
+) ranked
+WHERE cash_rank = 1 AND bank_row = first_bank
+"""
+
+class _SqliteEngine:
+    """In-memory SQLite (stdlib)."""
+
+    def __init__(self, **_):
+        self.conn = sqlite3.connect(":memory:")
+
+    def load(self, name: str, df: pd.DataFrame) -> None:
+        df.to_sql(name, self.conn, index=False, if_exists="replace")
+
+    def execute(self, sql: str, params=()) -> None:
+        self.conn.execute(sql, params)
+
+    def fetch(self, sql: str, params=()) -> pd.DataFrame:
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+class _DuckDbEngine:
+    """In-process DuckDB: multi-threaded, spills to `temp_dir` past `memory_limit` (bytes)."""
+
+    def __init__(self, memory_limit: Optional[int] = None, temp_dir: Optional[str] = None):
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("The duckdb backend needs the duckdb package (pip install duckdb)") from e
+        self.conn = duckdb.connect(":memory:")
+        if memory_limit:
+            # Explicit binary units: DuckDB reads "GB" as 1000**3, memory.parse_size as 1024**3
+            self.conn.execute(f"SET memory_limit = '{max(1, int(memory_limit) // 1024)}KiB'")
+        if temp_dir:
+            self.conn.execute(f"SET temp_directory = '{temp_dir}'")
+
+    def load(self, name: str, df: pd.DataFrame) -> None:
+        self.conn.register("_frame", df)
+        self.conn.execute(f"CREATE OR REPLACE TEMP TABLE {name} AS SELECT * FROM _frame")
+        self.conn.unregister("_frame")
+
+    def execute(self, sql: str, params=()) -> None:
+        self.conn.execute(sql, params)
+
+    def fetch(self, sql: str, params=()) -> pd.DataFrame:
+        return self.conn.execute(sql, params).df()
+
+def _open_rows(dates: pd.Series, net: pd.Series, reconciled: pd.Series, row_col: str) -> pd.DataFrame:
+    """Open (unlabelled, dated) rows in the shape the stage SQL expects."""
+    keep = reconciled.isna() & dates.notna()
+    d = dates[keep]
+    return pd.DataFrame({
+        row_col: d.index.astype("int64"),
+        "d": d.to_numpy(dtype="datetime64[ns]").astype("int64") // NS_PER_DAY,
+        "y": d.dt.year.astype("int64"),
+        "m": d.dt.month.astype("int64"),
+        "dd": d.dt.day.astype("int64"),
+        "net": net[keep].astype(float),
+    })
+
+class SqlMatcher:
+    """
+    Runs the equality/offset matching stages of cash_rec as set-based SQL on an embedded
+    engine (SQLite in memory, or DuckDB) and writes the same Reconciled labels back.
+    """
+
+    def __init__(self, backend: str = "sqlite", memory_limit: Optional[int] = None, temp_dir: Optional[str] = None):
+        if backend not in ("sqlite", "duckdb"):
+            raise ValueError(f"Unknown SQL backend {backend!r} (expected sqlite or duckdb)")
+        self.backend = backend
+        engine_cls = _DuckDbEngine if backend == "duckdb" else _SqliteEngine
+        self.engine = engine_cls(memory_limit=memory_limit, temp_dir=temp_dir)
+
+    @staticmethod
+    def handles(stage_name: str) -> bool:
+        return stage_name in STAGE_SQL
+
+    @staticmethod
+    def _whole_days(dates: pd.Series) -> bool:
+        d = dates.dropna()
+        return bool((d == d.dt.normalize()).all())
+
+    def run(self, stage_name: str, df_bank: pd.DataFrame, df_cash: pd.DataFrame, match_id: int,
+            fallback: Optional[Callable] = None) -> int:
+        # Offsets are whole days in SQL; dates with a time of day go through the pandas stage
+        if not (self._whole_days(df_bank['Calculated_Date']) and self._whole_days(df_cash['Date'])):
+            if fallback is None:
+                raise ValueError(f"{stage_name}: dates with a time component need the pandas stage")
+            return fallback(df_bank, df_cash, match_id)
+
+        candidate_sql, passes, label = STAGE_SQL[stage_name]
+        eng = self.engine
+        eng.load("bank", _open_rows(df_bank['Calculated_Date'], df_bank['Net'], df_bank['Reconciled'], "bank_row"))
+        eng.load("cash", _open_rows(df_cash['Date'], df_cash['Net'], df_cash['Reconciled'], "cash_row"))
+
+        if stage_name == "penny_diff":
+            pairs = eng.fetch(candidate_sql)
+            gap = np.round(np.abs(pairs["cash_net"].to_numpy() - pairs["bank_net"].to_numpy()), 2)
+            k = np.rint(gap * 100).astype("int64")
+            pairs = pairs.assign(k=k)[(gap == k / 100) & (k >= 1)][["bank_row", "cash_row", "k"]]
+            eng.load("cand", pairs)
+        else:
+            eng.execute("DROP TABLE IF EXISTS cand")
+            eng.execute(f"CREATE TEMP TABLE cand AS {candidate_sql}")
+
+        for k in passes:
+            matched = self._resolve_pass(k)
+            if matched.empty:
+                continue
+            bank_rows = matched["bank_row"].to_numpy()
+            cash_rows = matched["cash_row"].to_numpy()
+            ids = range(match_id, match_id + len(matched))
+            if stage_name == "penny_diff":
+                diffs = (df_bank.loc[bank_rows, 'Net'].to_numpy(dtype=float)
+                         - df_cash.loc[cash_rows, 'Net'].to_numpy(dtype=float)).round(2)
+            else:
+                diffs = [None] * len(matched)
+            labels = [label(k, i, diff) for i, diff in zip(ids, diffs)]
+            df_bank.loc[bank_rows, 'Reconciled'] = labels
+            df_cash.loc[cash_rows, 'Reconciled'] = labels
+            match_id += len(matched)
+
+        for table in ("cand", "bank", "cash"):
+            eng.execute(f"DROP TABLE IF EXISTS {table}")
+        return match_id
+
+    def _resolve_pass(self, k: int) -> pd.DataFrame:
+        """All (bank_row, cash_row) pairs pass k matches, in bank row order."""
+        eng = self.engine
+        for table in ("pass_pairs", "pass_matches", "accepted"):
+            eng.execute(f"DROP TABLE IF EXISTS {table}")
+        eng.execute("CREATE TEMP TABLE pass_pairs AS SELECT bank_row, cash_row FROM cand WHERE k = ?", (k,))
+        eng.execute("CREATE TEMP TABLE pass_matches AS SELECT bank_row, cash_row FROM pass_pairs WHERE 1 = 0")
+        while True:
+            eng.execute(ROUND_SQL)
+            if eng.fetch("SELECT COUNT(*) AS n FROM accepted")["n"].iloc[0] == 0:
+                break
+            eng.execute("INSERT INTO pass_matches SELECT bank_row, cash_row FROM accepted")
+            eng.execute("DELETE FROM pass_pairs WHERE bank_row IN (SELECT bank_row FROM accepted) "
+                        "OR cash_row IN (SELECT cash_row FROM accepted)")
+            eng.execute("DROP TABLE accepted")
+        eng.execute("DROP TABLE accepted")
+
+        # Rows matched in this pass are no longer open for the later passes
+        eng.execute("DELETE FROM cand WHERE bank_row IN (SELECT bank_row FROM pass_matches) "
+                    "OR cash_row IN (SELECT cash_row FROM pass_matches)")
+        return eng.fetch("SELECT bank_row, cash_row FROM pass_matches ORDER BY bank_row")
@@ -0,0 +1,88 @@
+# /src/stages.py
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB (None if the platform can't tell us)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS reports bytes
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil  # optional; gives the peak working set on Windows
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    except ImportError:
+        return None
+
+def _unreconciled(df) -> Optional[int]:
+    if df is None or "Reconciled" not in df.columns:
+        return None
+    return int(df["Reconciled"].isna().sum())
+
+class StageRecorder:
+    """
+    Times the named stages of one account's run.
+    Pass the bank/cash frames to `stage()` to also record how many bank rows
+    were open going in and how many the stage matched. `peak_growth_mb` is how far
+    the stage raised the process's peak RSS (0 when an earlier stage already went higher).
+    Hooks are objects with `stage_start(rec)` / `stage_end(rec)` (e.g. the event stream).
+    """
+
+    def __init__(self, account_id: Optional[str] = None, hooks: Optional[List] = None):
+        self.account_id = account_id
+        self.hooks = list(hooks or [])
+        self.records: List[Dict] = []
+
+    @contextmanager
+    def stage(self, name: str, df_bank=None, df_cash=None):
+        open_bank = _unreconciled(df_bank)
+        open_cash = _unreconciled(df_cash)
+        rec = {
+            "account_id": self.account_id,
+            "stage": name,
+            "seq": len(self.records),
+            "rows_in": open_bank,
+            "matched_bank": None,
+            "matched_cash": None,
+            "wall_s": None,
+            "peak_growth_mb": None,
+        }
+        for hook in self.hooks:
+            hook.stage_start(rec)
+        peak_before = peak_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield rec
+        finally:
+            rec["wall_s"] = time.perf_counter() - start
+            if open_bank is not None:
+                rec["matched_bank"] = open_bank - _unreconciled(df_bank)
+            if open_cash is not None:
+                rec["matched_cash"] = open_cash - _unreconciled(df_cash)
+            peak_after = peak_rss_mb()
+            if peak_before is not None and peak_after is not None:
+                rec["peak_growth_mb"] = max(peak_after - peak_before, 0.0)
+            self.records.append(rec)
+            for hook in reversed(self.hooks):
+                hook.stage_end(rec)
+
+    def total_wall_s(self) -> float:
+        return sum(r["wall_s"] or 0.0 for r in self.records)
+
+class StageLog:
+    """Hook that keeps a copy of every finished stage record (e.g. to compare two runs)."""
+
+    def __init__(self):
+        self.records: List[Dict] = []
+
+    def stage_start(self, rec: Dict) -> None:
+        pass
+
+    def stage_end(self, rec: Dict) -> None:
+        self.records.append(dict(rec))
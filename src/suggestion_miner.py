@@ -0,0 +1,144 @@
+# /src/suggestion_miner.py
+import argparse
+import glob
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .config import OUTPUT_DIR, RULES_DIR, DEFAULT_OUTPUT_ENCODING
+from .reconcile import untagged_rows
+from .text_utils import normalize_text, normalize_series, combined_text, TEXT_SOURCE_COLS
+
+SUGGESTIONS_FILENAME = "tag_suggestions_portfolio.csv"
+MIN_TOKEN_LEN = 3
+MAX_NGRAM = 3
+DEFAULT_TOP = 500
+EXAMPLE_ACCOUNTS = 5
+
+def _count_vectorizer():
+    try:
+        from sklearn.feature_extraction.text import CountVectorizer
+    except ImportError as e:
+        raise ImportError("Portfolio tag suggestions need scikit-learn (pip install scikit-learn)") from e
+    return CountVectorizer
+
+def suggestion_tokens(text_norm: str) -> List[str]:
+    """Tokens the suggestions count: 3+ characters and not pure digits (as in reconcile_account)."""
+    return [tok for tok in text_norm.split() if len(tok) >= MIN_TOKEN_LEN and not tok.isdigit()]
+
+def untagged_text(detailed_df: pd.DataFrame, account_id: str) -> pd.DataFrame:
+    """One row per untagged line: account_id and its normalized description text."""
+    rows = detailed_df[untagged_rows(detailed_df)]
+    # Not the frame's Text_Norm: that keeps tag_row's "NAN" for missing descriptions, noise here
+    sources = [c for c in TEXT_SOURCE_COLS if c in rows.columns]
+    text = normalize_series(combined_text(rows[sources].fillna(""), sources))
+    return pd.DataFrame({"account_id": str(account_id), "text": text.to_numpy()})
+
+def rule_phrases(rules: Dict) -> Iterable[str]:
+    """Every tag name, synonym and priority phrase of a rules dict (src.rules_csv layout)."""
+    yield from rules.get("priority_phrases", [])
+    investment = rules.get("investment", {})
+    yield from investment.get("spv_priority", [])
+    for org, org_def in investment.get("originators", {}).items():
+        yield org
+        yield from org_def.get("synonyms", [])
+        for spv, spv_def in (org_def.get("spvs") or {}).items():
+            yield spv
+            yield from spv_def.get("synonyms", [])
+    items = list(rules.get("investor", {}).get("tags", []))
+    for type_items in rules.get("expenses", {}).get("by_type", {}).values():
+        items.extend(type_items)
+    for item in items:
+        yield item.get("tag", "")
+        yield from item.get("synonyms", [])
+
+def _covered_keys(rules: Optional[Dict]) -> Set[Tuple[str, ...]]:
+    keys = set()
+    for phrase in rule_phrases(rules or {}):
+        tokens = tuple(suggestion_tokens(normalize_text(phrase)))
+        if tokens:
+            keys.add(tokens)
+    return keys
+
+def _is_covered(ngram: str, keys: Set[Tuple[str, ...]]) -> bool:
+    """True when the n-gram contains (or is) a rule phrase, i.e. lines with it are already tagged."""
+    tokens = ngram.split()
+    return any(tuple(tokens[i:j]) in keys for i in range(len(tokens)) for j in range(i + 1, len(tokens) + 1))
+
+def mine_suggestions(texts: pd.DataFrame, rules: Optional[Dict] = None, top: int = DEFAULT_TOP) -> pd.DataFrame:
+    """
+    Ranks the 1-3-grams of all untagged text in the portfolio (`texts`: account_id, normalized text)
+    by total frequency and by the number of accounts they appear in, dropping n-grams
+    that already contain one of the rules' synonyms / tag names / priority phrases.
+    """
+    columns = ["ngram", "n", "count", "accounts", "account_share", "rank_by_accounts", "rank_by_count",
+               "example_accounts"]
+    texts = texts[texts["text"].str.strip().ne("")]
+    if texts.empty:
+        return pd.DataFrame(columns=columns)
+
+    vectorizer = _count_vectorizer()(preprocessor=str, tokenizer=suggestion_tokens, lowercase=False,
+                                     token_pattern=None, ngram_range=(1, MAX_NGRAM), dtype=np.int64)
+    counts = vectorizer.fit_transform(texts["text"])          # lines x n-grams (sparse)
+    vocab = vectorizer.get_feature_names_out()
+
+    # Account x n-gram presence via a sparse account-indicator product
+    from scipy.sparse import csr_matrix   # installed with scikit-learn
+    account_codes, accounts = pd.factorize(texts["account_id"])
+    indicator = csr_matrix((np.ones(len(account_codes)), (account_codes, np.arange(len(account_codes)))),
+                           shape=(len(accounts), len(account_codes)))
+    per_account = (indicator @ counts).tocsc()
+    per_account.data[:] = 1
+
+    keys = _covered_keys(rules)
+    out = pd.DataFrame({
+        "ngram": vocab,
+        "n": [g.count(" ") + 1 for g in vocab],
+        "count": np.asarray(counts.sum(axis=0)).ravel(),
+        "accounts": np.asarray(per_account.sum(axis=0)).ravel().astype(np.int64),
+    })
+    keep = ~out["ngram"].map(lambda g: _is_covered(g, keys)).to_numpy() if keys else np.ones(len(out), bool)
+    out = out[keep]
+    out["account_share"] = (out["accounts"] / len(accounts)).round(4)
+    # accounts first, total count as the tie-break
+    by_accounts = out["accounts"] * (int(out["count"].max()) + 1) + out["count"]
+    out["rank_by_accounts"] = by_accounts.rank(method="min", ascending=False).astype(int)
+    out["rank_by_count"] = out["count"].rank(method="min", ascending=False).astype(int)
+    out = out.sort_values(["accounts", "count", "ngram"], ascending=[False, False, True], kind="stable").head(top)
+
+    # A few accounts per kept n-gram, in portfolio order
+    examples = []
+    for j in out.index:
+        rows = per_account[:, j].nonzero()[0][:EXAMPLE_ACCOUNTS]
+        examples.append(", ".join(str(accounts[r]) for r in rows))
+    out["example_accounts"] = examples
+    return out[columns].reset_index(drop=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Portfolio-wide tag suggestions from the untagged lines of all accounts")
+    parser.add_argument("--input", type=Path, default=OUTPUT_DIR,
+                        help="Directory with {account}_reconciliation_detailed.csv (src.cli output)")
+    parser.add_argument("--rules-dir", type=Path, default=RULES_DIR, help="Rules whose synonyms are left out")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP)
+    parser.add_argument("--out", type=Path, help=f"Output CSV (default: <input>/{SUGGESTIONS_FILENAME})")
+    args = parser.parse_args()
+
+    from .rules_csv import load_rules_from_csv
+    frames = []
+    for path in sorted(glob.glob(str(args.input / "*_reconciliation_detailed.csv"))):
+        account_id = Path(path).name.replace("_reconciliation_detailed.csv", "")
+        df = pd.read_csv(path, dtype=str, usecols=TEXT_SOURCE_COLS + ["Tag", "Type_Group", "Originator", "SPV"])
+        frames.append(untagged_text(df, account_id))
+    if not frames:
+        print(f"[INFO] No *_reconciliation_detailed.csv files in {args.input}")
+        return
+    suggestions = mine_suggestions(pd.concat(frames, ignore_index=True), load_rules_from_csv(args.rules_dir), args.top)
+    out = args.out or args.input / SUGGESTIONS_FILENAME
+    suggestions.to_csv(out, index=False, encoding=DEFAULT_OUTPUT_ENCODING)
+    print(suggestions.head(20).to_string(index=False))
+    print(f"[OK] {len(suggestions)} suggestions from {len(frames)} accounts written to {out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+# /src/synthetic.py
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .schemas import SCHEMAS
+
+# Column layouts of the real input files
+BANK_COLUMNS = list(SCHEMAS["bankstmt_flows"])
+CASH_COLUMNS = list(SCHEMAS["FullCashFlows"])
+
+CASH_FILENAME = "FullCashFlows_synthetic.csv"
+ACCOUNTS_FILENAME = "USDFund_Accountlist.csv"
+
+# Share of generated transactions per kind (normalised, so they need not sum to 1).
+# Every kind except cash_only gives one bank line; splits give two cash lines.
+DEFAULT_MIX: Dict[str, float] = {
+    "exact": 0.55,            # same date, same amount
+    "dupe": 0.05,             # exact copy of another transaction's date + amount (tie-breaking)
+    "split_same_day": 0.04,   # bank = two cash lines on the bank date
+    "split_near_date": 0.03,  # one of the two cash lines 1-7 days off
+    "penny_drift": 0.04,      # bank amount off by 1-99 cents
+    "day_error": 0.08,        # bank date off by 1-27 days
+    "month_error": 0.03,      # bank date off by 1-3 months
+    "year_error": 0.02,       # bank date off by 1, 2 or 10 years
+    "bank_only": 0.08,
+    "cash_only": 0.08,
+}
+TYPES = ["Rent", "Investment", "Mgmt Fees", "Distribution", "Subscription", "Expenses"]
+# Tagging benchmark: share of report lines per tag family and the Types of each family
+TYPE_FAMILIES = {"investment": 0.4, "investor": 0.25, "expense": 0.2, "other": 0.15}
+EXPENSE_TYPES = ["Mgmt Fees", "Fees and Expenses"]
+FAMILY_TYPES = {
+    "investment": ["Investment", "Rent", "Prepayment"],
+    "investor": ["Subscription", "Distribution", "Capital Paydown"],
+    "expense": EXPENSE_TYPES,
+    "other": ["Murabaha", "Transfer"],
+}
+BALANCE_LINES = ["OPENING BALANCE", "CLOSING BALANCE", "BALANCE CARRIED FORWARD", "BALANCE BROUGHT FORWARD"]
+
+def _money_text(amounts: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Cash amounts as the exports write them: mostly plain, some with thousands separators / $."""
+    plain = np.char.mod("%.2f", amounts)
+    fancy = np.array([f"{a:,.2f}" for a in amounts], dtype=object) if len(amounts) else plain
+    style = rng.random(len(amounts))
+    out = plain.astype(object)
+    out[style < 0.2] = fancy[style < 0.2]
+    dollar = style > 0.97
+    out[dollar] = np.char.add("$", plain[dollar].astype(str)).astype(object)
+    return out
+
+def _shift_months(dates: np.ndarray, months: np.ndarray) -> np.ndarray:
+    """datetime64[D] + whole months, keeping the day (days are drawn <= 28)."""
+    month_start = dates.astype("datetime64[M]")
+    day = (dates - month_start.astype("datetime64[D]")).astype("int64")
+    return (month_start + months.astype("int64")).astype("datetime64[D]") + day
+
+def generate_account(rows: int, seed: int = 0, fund: str = "SYNTH", account: int = 400310000001,
+                     start: str = "2021-01-01", months: int = 48, missing_months: int = 2,
+                     other_fund_rows: float = 0.1, mix: Optional[Dict[str, float]] = None
+                     ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    One account's (cash flows, bank statement) in the real file layouts, built from `rows`
+    transactions drawn from `mix` (see DEFAULT_MIX). `missing_months` calendar months lose
+    all their bank lines (half of them) or cash lines (the other half); `other_fund_rows`
+    adds cash lines of other funds relative to this fund's. Same arguments, same frames.
+    """
+    rng = np.random.default_rng(seed)
+    mix = {**DEFAULT_MIX, **(mix or {})}
+    kinds = np.array(list(mix))
+    p = np.array([mix[k] for k in kinds], dtype=float)
+    kind = kinds[rng.choice(len(kinds), size=rows, p=p / p.sum())]
+
+    first = np.datetime64(start, "M")
+    month = first + rng.integers(0, months, rows)
+    day = rng.integers(0, 28, rows)
+    date = month.astype("datetime64[D]") + day
+
+    round_amt = rng.choice([100, 250, 500, 1000, 2500, 10000], rows).astype(float)
+    odd_amt = rng.integers(1, 5_000_000, rows) / 100
+    amount = np.where(rng.random(rows) < 0.3, round_amt, odd_amt) * np.where(rng.random(rows) < 0.6, -1, 1)
+
+    # Duplicates copy an earlier transaction's date and amount
+    dupe = np.flatnonzero(kind == "dupe")
+    if len(dupe):
+        src = rng.integers(0, rows, len(dupe))
+        date[dupe], amount[dupe] = date[src], amount[src]
+
+    # Bank side
+    bank_date, bank_amount = date.copy(), amount.copy()
+    sel = kind == "day_error"
+    bank_date[sel] += (rng.integers(1, 28, sel.sum()) * rng.choice([-1, 1], sel.sum())).astype("timedelta64[D]")
+    sel = kind == "month_error"
+    bank_date[sel] = _shift_months(date[sel], rng.integers(1, 4, sel.sum()) * rng.choice([-1, 1], sel.sum()))
+    sel = kind == "year_error"
+    bank_date[sel] = _shift_months(date[sel], 12 * rng.choice([1, 2, 10], sel.sum()) * rng.choice([-1, 1], sel.sum()))
+    sel = kind == "penny_drift"
+    bank_amount[sel] = np.round(amount[sel] + rng.integers(1, 100, sel.sum()) / 100 * rng.choice([-1, 1], sel.sum()), 2)
+
+    # Cash side: one line per transaction, two for splits
+    split = np.isin(kind, ["split_same_day", "split_near_date"])
+    part1 = np.round(amount * rng.uniform(0.2, 0.8, rows), 2)
+    part2 = np.round(amount - part1, 2)
+    date2 = date + np.where(kind == "split_near_date", rng.integers(1, 8, rows), 0).astype("timedelta64[D]")
+    has_cash = kind != "bank_only"
+    single = has_cash & ~split
+    txn = np.arange(rows)
+    cash = pd.DataFrame({
+        "txn": np.concatenate([txn[single], txn[split], txn[split]]),
+        "Date": np.concatenate([date[single], date[split], date2[split]]),
+        "Amount": np.concatenate([amount[single], part1[split], part2[split]]),
+    })
+    has_bank = kind != "cash_only"
+    bank = pd.DataFrame({"txn": txn[has_bank], "Date": bank_date[has_bank], "Amount": bank_amount[has_bank]})
+
+    # Missing statements: drop whole months from one side
+    all_months = first + np.arange(months)
+    gone = rng.choice(all_months, size=min(missing_months, months), replace=False)
+    bank = bank[~np.isin(bank["Date"].to_numpy().astype("datetime64[M]"), gone[::2])]
+    cash = cash[~np.isin(cash["Date"].to_numpy().astype("datetime64[M]"), gone[1::2])]
+
+    # Cash flows file rows (this fund + other funds' noise)
+    n_other = int(len(cash) * other_fund_rows)
+    cash_out = pd.DataFrame({
+        "FundShortName": np.concatenate([np.full(len(cash), fund, dtype=object),
+                                         rng.choice([f"OTHER{i}" for i in range(1, 6)], n_other).astype(object)]),
+        "Type": rng.choice(TYPES, len(cash) + n_other),
+        "Date": np.concatenate([cash["Date"].to_numpy(), first.astype("datetime64[D]") + rng.integers(0, months * 30, n_other)]),
+        "Detail": np.concatenate([np.char.add("Payment ", cash["txn"].to_numpy().astype(str)).astype(object),
+                                  np.full(n_other, "Other fund", dtype=object)]),
+        "Amount": np.concatenate([cash["Amount"].to_numpy(), rng.integers(-1_000_000, 1_000_000, n_other) / 100]),
+    })
+    cash_out["Date"] = pd.to_datetime(cash_out["Date"]).dt.strftime("%Y-%m-%d")
+    cash_out["Amount"] = _money_text(cash_out["Amount"].to_numpy(), rng)
+    cash_out = cash_out.iloc[rng.permutation(len(cash_out))].reset_index(drop=True)
+
+    # Bank statement rows: ISO dates, some day-first, a few blank (BankRef fallback) + balance lines
+    n_bal = max(2, len(bank) // 500)
+    b_dates = pd.to_datetime(np.concatenate([bank["Date"].to_numpy(),
+                                             first.astype("datetime64[D]") + rng.integers(0, months * 30, n_bal)]))
+    b_amount = np.concatenate([bank["Amount"].to_numpy(), rng.integers(0, 10_000_000, n_bal) / 100])
+    style = rng.random(len(b_dates))
+    calculated = np.where(style < 0.15, b_dates.strftime("%d/%m/%Y"), b_dates.strftime("%Y-%m-%d")).astype(object)
+    calculated[style > 0.98] = ""
+    desc1a = np.concatenate([np.full(len(bank), "TRANSFER", dtype=object), rng.choice(BALANCE_LINES, n_bal).astype(object)])
+    ref = np.concatenate([bank["txn"].to_numpy(), np.full(n_bal, -1)]).astype(str)
+    bank_out = pd.DataFrame({
+        "Acct_From_Filename": account,
+        "Company_Name": "SYNTHETIC CO",
+        "CCY_Type": "USD",
+        "Calculated_Date": calculated,
+        "Date from BankRef": b_dates.strftime("%Y-%m-%d"),
+        "Description1A": desc1a,
+        "Description1B": np.char.add("REF ", ref).astype(object),
+        "Description2": np.char.add("Payment ", ref).astype(object),
+        "Debit": np.where(b_amount < 0, -b_amount, np.nan),
+        "Credit": np.where(b_amount >= 0, b_amount, np.nan),
+    })
+    bank_out = bank_out.iloc[rng.permutation(len(bank_out))].reset_index(drop=True)
+    return cash_out[CASH_COLUMNS], bank_out[BANK_COLUMNS]
+
+def write_dataset(out_dir: Path, rows: int, accounts: int = 1, seed: int = 0, **options) -> Dict[str, object]:
+    """
+    Writes a synthetic portfolio: FullCashFlows_synthetic.csv (all funds), one
+    bankstmt_flows_{account}.csv per account and USDFund_Accountlist.csv. Returns the
+    file names and fund/account pairs.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    cash_frames, funds = [], []
+    for i in range(accounts):
+        fund, account = f"SYNTH{i + 1:03d}", 400310000001 + i
+        df_cash, df_bank = generate_account(rows, seed=seed + i, fund=fund, account=account, **options)
+        df_bank.to_csv(out_dir / f"bankstmt_flows_{account}.csv", index=False)
+        cash_frames.append(df_cash)
+        funds.append({"FundShortName": fund, "Account": account})
+    pd.concat(cash_frames, ignore_index=True).to_csv(out_dir / CASH_FILENAME, index=False)
+    pd.DataFrame(funds).to_csv(out_dir / ACCOUNTS_FILENAME, index=False)
+    return {"cash_filename": CASH_FILENAME, "accounts_filename": ACCOUNTS_FILENAME, "accounts": funds}
+
+def generate_rules(out_dir: Path, spvs: int = 100, originators: Optional[int] = None, investors: Optional[int] = None,
+                   expenses: Optional[int] = None, phrases: int = 5, seed: int = 0) -> Dict[str, object]:
+    """
+    Writes a rules directory in the ops CSV layouts (see src/rules_csv.py) with `spvs` SPVs
+    (two synonyms each) spread over `originators`, plus investor tags, expense tags and
+    priority phrases; unset counts scale with `spvs`. Returns the synonyms per tag family,
+    so matching transaction text can be generated (generate_tagging_report).
+    """
+    rng = np.random.default_rng(seed)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    originators = originators or max(1, spvs // 10)
+    investors = investors or max(1, spvs // 4)
+    expenses = expenses or max(2, spvs // 20)
+    yes_no = lambda n, p: np.where(rng.random(n) < p, "true", "false")
+
+    org_names = [f"Originator {i:04d}" for i in range(1, originators + 1)]
+    pd.DataFrame({
+        "originator": org_names,
+        "originator_synonyms": [f"ORIG{i:04d}|ORG {i:04d} LSG" for i in range(1, originators + 1)],
+    }).to_csv(out_dir / "investment_originators.csv", index=False)
+
+    spv_syns = [[f"SPVREF {i:05d}", f"PROJECT {i:05d} LTD"] for i in range(1, spvs + 1)]
+    pd.DataFrame({
+        "originator": [org_names[i % originators] for i in range(spvs)],
+        "spv": [f"SPV {i:05d}" for i in range(1, spvs + 1)],
+        "spv_synonyms": ["|".join(syns) for syns in spv_syns],
+        "years_required": yes_no(spvs, 0.1),
+        "priority": rng.integers(1, 101, spvs),
+    }).to_csv(out_dir / "investment_spvs.csv", index=False)
+
+    investor_syns = [[f"INVESTOR {i:04d}", f"INV{i:04d} SUBS"] for i in range(1, investors + 1)]
+    pd.DataFrame({
+        "tag": [f"Investor {i:04d}" for i in range(1, investors + 1)],
+        "synonyms": ["|".join(syns) for syns in investor_syns],
+        "priority": rng.integers(1, 101, investors),
+        "years_required": yes_no(investors, 0.05),
+    }).to_csv(out_dir / "investor_tags.csv", index=False)
+
+    expense_types = EXPENSE_TYPES * ((expenses + 1) // len(EXPENSE_TYPES))
+    expense_syns = [[f"EXPENSE {i:04d}", f"FEE CODE {i:04d}"] for i in range(1, expenses + 1)]
+    pd.DataFrame({
+        "type": expense_types[:expenses],
+        "tag": [f"Expense {i:04d}" for i in range(1, expenses + 1)],
+        "synonyms": ["|".join(syns) for syns in expense_syns],
+        "priority": rng.integers(1, 101, expenses),
+        "years_required": "false",
+    }).to_csv(out_dir / "expense_tags.csv", index=False)
+
+    phrase_list = [f"PRIORITY PHRASE {i:03d}" for i in range(1, phrases + 1)]
+    pd.DataFrame({"phrase": phrase_list, "priority": np.arange(1, phrases + 1)}).to_csv(
+        out_dir / "priority_phrases.csv", index=False)
+
+    return {
+        "investment": [s for syns in spv_syns for s in syns] + [f"ORIG{i:04d}" for i in range(1, originators + 1)],
+        "investor": [s for syns in investor_syns for s in syns],
+        "expense": [s for syns in expense_syns for s in syns],
+        "phrase": phrase_list,
+        "counts": {"spvs": spvs, "originators": originators, "investors": investors,
+                   "expense_tags": expenses, "priority_phrases": phrases},
+    }
+
+def generate_tagging_report(rows: int, synonyms: Dict[str, object], seed: int = 0, hit_rate: float = 0.8,
+                            phrase_rate: float = 0.02) -> pd.DataFrame:
+    """
+    A cashrec report (all cells as text, like the CSV read back with dtype=str) whose
+    descriptions mention the generated rules: `hit_rate` of the lines carry a synonym of
+    their type's tag family, `phrase_rate` a priority phrase, the rest only noise.
+    """
+    rng = np.random.default_rng(seed)
+    family = rng.choice(list(TYPE_FAMILIES), rows, p=list(TYPE_FAMILIES.values()))
+    types = np.array([rng.choice(FAMILY_TYPES[f]) for f in family], dtype=object)
+    hit = rng.random(rows) < hit_rate
+    phrase = rng.random(rows) < phrase_rate
+    text = np.array([f"WIRE {n:06d}" for n in rng.integers(0, 1_000_000, rows)], dtype=object)
+    for f in ("investment", "investor", "expense"):
+        sel = np.flatnonzero((family == f) & hit)
+        pool = synonyms[f]
+        if len(sel) and pool:
+            text[sel] = np.char.add(np.char.add(text[sel].astype(str), " "),
+                                    np.array(pool, dtype=object)[rng.integers(0, len(pool), len(sel))].astype(str))
+    if synonyms["phrase"]:
+        sel = np.flatnonzero(phrase)
+        text[sel] = np.char.add(np.char.add(text[sel].astype(str), " "),
+                                np.array(synonyms["phrase"])[rng.integers(0, len(synonyms["phrase"]), len(sel))])
+    with_year = rng.random(rows) < 0.5
+    text[with_year] = np.char.add(text[with_year].astype(str),
+                                  np.char.mod(" %d", rng.integers(2018, 2027, with_year.sum())))
+
+    # Matched pairs share a label; ~10% of the lines are unreconciled
+    label = np.char.add("EXACT MATCH - ", (np.arange(rows) // 2 + 1).astype(str)).astype(object)
+    label[rng.random(rows) < 0.1] = ""
+    dates = (np.datetime64("2021-01-01") + rng.integers(0, 4 * 365, rows)).astype(str)
+    amount = np.round(rng.integers(1, 5_000_000, rows) / 100 * np.where(rng.random(rows) < 0.6, -1, 1), 2)
+    bank_side = rng.random(rows) < 0.5
+    blank = np.full(rows, "", dtype=object)
+    return pd.DataFrame({
+        "Calculated_Date": np.where(bank_side, dates, blank),
+        "Acct_From_Filename": "400310000001",
+        "Description1A": "TRANSFER",
+        "Description1B": np.where(bank_side, np.char.add("REF ", np.arange(rows).astype(str)), blank),
+        "Description2": np.where(bank_side, text, blank),
+        "Debit": np.where(bank_side & (amount < 0), np.char.mod("%.2f", -amount), blank),
+        "Credit": np.where(bank_side & (amount >= 0), np.char.mod("%.2f", amount), blank),
+        "Reconciled": label,
+        "FundShortName": "SYNTH001",
+        "Type": types,
+        "Cash_Date": dates,
+        "Detail": np.where(bank_side, blank, text),
+        "Amount": np.char.mod("%.2f", amount),
+    })
+
+def parse_mix(items: Optional[List[str]]) -> Dict[str, float]:
+    """['split_same_day=0.2', ...] -> {'split_same_day': 0.2}"""
+    mix = {}
+    for item in items or []:
+        key, _, value = item.partition("=")
+        if key not in DEFAULT_MIX:
+            raise ValueError(f"Unknown mix key {key!r} (expected one of {sorted(DEFAULT_MIX)})")
+        mix[key] = float(value)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic bank statement / cash flow files for cash_rec")
+    parser.add_argument("--out", type=Path, required=True, help="Output directory")
+    parser.add_argument("--rows", type=int, default=10_000, help="Transactions per account")
+    parser.add_argument("--accounts", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--missing-months", type=int, default=2)
+    parser.add_argument("--mix", action="append", metavar="KIND=SHARE",
+                        help=f"Override a transaction kind's share (kinds: {', '.join(DEFAULT_MIX)})")
+    args = parser.parse_args()
+
+    info = write_dataset(args.out, args.rows, accounts=args.accounts, seed=args.seed,
+                         missing_months=args.missing_months, mix=parse_mix(args.mix))
+    print(f"[OK] Wrote {len(info['accounts'])} account(s) x {args.rows:,} transactions to {args.out}")
+
+if __name__ == "__main__":
+    main()
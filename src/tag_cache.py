@@ -0,0 +1,82 @@
+# /src/tag_cache.py
+import json
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 200_000
+CACHE_FORMAT = 1
+
+class TagCache:
+    """
+    Bounded LRU of tagging results for tagging.tag_frame(..., cache=), keyed on
+    (rules fingerprint, description text, Type). Entries of an older rules version are
+    never hit again and age out. With `path`, the cache is read from that JSON file when
+    created and written back by save(), so the next run starts warm.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, path: Optional[Path] = None):
+        self.max_entries = max_entries
+        self.path = Path(path) if path else None
+        self.entries: "OrderedDict[Tuple[str, str, str], Tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.path is not None and self.path.exists():
+            self.load(self.path)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get_many(self, keys: List[Tuple[str, str, str]], rows: Optional[Iterable[int]] = None) -> Dict:
+        """
+        Cached results of the given (distinct) keys, refreshing their LRU position.
+        `rows` is how many rows each key stands for: a key found counts that many hits,
+        a key not found one miss (its row is tagged) and the rest hits.
+        """
+        found = {}
+        for key, n in zip(keys, rows if rows is not None else [1] * len(keys)):
+            n = int(n)
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                self.hits += n - 1
+                continue
+            self.entries.move_to_end(key)
+            found[key] = value
+            self.hits += n
+        return found
+
+    def put(self, key: Tuple[str, str, str], value: Tuple) -> None:
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+    def load(self, path: Path) -> None:
+        """Adds the entries of a saved cache (least recently used first), ignoring other formats."""
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        if data.get("format") != CACHE_FORMAT:
+            return
+        for version, text, txn_type, value in data.get("entries", []):
+            self.put((version, text, txn_type), tuple(value))
+
+    def save(self, path: Optional[Path] = None) -> Path:
+        path = Path(path or self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entries = [[*key, list(value)] for key, value in self.entries.items()]
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(json.dumps({"format": CACHE_FORMAT, "entries": entries}), encoding="utf-8")
+        tmp.replace(path)
+        return path
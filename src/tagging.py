@@ -1,8 +1,13 @@
 # /src/tagging.py
+import hashlib
+import json
 import re
 from typing import Dict, List, Optional, Tuple
+import numpy as np
 import pandas as pd
-from .text_utils import normalize_text, extract_years, first_nonempty
+from .report import STATUS_PATTERN
+from .text_utils import (normalize_text, normalize_series, combined_text, extract_years, first_nonempty,
+                         TEXT_COL, TEXT_NORM_COL)
 
 def derive_type_group(txn_type: str, rules: Dict) -> str:
     type_groups = rules.get("type_groups", {})
@@ -20,52 +25,280 @@ def match_priority_phrase(text_original: str, priority_phrases: List[str]) -> Op
             return phrase.upper()
     return None
 
+class _PhraseIndex:
+    """
+    Ranked phrases keyed by their normalized token tuple. Searching a normalized text looks up
+    each of its token n-grams (only the phrase lengths present), so one pass finds every phrase
+    `\\bPHRASE\\b` would find, however many phrases there are. Lower rank = scanned first.
+    """
+
+    def __init__(self):
+        self.ranks: Dict[Tuple[str, ...], List[int]] = {}
+        self.lengths: List[int] = []
+        self.empty_rank: Optional[int] = None   # a phrase normalizing to "" (r"\b\b": any non-empty text)
+
+    def add(self, phrase_norm: str, rank: int) -> None:
+        tokens = tuple(phrase_norm.split())
+        if not tokens:
+            self.empty_rank = rank if self.empty_rank is None else min(self.empty_rank, rank)
+            return
+        self.ranks.setdefault(tokens, []).append(rank)
+        if len(tokens) not in self.lengths:
+            self.lengths.append(len(tokens))
+
+    def hits(self, tokens: List[str]) -> List[int]:
+        """Ranks of every phrase found in the text's tokens (unsorted, may repeat)."""
+        found = [self.empty_rank] if tokens and self.empty_rank is not None else []
+        for n in self.lengths:
+            for i in range(len(tokens) - n + 1):
+                ranks = self.ranks.get(tuple(tokens[i:i + n]))
+                if ranks:
+                    found.extend(ranks)
+        return found
+
+    def best(self, tokens: List[str]) -> Optional[int]:
+        return min(self.hits(tokens), default=None)
+
+    def frame_hits(self, text_norm: pd.Series) -> pd.DataFrame:
+        """hits() for a whole column at once: one (row position, rank) pair per phrase found."""
+        tokens = text_norm.reset_index(drop=True).str.split().explode().dropna()
+        rows, toks = tokens.index.to_numpy(), tokens.to_numpy(dtype=object)
+        by_text = {" ".join(key): ranks for key, ranks in self.ranks.items()}
+        parts = []
+        for n in self.lengths:
+            m = len(toks) - n + 1
+            if m <= 0:
+                continue
+            gram, same_row = toks[:m], np.ones(m, dtype=bool)
+            for k in range(1, n):
+                gram = gram + " " + toks[k:k + m]
+                same_row &= rows[k:k + m] == rows[:m]
+            ranks = pd.Series(gram[same_row], index=rows[:m][same_row]).map(by_text).dropna()
+            parts.append(ranks.explode())
+        if self.empty_rank is not None:
+            parts.append(pd.Series(self.empty_rank, index=np.unique(rows)))
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return pd.DataFrame({"row": np.zeros(0, dtype=np.int64), "rank": np.zeros(0, dtype=np.int64)})
+        hits = pd.concat(parts)
+        return pd.DataFrame({"row": hits.index.to_numpy(dtype=np.int64), "rank": hits.to_numpy(dtype=np.int64)})
+
+    def frame_best(self, text_norm: pd.Series) -> np.ndarray:
+        """best() per row of a column: the lowest rank found, -1 where there is none."""
+        best = np.full(len(text_norm), -1, dtype=np.int64)
+        hits = self.frame_hits(text_norm)
+        if not hits.empty:
+            lowest = hits.groupby("row")["rank"].min()
+            best[lowest.index.to_numpy()] = lowest.to_numpy()
+        return best
+
+class CompiledRules:
+    """
+    A rules dict (src.rules_csv layout) indexed once for tagging. Each synonym / SPV / originator /
+    tag phrase is ranked in the order the rule lists are scanned, so the lowest-ranked phrase found
+    in a row's normalized text is the one a phrase-by-phrase `\\bPHRASE\\b` scan would stop at.
+    Priority phrases match the original text case-insensitively: the index narrows them to the
+    phrases whose words occur, then their regexes decide (all of them for non-ASCII text).
+    """
+
+    def __init__(self, rules: Dict):
+        self.rules = rules
+        # Content hash of the rules: the "rules version" of cached tagging results (TagCache)
+        self.fingerprint = hashlib.sha1(json.dumps(rules, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+        self.priority_phrases = list(rules.get("priority_phrases", []))
+        self.priority_rx = [re.compile(r"\b" + re.escape(p) + r"\b", re.IGNORECASE) for p in self.priority_phrases]
+        self.priority_index = _PhraseIndex()
+        self.priority_always = []   # phrases without ASCII words can't be narrowed down by tokens
+        for rank, phrase in enumerate(self.priority_phrases):
+            phrase_norm = normalize_text(phrase)
+            if phrase.isascii() and phrase_norm:
+                self.priority_index.add(phrase_norm, rank)
+            else:
+                self.priority_always.append(rank)
+
+        inv_rules = rules.get("investment", {})
+        originators = inv_rules.get("originators", {})
+        # SPV synonym -> canonical SPV name (a later duplicate wins the name, the first keeps the rank)
+        self.spv_syn_to_name: Dict[str, str] = {}
+        for org_name, org_def in originators.items():
+            for spv_name, spv_def in (org_def.get("spvs") or {}).items():
+                for syn in spv_def.get("synonyms", []) + [spv_name]:
+                    self.spv_syn_to_name[normalize_text(syn)] = spv_name
+        self.spv_syns = list(self.spv_syn_to_name)
+        self.spv_syn_index = _PhraseIndex()
+        for rank, syn_norm in enumerate(self.spv_syns):
+            self.spv_syn_index.add(syn_norm, rank)
+
+        self.spv_priority = [normalize_text(x) for x in inv_rules.get("spv_priority", [])]
+        self.spv_priority_index = _PhraseIndex()
+        for rank, phrase_norm in enumerate(self.spv_priority):
+            if phrase_norm:
+                self.spv_priority_index.add(phrase_norm, rank)
+
+        self.originator_names = list(originators)
+        self.originator_index = _PhraseIndex()
+        self.spv_originator: Dict[str, str] = {}
+        for rank, (org_name, org_def) in enumerate(originators.items()):
+            for spv_name in (org_def.get("spvs") or {}):
+                self.spv_originator.setdefault(spv_name, org_name)
+            if not org_name:   # a blank name never stops the originator scan
+                continue
+            for syn in (org_def.get("synonyms", []) + [org_name]):
+                self.originator_index.add(normalize_text(syn), rank)
+
+        self.type_group_of: Dict[str, str] = {}
+        for group_name, types in rules.get("type_groups", {}).items():
+            for txn_type in types:
+                self.type_group_of.setdefault(txn_type, group_name)
+        self.years_required_spvs = {(org_name, spv_name) for org_name, org_def in originators.items()
+                                    for spv_name, spv_def in (org_def.get("spvs") or {}).items()
+                                    if spv_def.get("years_required", False)}
+        self.investor_items = self._item_indexes(rules.get("investor", {}).get("tags", []))
+        self.years_required_investors = {t.get("tag") for t in rules.get("investor", {}).get("tags", [])
+                                         if t.get("years_required", False)}
+        self.expense_items = {txn_type: self._item_indexes(items)
+                              for txn_type, items in rules.get("expenses", {}).get("by_type", {}).items()}
+
+    @staticmethod
+    def _item_indexes(items: List[Dict]):
+        """(items, index of all synonyms, index of the synonyms of items without years_required)."""
+        any_index, no_year_index = _PhraseIndex(), _PhraseIndex()
+        for rank, item in enumerate(items):   # items pre-sorted by priority
+            for syn in item.get("synonyms", []):
+                syn_norm = normalize_text(syn)
+                if not syn_norm:
+                    continue
+                any_index.add(syn_norm, rank)
+                if not item.get("years_required", False):
+                    no_year_index.add(syn_norm, rank)
+        return items, any_index, no_year_index
+
+    def match_priority_phrase(self, text_original: str, text_norm: str) -> Optional[str]:
+        """match_priority_phrase(text_original, rules["priority_phrases"]) for text_norm = normalize_text(text_original)."""
+        if not isinstance(text_original, str):
+            return None
+        if text_original.isascii():
+            candidates = sorted(set(self.priority_index.hits(text_norm.split()) + self.priority_always))
+        else:
+            candidates = range(len(self.priority_phrases))
+        for rank in candidates:
+            if self.priority_rx[rank].search(text_original):
+                return self.priority_phrases[rank].upper()
+        return None
+
+    def find_spv(self, tokens: List[str]) -> Optional[str]:
+        """The first priority SPV phrase found, else the first SPV synonym found -> canonical SPV name."""
+        rank = self.spv_priority_index.best(tokens)
+        if rank is not None:
+            phrase_norm = self.spv_priority[rank]
+            return self.spv_syn_to_name.get(phrase_norm) or phrase_norm
+        rank = self.spv_syn_index.best(tokens)
+        return self.spv_syn_to_name[self.spv_syns[rank]] if rank is not None else None
+
+    def find_originator(self, tokens: List[str]) -> Optional[str]:
+        rank = self.originator_index.best(tokens)
+        return self.originator_names[rank] if rank is not None else None
+
+    def match_items(self, indexes, text_norm: str) -> Tuple[Optional[dict], Optional[str]]:
+        """First item (by priority) with a synonym in the text; years_required items need a year."""
+        items, any_index, no_year_index = indexes
+        tokens = text_norm.split()
+        year = _find_year(text_norm)
+        rank = (any_index if year else no_year_index).best(tokens)
+        return (items[rank], year) if rank is not None else (None, None)
+
+    def phrase_families(self) -> Dict[str, List[Tuple[Tuple[str, ...], object]]]:
+        """
+        Every phrase the rules match, per family and in scan order, as (normalized tokens, what a
+        match on it yields). Two rule sets tag a text differently only through entries that differ
+        here or changed order (src.retag diffs them). Empty tokens = the phrase can hit any row.
+        """
+        spv_info = lambda name: (name, self.spv_originator.get(name),
+                                 (self.spv_originator.get(name), name) in self.years_required_spvs)
+        tokens = lambda phrase_norm: tuple(phrase_norm.split())
+        families = {
+            "priority_phrases": [(tokens(normalize_text(p)) if p.isascii() else (), p) for p in self.priority_phrases],
+            "spv_priority": [(tokens(p), spv_info(self.spv_syn_to_name.get(p) or p)) for p in self.spv_priority if p],
+            "spv_synonyms": [(tokens(syn), spv_info(self.spv_syn_to_name[syn])) for syn in self.spv_syns],
+            "originators": [(tokens(normalize_text(syn)), org_name)
+                            for org_name, org_def in self.rules.get("investment", {}).get("originators", {}).items() if org_name
+                            for syn in (org_def.get("synonyms", []) + [org_name])],
+        }
+        item_families = {"investor": self.investor_items[0]}
+        item_families.update({f"expense:{t}": indexes[0] for t, indexes in self.expense_items.items()})
+        for family, items in item_families.items():
+            families[family] = [(tokens(normalize_text(syn)), (item.get("tag"), bool(item.get("years_required", False)),
+                                                               item.get("tag") in self.years_required_investors))
+                                for item in items for syn in item.get("synonyms", []) if normalize_text(syn)]
+        return families
+
+    # Column-wise versions of the matchers above (positional arrays, one value per row)
+
+    def frame_priority_phrase(self, text_original: pd.Series, text_norm: pd.Series) -> np.ndarray:
+        out = np.full(len(text_original), None, dtype=object)
+        if not self.priority_phrases:
+            return out
+        is_ascii = text_original.map(str.isascii).to_numpy()
+        candidates = [self.priority_index.frame_hits(text_norm[is_ascii]).assign(
+            row=lambda h: np.flatnonzero(is_ascii)[h["row"].to_numpy()])]
+        always = list(range(len(self.priority_phrases)))
+        for rows, ranks in ((np.flatnonzero(is_ascii), self.priority_always), (np.flatnonzero(~is_ascii), always)):
+            if len(rows) and ranks:
+                candidates.append(pd.DataFrame({"row": np.repeat(rows, len(ranks)), "rank": np.tile(ranks, len(rows))}))
+        candidates = pd.concat(candidates).drop_duplicates().sort_values(["row", "rank"])
+        texts = text_original.to_numpy(dtype=object)
+        for row, rank in zip(candidates["row"].to_numpy(), candidates["rank"].to_numpy()):
+            if out[row] is None and self.priority_rx[rank].search(texts[row]):
+                out[row] = self.priority_phrases[rank].upper()
+        return out
+
+    def frame_spv(self, text_norm: pd.Series) -> np.ndarray:
+        by_priority = self.spv_priority_index.frame_best(text_norm)
+        by_synonym = self.spv_syn_index.frame_best(text_norm)
+        return np.array([
+            (self.spv_syn_to_name.get(self.spv_priority[p]) or self.spv_priority[p]) if p >= 0
+            else self.spv_syn_to_name[self.spv_syns[s]] if s >= 0 else None
+            for p, s in zip(by_priority, by_synonym)
+        ], dtype=object)
+
+    def frame_originator(self, text_norm: pd.Series) -> np.ndarray:
+        return np.array([self.originator_names[r] if r >= 0 else None
+                         for r in self.originator_index.frame_best(text_norm)], dtype=object)
+
+    def frame_items(self, indexes, text_norm: pd.Series, year_norm: np.ndarray) -> np.ndarray:
+        """match_items per row -> the matched item's tag (None where nothing matched)."""
+        items, any_index, no_year_index = indexes
+        ranks = np.where(np.not_equal(year_norm, None), any_index.frame_best(text_norm),
+                         no_year_index.frame_best(text_norm))
+        return np.array([items[r].get("tag") if r >= 0 else None for r in ranks], dtype=object)
+
+_compiled: Optional[CompiledRules] = None
+
+def compile_rules(rules: Dict) -> CompiledRules:
+    """
+    CompiledRules for `rules`, built on first use and reused while the same rules dict is
+    passed (compile again, or pass a new dict, after editing rules in place).
+    """
+    global _compiled
+    if _compiled is None or _compiled.rules is not rules:
+        _compiled = CompiledRules(rules)
+    return _compiled
+
 def tag_investment(text_original: str, text_norm: str, rules: Dict):
-    inv_rules = rules.get("investment", {})
-    spv_priority = [normalize_text(x) for x in inv_rules.get("spv_priority", [])]
-    originators = inv_rules.get("originators", {})
+    compiled = compile_rules(rules)
+    tokens = text_norm.split()
 
-    found_spv = None
-    found_originator = None
     found_year = None
     meta = {"source": "investment", "candidates": {}}
 
-    # Build SPV synonym map -> canonical SPV name
-    spv_syn_to_name = {}
-    for org_name, org_def in originators.items():
-        for spv_name, spv_def in (org_def.get("spvs") or {}).items():
-            for syn in spv_def.get("synonyms", []) + [spv_name]:
-                spv_syn_to_name[normalize_text(syn)] = spv_name
-
-    # Priority SPV scan (by normalized phrase)
-    for spv_phrase_norm in spv_priority:
-        if not spv_phrase_norm:
-            continue
-        if re.search(r"\b" + re.escape(spv_phrase_norm) + r"\b", text_norm):
-            found_spv = spv_syn_to_name.get(spv_phrase_norm) or spv_phrase_norm
-            break
-
-    # Fallback: any SPV synonym
-    if not found_spv:
-        for syn_norm, spv_name in spv_syn_to_name.items():
-            if re.search(r"\b" + re.escape(syn_norm) + r"\b", text_norm):
-                found_spv = spv_name
-                break
+    # SPV: priority phrases first, then any SPV synonym
+    found_spv = compiled.find_spv(tokens)
 
     # Originator
     if found_spv:
-        for org_name, org_def in originators.items():
-            if found_spv in (org_def.get("spvs") or {}):
-                found_originator = org_name
-                break
+        found_originator = compiled.spv_originator.get(found_spv)
     else:
-        for org_name, org_def in originators.items():
-            for syn in (org_def.get("synonyms", []) + [org_name]):
-                if re.search(r"\b" + re.escape(normalize_text(syn)) + r"\b", text_norm):
-                    found_originator = org_name
-                    break
-            if found_originator:
-                break
+        found_originator = compiled.find_originator(tokens)
 
     # Year extraction
     years = extract_years(text_original or "")
@@ -93,43 +326,39 @@ def _find_year(text_original: str) -> Optional[str]:
     yrs = extract_years(text_original or "")
     return yrs[0] if yrs else None
 
-def _match_by_synonyms(text_norm: str, items: list[dict]) -> Tuple[Optional[dict], Optional[str]]:
-    for item in items:  # items pre-sorted by priority
-        for syn in item.get("synonyms", []):
-            syn_norm = normalize_text(syn)
-            if syn_norm and re.search(r"\b" + re.escape(syn_norm) + r"\b", text_norm):
-                year = _find_year(text_norm)  # or text_original if you prefer
-                if item.get("years_required", False) and not year:
-                    continue
-                return item, year
-    return None, None
-
 def tag_investor(text_original: str, text_norm: str, rules: Dict):
-    inv_rules = rules.get("investor", {}).get("tags", [])
-    if not inv_rules:
+    compiled = compile_rules(rules)
+    if not compiled.investor_items[0]:
         return None, None, {"source": "investor_rules", "matched": False}
-    item, year = _match_by_synonyms(text_norm, inv_rules)
+    item, year = compiled.match_items(compiled.investor_items, text_norm)
     if item:
         # item["tag"] is your canonical investor name
         return item.get("tag"), year, {"source": "investor_rules", "matched": True}
     return None, None, {"source": "investor_rules", "matched": False}
 
 def tag_expense(text_original: str, text_norm: str, txn_type: str, rules: Dict):
-    by_type = rules.get("expenses", {}).get("by_type", {})
-    items = by_type.get(txn_type, [])
-    if not items:
+    compiled = compile_rules(rules)
+    indexes = compiled.expense_items.get(txn_type)
+    if not indexes or not indexes[0]:
         return None, None, {"source": "expense_rules", "matched": False}
-    item, year = _match_by_synonyms(text_norm, items)  # already defined for investor
+    item, year = compiled.match_items(indexes, text_norm)  # same matching as investor
     if item:
         return item.get("tag"), year, {"source": "expense_rules", "matched": True}
     return None, None, {"source": "expense_rules", "matched": False}
 
 def tag_row(row: pd.Series, rules: Dict) -> Dict:
-    d1b = row.get("Description1B", "")
-    d2 = row.get("Description2", "")
-    det = row.get("Detail", "")
-    text_original = " | ".join([str(d1b or ""), str(d2 or ""), str(det or "")]).strip()
-    text_norm = normalize_text(text_original)
+    # Combined text from the frame's text columns (add_text_columns) when present
+    text_original = row.get(TEXT_COL)
+    if isinstance(text_original, str):
+        text_norm = row.get(TEXT_NORM_COL)
+        if not isinstance(text_norm, str):
+            text_norm = normalize_text(text_original)
+    else:
+        d1b = row.get("Description1B", "")
+        d2 = row.get("Description2", "")
+        det = row.get("Detail", "")
+        text_original = " | ".join([str(d1b or ""), str(d2 or ""), str(det or "")]).strip()
+        text_norm = normalize_text(text_original)
 
     txn_type = str(row.get("Type", "")).strip()
     type_group = derive_type_group(txn_type, rules)
@@ -137,7 +366,7 @@ def tag_row(row: pd.Series, rules: Dict) -> Dict:
     # ✳️ Priority phrase override only for NON-investment rows.
     # Investment rows rely on SPV priority logic so we can set Originator/SPV and enforce year.
     if type_group != "Investment payments":
-        priority = match_priority_phrase(text_original, rules.get("priority_phrases", []))
+        priority = compile_rules(rules).match_priority_phrase(text_original, text_norm)
         if priority:
             return {
                 "Type_Group": type_group,
@@ -240,3 +469,191 @@ def tag_row(row: pd.Series, rules: Dict) -> Dict:
         "Tag_Source": "type_passthrough",
         "Tag_Year_Required_Missing": False,
     }
+
+TAG_COLUMNS = ["Type_Group", "Tag", "Investor", "Originator", "SPV", "Tag_Year", "Tag_Source", "Tag_Year_Required_Missing"]
+
+def _first_year(text: pd.Series) -> np.ndarray:
+    """extract_years(text)[0] per row, None where the text has no year."""
+    years = text.str.extract(r"\b(20\d{2})\b", expand=False)
+    return years.astype(object).where(years.notna(), None).to_numpy()
+
+def _frame_text(df: pd.DataFrame) -> Tuple[pd.Series, pd.Series]:
+    """Each row's (text_original, text_norm) as tag_row reads them, positionally indexed."""
+    n = len(df)
+    original = df[TEXT_COL].reset_index(drop=True) if TEXT_COL in df.columns else pd.Series([None] * n, dtype=object)
+    have_original = original.map(lambda v: isinstance(v, str))
+    if not have_original.all():
+        original = original.where(have_original, combined_text(df).reset_index(drop=True))
+    norm = df[TEXT_NORM_COL].reset_index(drop=True) if TEXT_NORM_COL in df.columns else pd.Series([None] * n, dtype=object)
+    have_norm = have_original & norm.map(lambda v: isinstance(v, str))
+    if not have_norm.all():
+        norm = norm.where(have_norm, normalize_series(original.astype(str)))
+    return original.astype(object), norm.astype(object)
+
+def tag_frame(df: pd.DataFrame, rules: Dict, cache=None) -> pd.DataFrame:
+    """
+    tag_row for a whole frame in bulk: rows are split by Type_Group and each partition is
+    matched column-wise against the compiled rules (compile_rules). Returns the TAG_COLUMNS
+    with df's index, equal to tagging every row with tag_row.
+    With a TagCache (src.tag_cache), each distinct (text, Type) is tagged once and looked up after.
+    """
+    if cache is not None:
+        return _tag_frame_cached(df, rules, cache)
+    compiled = compile_rules(rules)
+    n = len(df)
+    out = {col: np.full(n, None, dtype=object) for col in TAG_COLUMNS}
+    out["Tag_Year_Required_Missing"] = np.zeros(n, dtype=bool)
+    if n == 0:
+        return pd.DataFrame(out, index=df.index)[TAG_COLUMNS]
+
+    text_original, text_norm = _frame_text(df)
+    txn_type = (df["Type"].astype(str).str.strip().to_numpy(dtype=object) if "Type" in df.columns
+                else np.full(n, "", dtype=object))
+    type_group = pd.Series(txn_type).map(compiled.type_group_of).fillna("Other").to_numpy(dtype=object)
+    out["Type_Group"] = type_group
+    year = _first_year(text_original)                      # Tag_Year of a match
+    year_or_blank = np.where(np.equal(year, None), "", year).astype(object)   # first_nonempty(...) fallback
+
+    def fill(rows, tag, year_values, source):
+        out["Tag"][rows] = tag
+        out["Tag_Year"][rows] = year_values
+        out["Tag_Source"][rows] = source
+
+    # Priority phrases override every group but investment payments
+    rows = np.flatnonzero(type_group != "Investment payments")
+    priority = compiled.frame_priority_phrase(text_original.iloc[rows], text_norm.iloc[rows])
+    hit = np.array([bool(p) for p in priority], dtype=bool)
+    fill(rows[hit], priority[hit], year_or_blank[rows[hit]], "priority_phrase")
+    open_rows = np.ones(n, dtype=bool)
+    open_rows[rows[hit]] = False
+
+    # Investment payments: SPV (priority phrases, then synonyms) and originator
+    rows = np.flatnonzero(type_group == "Investment payments")
+    if len(rows):
+        spv = compiled.frame_spv(text_norm.iloc[rows])
+        org = np.array([compiled.spv_originator.get(s) for s in spv], dtype=object)
+        no_spv = np.array([not s for s in spv], dtype=bool)
+        if no_spv.any():
+            org[no_spv] = compiled.frame_originator(text_norm.iloc[rows[no_spv]])
+        hit = np.array([bool(o or s) for o, s in zip(org, spv)], dtype=bool)
+        r = rows[hit]
+        tags = [" / ".join(x for x in parts if x) or None for parts in zip(org[hit], spv[hit], year[r])]
+        fill(r, tags, year[r], "investment")
+        out["Originator"][r], out["SPV"][r] = org[hit], spv[hit]
+        out["Tag_Year_Required_Missing"][r] = [bool(s and o and (o, s) in compiled.years_required_spvs and not y)
+                                               for o, s, y in zip(org[hit], spv[hit], year[r])]
+        fill(rows[~hit], None, year_or_blank[rows[~hit]], "investment_no_match")
+
+    # Investor payments: first investor tag (by priority) with a synonym in the text
+    rows = np.flatnonzero((type_group == "Investor payments") & open_rows)
+    if len(rows):
+        year_norm = _first_year(text_norm.iloc[rows])
+        if compiled.investor_items[0]:
+            tags = compiled.frame_items(compiled.investor_items, text_norm.iloc[rows], year_norm)
+        else:
+            tags = np.full(len(rows), None, dtype=object)
+        hit = np.array([bool(t) for t in tags], dtype=bool)
+        r = rows[hit]
+        fill(r, tags[hit], year_norm[hit], "investor_rules")
+        out["Investor"][r] = tags[hit]
+        out["Tag_Year_Required_Missing"][r] = [y is None and t in compiled.years_required_investors
+                                               for t, y in zip(tags[hit], year_norm[hit])]
+        fill(rows[~hit], None, year_or_blank[rows[~hit]], "investor_no_match")
+
+    # Expense: the Type's expense tags, else Tag = Type
+    rows = np.flatnonzero((type_group == "Expense") & open_rows)
+    for t in pd.unique(txn_type[rows]):
+        type_rows = rows[txn_type[rows] == t]
+        indexes = compiled.expense_items.get(t)
+        tags = np.full(len(type_rows), None, dtype=object)
+        year_norm = _first_year(text_norm.iloc[type_rows])
+        if indexes and indexes[0]:
+            tags = compiled.frame_items(indexes, text_norm.iloc[type_rows], year_norm)
+        hit = np.array([bool(tag) for tag in tags], dtype=bool)
+        fill(type_rows[hit], tags[hit], year_norm[hit], "expense_rules")
+        fill(type_rows[~hit], t if t else None, year_or_blank[type_rows[~hit]], "expense_fallback_type")
+
+    # Every other Type: Tag = Type (passthrough)
+    rows = np.flatnonzero(~np.isin(type_group, ["Investment payments", "Investor payments", "Expense"]) & open_rows)
+    fill(rows, [t if t else None for t in txn_type[rows]], year_or_blank[rows], "type_passthrough")
+
+    return pd.DataFrame(out, index=df.index)[TAG_COLUMNS]
+
+def _tag_frame_cached(df: pd.DataFrame, rules: Dict, cache) -> pd.DataFrame:
+    # Keyed on the original text: priority phrases and Tag_Year read it, not just Text_Norm
+    if df.empty:
+        return tag_frame(df, rules)
+    version = compile_rules(rules).fingerprint
+    text_original, text_norm = _frame_text(df)
+    txn_type = df["Type"].astype(str).str.strip() if "Type" in df.columns else pd.Series("", index=df.index)
+    codes, uniques = pd.factorize(pd.MultiIndex.from_arrays([text_original, txn_type.reset_index(drop=True)]))
+    keys = [(version, text, t) for text, t in uniques]
+    found = cache.get_many(keys, rows=np.bincount(codes, minlength=len(keys)))
+
+    missing = [i for i, key in enumerate(keys) if key not in found]
+    if missing:
+        first_row = np.unique(codes, return_index=True)[1]
+        new_rows = first_row[missing]
+        tags = tag_frame(pd.DataFrame({
+            TEXT_COL: text_original.iloc[new_rows].to_numpy(),
+            TEXT_NORM_COL: text_norm.iloc[new_rows].to_numpy(),
+            "Type": txn_type.iloc[new_rows].to_numpy(),
+        }), rules)
+        for i, value in zip(missing, tags.itertuples(index=False, name=None)):
+            found[keys[i]] = value
+            cache.put(keys[i], value)
+
+    values = pd.DataFrame([found[key] for key in keys], columns=TAG_COLUMNS)
+    values["Tag_Year_Required_Missing"] = values["Tag_Year_Required_Missing"].astype(bool)
+    return values.take(codes).set_axis(df.index)
+
+def _group_text(rows: pd.DataFrame) -> str:
+    """Bank descriptions (each distinct one once) followed by every cash Detail of a match group."""
+    bank = []
+    for col in ("Description1B", "Description2"):
+        for v in rows[col]:
+            if isinstance(v, str) and v.strip() and v not in bank:
+                bank.append(v)
+    cash = [v for v in rows["Detail"] if isinstance(v, str) and v.strip()]
+    return " | ".join(bank + cash).strip()
+
+def match_groups(df: pd.DataFrame) -> np.ndarray:
+    """
+    tag_groups' group code per row: rows sharing a real Match_ID and a Type share a code; rows
+    without a Match_ID or with a status label (missing statement months, unreconciled: their
+    trailing digits are a month, not a match) each get a code of their own.
+    """
+    linked = df["Match_ID"].notna()
+    if "Reconciled" in df.columns:
+        linked &= ~df["Reconciled"].astype(str).str.contains(STATUS_PATTERN)
+    keys = pd.MultiIndex.from_arrays([df["Match_ID"].astype(str), df["Type"].astype(str)])
+    codes, _ = pd.factorize(keys)
+    return np.where(linked.to_numpy(), codes, len(df) + np.arange(len(df)))
+
+def tag_groups(df: pd.DataFrame, rules: Dict, cache=None) -> Tuple[pd.DataFrame, int]:
+    """
+    Group-level tagging: rows sharing a Match_ID (a bank line and its cash lines) are tagged
+    once on their combined text and every row gets that result. A group is split by Type,
+    since Type picks the rule family. Rows without a Match_ID or with a status label, and
+    groups of one row, are tagged as rows (see match_groups). Returns the tag columns (same
+    index as df) and the tag_row calls saved.
+    """
+    if df.empty:
+        return tag_frame(df, rules, cache), 0
+    group_codes = match_groups(df)
+    grouped = np.bincount(group_codes)[group_codes] > 1
+
+    parts = [tag_frame(df[~grouped], rules, cache)]
+    rows = df[grouped]
+    saved = 0
+    if not rows.empty:
+        codes, uniques = pd.factorize(group_codes[grouped])
+        groups = []
+        for code, positions in sorted(rows.groupby(codes).indices.items()):
+            members = rows.iloc[positions]
+            text = _group_text(members)
+            groups.append({"Type": members["Type"].iloc[0], TEXT_COL: text, TEXT_NORM_COL: normalize_text(text)})
+        group_tags = tag_frame(pd.DataFrame(groups), rules, cache)
+        parts.append(group_tags.take(codes).set_axis(rows.index))
+        saved = len(rows) - len(uniques)
+    return pd.concat([p for p in parts if not p.empty] or parts).reindex(df.index), saved
@@ -2,6 +2,7 @@
 import math
 import re
 from typing import List, Optional
+import numpy as np
 import pandas as pd
 
 def coerce_date(series: pd.Series) -> pd.Series:
@@ -14,10 +15,12 @@ def coerce_number(series: pd.Series) -> pd.Series:
             .replace({"": "0", "nan": "0", "None": "0"})
             .astype(float))
 
+MATCH_ID_PATTERN = r"(\d+)\s*$"
+
 def parse_match_id(text: str) -> Optional[str]:
     if not isinstance(text, str):
         return None
-    m = re.search(r"(\d+)\s*$", text.strip())
+    m = re.search(MATCH_ID_PATTERN, text.strip())
     return m.group(1) if m else None
 
 def normalize_text(s: str) -> str:
@@ -27,6 +30,41 @@ def normalize_text(s: str) -> str:
     s_clean = re.sub(r"[^A-Z0-9]+", " ", s_up)
     return re.sub(r"\s+", " ", s_clean).strip()
 
+# Combined description text, built once per frame (add_text_columns) and shared by tagging,
+# fee detection, the mislabel audit and the suggestion miners
+TEXT_SOURCE_COLS = ["Description1B", "Description2", "Detail"]
+TEXT_COL = "Text_Original"
+TEXT_NORM_COL = "Text_Norm"
+
+def normalize_series(s: pd.Series) -> pd.Series:
+    """normalize_text over a whole column of strings."""
+    return (s.str.upper()
+            .str.replace(r"[^A-Z0-9]+", " ", regex=True)
+            .str.replace(r"\s+", " ", regex=True)
+            .str.strip())
+
+def combined_text(df: pd.DataFrame, cols: List[str] = TEXT_SOURCE_COLS) -> pd.Series:
+    """'Description1B | Description2 | Detail' per row (None / missing columns -> '', as tag_row joined them)."""
+    parts = []
+    for col in cols:
+        if col not in df.columns:
+            parts.append(pd.Series("", index=df.index))
+            continue
+        s = df[col]
+        parts.append(s.astype(str).where(~np.equal(s.to_numpy(dtype=object), None), ""))
+    text = parts[0]
+    for part in parts[1:]:
+        text = text + " | " + part
+    return text.str.strip()
+
+def add_text_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Adds Text_Original / Text_Norm (in place) unless the frame already has them."""
+    if TEXT_COL not in df.columns:
+        df[TEXT_COL] = combined_text(df)
+    if TEXT_NORM_COL not in df.columns:
+        df[TEXT_NORM_COL] = normalize_series(df[TEXT_COL])
+    return df
+
 def tokenize(text: str) -> List[str]:
     return normalize_text(text).split()
 
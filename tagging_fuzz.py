@@ -0,0 +1,229 @@
+import argparse
+import importlib
+import random
+import sys
+import tempfile
+import types
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from equivalence_gate import export_revision
+from src.rules_csv import load_rules_from_csv
+from src.synthetic import generate_rules, generate_tagging_report, ACCOUNTS_FILENAME
+from src.tag_cache import TagCache
+from src.tagging import tag_row, tag_frame, tag_groups, TAG_COLUMNS
+from src.text_utils import add_text_columns, MATCH_ID_PATTERN
+
+# Default terminal output formatting
+pd.set_option('display.max_columns', None)
+pd.set_option('display.expand_frame_repr', False)
+
+# Words the adversarial rules and descriptions are built from: mixed case, digits and years,
+# non-ASCII, punctuation-only and single-letter tokens, and the words of the fixed rule names
+FUZZ_WORDS = ["ALPHA", "beta", "GAMMA", "Delta", "A1", "2021", "2023", "fee", "mgmt", "X", "Café", "k", "KELVIN",
+              "---", "a_b", "A-B", "&", "LTD", "SPV", "ORIG"]
+# Phrases that normalise to nothing or to something unlike their text
+FUZZ_ODD_PHRASES = ["---", "&", "", "#REF", "x.", ".x", "Kelvin"]
+FUZZ_TYPES = ["Subscription", "Investment", "Mgmt Fees", "Fees and Expenses", "Rent", None, float("nan"),
+              " Investment "]
+FUZZ_TYPE_GROUPS = {"Investor payments": ["Subscription"], "Investment payments": ["Investment"],
+                    "Expense": ["Mgmt Fees", "Fees and Expenses"], "Other": []}
+DEFAULT_GENERATED_SPVS = [10, 100]
+# Last revision whose tag_row matched each phrase with its own regex (before compile_rules /
+# _PhraseIndex): the oracle the token-indexed engine and everything built on it must agree with
+REGEX_ENGINE_REVISION = "afd89a2"
+# Group mode: ALPHA and BETA tag differently alone, and as ALPHA once joined in one group text
+STATUS_LABEL_RULES = {
+    "priority_phrases": [],
+    "type_groups": FUZZ_TYPE_GROUPS,
+    "investment": {"spv_priority": [], "originators": {}},
+    "investor": {"tags": [{"tag": "T0", "synonyms": ["ALPHA"], "priority": 0, "years_required": False},
+                          {"tag": "T1", "synonyms": ["BETA"], "priority": 1, "years_required": False}]},
+    "expenses": {"by_type": {}},
+}
+
+
+def fuzz_phrase(r):
+    """One to three FUZZ_WORDS joined by a random separator (now and then an odd phrase)."""
+    if r.random() < 0.05:
+        return r.choice(FUZZ_ODD_PHRASES)
+    sep = r.choice([" ", "-", "  ", "_", "/"])
+    return sep.join(r.choice(FUZZ_WORDS) for _ in range(r.randint(1, 3)))
+
+
+def fuzz_rules(r):
+    """A rules dict (the load_rules_from_csv layout) with overlapping, duplicated and degenerate synonyms."""
+    def items():
+        return [{"tag": f"T{i}", "synonyms": [fuzz_phrase(r) for _ in range(r.randint(0, 3))], "priority": i,
+                 "years_required": r.random() < 0.3} for i in range(r.randint(0, 6))]
+
+    originators = {}
+    for o in range(r.randint(1, 6)):
+        name = fuzz_phrase(r) if r.random() < 0.5 else f"ORG{o}"
+        originators[name] = {
+            "synonyms": sorted(set(fuzz_phrase(r) for _ in range(r.randint(0, 3)))),
+            "spvs": {(fuzz_phrase(r) if r.random() < 0.5 else f"SPV{o}{s}"):
+                     {"synonyms": [fuzz_phrase(r) for _ in range(r.randint(0, 3))], "years_required": r.random() < 0.3}
+                     for s in range(r.randint(0, 4))},
+        }
+    return {
+        "priority_phrases": [fuzz_phrase(r) for _ in range(r.randint(0, 5))],
+        "type_groups": FUZZ_TYPE_GROUPS,
+        "investment": {"spv_priority": [fuzz_phrase(r) for _ in range(r.randint(0, 5))], "originators": originators},
+        "investor": {"tags": items()},
+        "expenses": {"by_type": {"Mgmt Fees": items(), "Fees and Expenses": items()}},
+    }
+
+
+def fuzz_report(r, rows, seed):
+    """Description / Detail / Type lines built from the same words, with missing values and a shuffled index."""
+    df = pd.DataFrame([{
+        "Description1B": fuzz_phrase(r) + " " + fuzz_phrase(r),
+        "Description2": r.choice([None, fuzz_phrase(r), float("nan")]),
+        "Detail": " ".join(fuzz_phrase(r) for _ in range(r.randint(0, 4))),
+        "Type": r.choice(FUZZ_TYPES),
+    } for _ in range(rows)])
+    df.index = np.random.default_rng(seed).permutation(rows) + 100
+    return df
+
+
+def load_reference_tagging(tree):
+    """src.tagging of an exported source tree, imported under its own package name."""
+    package = types.ModuleType("reference_src")
+    package.__path__ = [str(Path(tree) / "src")]
+    sys.modules["reference_src"] = package
+    return importlib.import_module("reference_src.tagging")
+
+
+def reference_tags(reference, df, rules):
+    """The reference revision's tag_row, one row at a time, as a TAG_COLUMNS frame."""
+    tags = df.apply(lambda row: reference.tag_row(row, rules), axis=1, result_type="expand")
+    if tags.empty:
+        return pd.DataFrame(columns=TAG_COLUMNS, index=df.index)
+    tags.columns = TAG_COLUMNS
+    return tags
+
+
+def candidate_paths(df, rules, cache_size, seed):
+    """Every way the work tree tags a frame -> {path name: TAG_COLUMNS frame}."""
+    rows = df.apply(lambda row: tag_row(row, rules), axis=1, result_type="expand")
+    rows.columns = TAG_COLUMNS
+    with_text = df.copy()
+    add_text_columns(with_text)
+    # A small cache that evicts: a cold pass, then a warm pass over the rows in another order
+    cache = TagCache(cache_size)
+    tag_frame(df, rules, cache=cache)
+    cached = tag_frame(df.sample(frac=1, random_state=seed), rules, cache=cache).loc[df.index]
+    return {"tag_row": rows, "tag_frame": tag_frame(df, rules), "tag_frame_text_columns": tag_frame(with_text, rules),
+            "tag_frame_cached": cached}
+
+
+def compare(case, df, expected, results):
+    """Cells where a candidate path differs from the reference -> one row per differing cell."""
+    diffs = []
+    for path, tags in results.items():
+        try:
+            pd.testing.assert_frame_equal(expected, tags)
+            continue
+        except AssertionError as e:
+            detail = str(e).splitlines()[0]
+        differs = (expected.astype(str) != tags.astype(str)).any(axis=1) if tags.shape == expected.shape else None
+        if differs is None or not differs.any():
+            diffs.append({"case": case, "path": path, "row": None, "column": None,
+                          "reference": detail, "candidate": None})
+            continue
+        for idx in differs[differs].index:
+            for col in TAG_COLUMNS:
+                if str(expected.at[idx, col]) != str(tags.at[idx, col]):
+                    diffs.append({"case": case, "path": path, "row": idx, "column": col,
+                                  "reference": expected.at[idx, col], "candidate": tags.at[idx, col],
+                                  "Type": df.at[idx, "Type"], "Description1B": df.at[idx, "Description1B"],
+                                  "Description2": df.at[idx, "Description2"], "Detail": df.at[idx, "Detail"]})
+    return diffs
+
+
+def check_status_labels():
+    """
+    tag_groups on two missing-month rows of different years (same month and Type, so the same
+    trailing digits) and one real two-line match group: the status rows keep their own row
+    tags, the match group is tagged once on its joined text.
+    """
+    df = pd.DataFrame({
+        "Reconciled": ["BANK STATEMENT MISSING - 2023-01", "BANK STATEMENT MISSING - 2024-01",
+                       "Exact Match 7", "Exact Match 7"],
+        "Description1B": ["ALPHA", "BETA", "ALPHA", None],
+        "Description2": [None] * 4,
+        "Detail": [None, None, None, "BETA"],
+        "Type": ["Subscription"] * 4,
+    })
+    df["Match_ID"] = df["Reconciled"].str.extract(MATCH_ID_PATTERN, expand=False)
+    tags, saved = tag_groups(df, STATUS_LABEL_RULES)
+    expected = tag_frame(df, STATUS_LABEL_RULES)
+    expected.iloc[3] = expected.iloc[2]
+    diffs = compare("status-labels", df, expected, {"tag_groups": tags})
+    if saved != 1:
+        diffs.append({"case": "status-labels", "path": "tag_groups", "row": None, "column": None,
+                      "reference": "1 tag call saved", "candidate": f"{saved} saved"})
+    return diffs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Differential check of the rule engine: tag_row, tag_frame and cached tag_frame of the work "
+                    "tree against a reference revision's tag_row on adversarial and generated rule sets")
+    parser.add_argument("--reference", default=REGEX_ENGINE_REVISION,
+                        help="Git revision whose tag_row is the reference (default: the last per-phrase regex engine)")
+    parser.add_argument("--cases", type=int, default=400, help="Adversarial rule sets (one report each)")
+    parser.add_argument("--rows", type=int, default=60, help="Lines per adversarial report")
+    parser.add_argument("--generated-spvs", default=",".join(str(s) for s in DEFAULT_GENERATED_SPVS),
+                        help="Comma-separated SPV counts of the generated (ops CSV) rule sets; '' for none")
+    parser.add_argument("--generated-rows", type=int, default=2_000, help="Lines per generated report")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, help="Also write the differing cells to this CSV")
+    args = parser.parse_args()
+
+    diffs, lines = [], 0
+    with tempfile.TemporaryDirectory(prefix="tagging_fuzz_") as tmp:
+        tmp = Path(tmp)
+        (tmp / ACCOUNTS_FILENAME).write_text("FundShortName,Account\n")
+        reference = load_reference_tagging(export_revision(args.reference, tmp / "reference", tmp / ACCOUNTS_FILENAME))
+        print(f"[INFO] Reference {args.reference} vs work tree", flush=True)
+
+        diffs += check_status_labels()
+
+        for case in range(args.cases):
+            seed = args.seed + case
+            r = random.Random(seed)
+            rules = fuzz_rules(r)
+            df = fuzz_report(r, args.rows, seed)
+            diffs += compare(f"fuzz-{seed}", df, reference_tags(reference, df, rules),
+                             candidate_paths(df, rules, seed % 7 * 10 + 5, seed))
+            lines += len(df)
+        print(f"[OK] {args.cases} adversarial rule sets, {args.cases * args.rows:,} lines", flush=True)
+
+        for spvs in [int(s) for s in args.generated_spvs.split(",") if s.strip()]:
+            rules_dir = tmp / f"rules_{spvs}"
+            synonyms = generate_rules(rules_dir, spvs, seed=args.seed)
+            rules = load_rules_from_csv(rules_dir)
+            df = generate_tagging_report(args.generated_rows, synonyms, seed=args.seed)
+            diffs += compare(f"generated-{spvs}", df, reference_tags(reference, df, rules),
+                             candidate_paths(df, rules, max(1, args.generated_rows // 10), args.seed))
+            lines += len(df)
+            print(f"[OK] Generated rules with {spvs:,} SPVs, {len(df):,} lines", flush=True)
+
+    df_diffs = pd.DataFrame(diffs, columns=["case", "path", "row", "column", "reference", "candidate",
+                                            "Type", "Description1B", "Description2", "Detail"])
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        df_diffs.to_csv(args.out, index=False)
+    if len(df_diffs):
+        print(f"[WARN] {len(df_diffs)} differing cell(s) from the reference; first ones:")
+        print(df_diffs.head(20).dropna(axis=1, how="all").to_string(index=False))
+        sys.exit(1)
+    print(f"[OK] {lines:,} lines tagged identically by every path")
+
+
+if __name__ == "__main__":
+    main()